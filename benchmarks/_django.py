@@ -0,0 +1,62 @@
+"""
+Shared bootstrap for the benchmark scripts.
+
+Configures Django the same way manage.py does and builds a throwaway
+SQLite test database, so benchmarks never touch db.sqlite3 and run fully
+offline.
+"""
+import atexit
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'django-app'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+# settings.DEBUG logs every statement to the console; keep timings honest
+settings.DEBUG = False
+logging.getLogger('django.db.backends').setLevel(logging.WARNING)
+
+
+def setup_database():
+    """Create a fresh test database (in-memory SQLite) with all migrations"""
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    atexit.register(connection.creation.destroy_test_db, old_name, verbosity=0)
+
+
+@contextmanager
+def count_queries():
+    """Yield a dict whose 'count' key tracks statements executed in the block"""
+    result = {'count': 0}
+
+    def wrapper(execute, sql, params, many, context):
+        result['count'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield result
+
+
+@contextmanager
+def timer():
+    """Yield a dict whose 'seconds' key is filled in when the block exits"""
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['seconds'] = time.perf_counter() - start
@@ -0,0 +1,211 @@
+"""
+Query-count and latency regression suite for the catalog API, BOP views
+and admin changelists.
+
+    python benchmarks/bench_api.py                      # compare with baselines.json
+    python benchmarks/bench_api.py --sizes 100,10000    # quicker run
+    python benchmarks/bench_api.py --update-baselines   # record new baselines
+
+The catalog is grown through each size in turn (default 100, 10k and 100k
+albums) on a throwaway in-memory SQLite database. Every endpoint in
+catalog/urls.py plus the admin changelists is requested a few times per
+size; the median latency and the SQL statement count are recorded.
+
+The run fails (exit status 1) when
+  * an endpoint's query count changes with catalog size (an N+1), or
+  * the query count exceeds its baseline, or
+  * the median latency exceeds the baseline by more than --threshold
+    (relative) and --min-delta-ms (absolute, to ignore timer noise).
+"""
+import argparse
+import json
+import statistics
+import sys
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from _django import count_queries, setup_database, timer
+
+setup_database()
+
+from django.conf import settings  # noqa: E402
+from django.test import Client  # noqa: E402
+from catalog.models import Album, AlbumTracklistItem, MusicManagerUser, Song  # noqa: E402
+from catalog.synthetic import CatalogGenerator  # noqa: E402
+from catalog.views import song_cursor  # noqa: E402
+
+BASELINES = Path(__file__).resolve().parent / 'baselines.json'
+TRACKS_PER_ALBUM = 8
+PROBE_TRACKS = 30
+SKIP_BY_DEFAULT = []
+
+
+def grow_catalog(target):
+    """Append synthetic albums, songs and tracklists (see `manage.py seed`) up to `target` albums"""
+    start = Album.objects.count()
+    if target > start:
+        CatalogGenerator(
+            target - start, (target - start) * TRACKS_PER_ALBUM,
+            tracks_per_album=TRACKS_PER_ALBUM, seed=target, first_index=start, covers=False,
+        ).run()
+
+
+def create_fixtures():
+    """Users plus a probe album with a long tracklist for the detail endpoints"""
+    editor = MusicManagerUser.objects.create_superuser(
+        username='bench-editor', password='bench-pass-123', display_name='Bench Editor', role='editor',
+    )
+    probe = Album.objects.create(
+        title='Probe Album', artist='Probe Artist', format='cd',
+        price=Decimal('12.50'), release_date=date(2020, 1, 1), description='Benchmark probe',
+    )
+    for position in range(1, PROBE_TRACKS + 1):
+        song = Song.objects.create(title=f'Probe Song {position}', running_time=200)
+        AlbumTracklistItem.objects.create(album=probe, song=song, position=position)
+    return editor, probe
+
+
+def endpoints(probe):
+    """(name, method, url, authenticated, data) for every route worth timing"""
+    track = AlbumTracklistItem.objects.filter(album=probe).order_by('position').first()
+    song = track.song
+    # The second page of the probe songs (created above, before any catalog
+    # is grown): a cursor after the first 20
+    second_page = song_cursor(list(
+        Song.objects.filter(title_key__startswith='probe').order_by('title_key', 'id').values('title_key', 'id')[:20]
+    )[-1])
+    return [
+        # API
+        ('api-album-list', 'get', '/api/albums/', False, None),
+        ('api-album-list-cursor', 'get', '/api/albums/?cursor=', False, None),
+        ('api-album-detail', 'get', f'/api/albums/{probe.pk}/', False, None),
+        ('api-song-list', 'get', '/api/songs/', False, None),
+        ('api-song-detail', 'get', f'/api/songs/{song.pk}/', False, None),
+        ('api-tracklist-list', 'get', '/api/tracklist/', False, None),
+        ('api-tracklist-detail', 'get', f'/api/tracklist/{track.pk}/', False, None),
+        ('api-search-albums', 'get', '/api/search/?q=silent', False, None),
+        ('api-search-songs', 'get', '/api/search/?q=midnight&type=songs', False, None),
+        ('ajax-song-create', 'post', '/ajax/song/create/', True, 'song'),
+        ('ajax-song-autocomplete', 'get', '/ajax/song/autocomplete/?q=probe', True, None),
+        ('ajax-song-autocomplete-page', 'get', f'/ajax/song/autocomplete/?q=probe&after={second_page}', True, None),
+        # BOP
+        ('bop-album-list', 'get', '/', False, None),
+        ('bop-album-detail', 'get', f'/albums/{probe.pk}/', False, None),
+        ('bop-album-detail-slug', 'get', f'/albums/{probe.pk}/{probe.slug}/', False, None),
+        ('bop-album-create', 'get', '/albums/new/', True, None),
+        ('bop-album-edit', 'get', f'/albums/{probe.pk}/edit/', True, None),
+        ('bop-album-delete-confirm', 'get', f'/albums/{probe.pk}/delete/', True, None),
+        ('bop-login', 'get', '/accounts/login/', False, None),
+        ('bop-register', 'get', '/accounts/register/', False, None),
+        ('bop-admin-register', 'get', '/admin/register/', True, None),
+        # Admin changelists
+        ('admin-album-changelist', 'get', '/admin/catalog/album/', True, None),
+        ('admin-album-search', 'get', '/admin/catalog/album/?q=golden', True, None),
+        ('admin-song-changelist', 'get', '/admin/catalog/song/', True, None),
+        ('admin-tracklist-changelist', 'get', '/admin/catalog/albumtracklistitem/', True, None),
+        ('admin-user-changelist', 'get', '/admin/catalog/musicmanageruser/', True, None),
+    ]
+
+
+def measure(clients, endpoint, repeat, counter):
+    name, method, url, authenticated, data = endpoint
+    client = clients[authenticated]
+    timings = []
+    queries = None
+    for attempt in range(repeat + 1):  # the first request warms caches
+        payload = None
+        if data == 'song':
+            counter[0] += 1
+            payload = {'title': f'Bench Song {counter[0]}', 'running_time': '180'}
+        with count_queries() as executed, timer() as elapsed:
+            response = getattr(client, method)(url, payload) if payload else getattr(client, method)(url)
+        if response.status_code >= 400:
+            raise SystemExit(f'{name}: HTTP {response.status_code} from {url}')
+        if attempt:
+            timings.append(elapsed['seconds'] * 1000)
+            queries = executed['count']
+    return {'queries': queries, 'ms': round(statistics.median(timings), 3)}
+
+
+def check(results, baselines, threshold, min_delta_ms):
+    failures = []
+    sizes = sorted(results, key=int)
+    for name in results[sizes[0]]:
+        counts = {size: results[size][name]['queries'] for size in sizes}
+        if len(set(counts.values())) > 1:
+            failures.append(f'{name}: query count grows with catalog size {counts}')
+        for size in sizes:
+            current = results[size][name]
+            baseline = baselines.get(size, {}).get(name)
+            if baseline is None:
+                continue
+            if current['queries'] > baseline['queries']:
+                failures.append(
+                    f'{name} @ {size}: {current["queries"]} queries, baseline {baseline["queries"]}'
+                )
+            slower = current['ms'] - baseline['ms']
+            if slower > min_delta_ms and current['ms'] > baseline['ms'] * (1 + threshold):
+                failures.append(
+                    f'{name} @ {size}: {current["ms"]:.1f} ms, baseline {baseline["ms"]:.1f} ms'
+                )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='100,10000,100000',
+                        help='Comma-separated album counts (default 100,10000,100000)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed requests per endpoint')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='Allowed relative latency regression (default 0.5 = +50%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                        help='Ignore latency regressions smaller than this (default 5 ms)')
+    parser.add_argument('--skip', default=','.join(SKIP_BY_DEFAULT),
+                        help='Comma-separated endpoint names to leave out')
+    parser.add_argument('--baselines', type=Path, default=BASELINES)
+    parser.add_argument('--update-baselines', action='store_true')
+    parser.add_argument('--cache', action='store_true',
+                        help='Serve album payloads from the response cache (off by default: '
+                             'hits would hide query regressions in the serializers)')
+    args = parser.parse_args()
+    settings.CATALOG_RESPONSE_CACHE = args.cache
+
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+    editor, probe = create_fixtures()
+    clients = {False: Client(), True: Client()}
+    clients[True].force_login(editor)
+    skip = set(filter(None, args.skip.split(',')))
+    routes = [endpoint for endpoint in endpoints(probe) if endpoint[0] not in skip]
+    counter = [0]
+
+    results = {}
+    for size in sizes:
+        grow_catalog(size)
+        print(f'\n== {size} albums ==')
+        print(f'{"endpoint":<30} {"queries":>7} {"median ms":>10}')
+        results[str(size)] = {}
+        for endpoint in routes:
+            result = measure(clients, endpoint, args.repeat, counter)
+            results[str(size)][endpoint[0]] = result
+            print(f'{endpoint[0]:<30} {result["queries"]:>7} {result["ms"]:>10.2f}')
+
+    if args.update_baselines:
+        baselines = json.loads(args.baselines.read_text()) if args.baselines.exists() else {}
+        baselines.update(results)
+        args.baselines.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+        print(f'\nBaselines written to {args.baselines}')
+        return
+
+    baselines = json.loads(args.baselines.read_text()) if args.baselines.exists() else {}
+    failures = check(results, baselines, args.threshold, args.min_delta_ms)
+    if failures:
+        print('\nREGRESSIONS:')
+        for failure in failures:
+            print(f'  - {failure}')
+        sys.exit(1)
+    print('\nNo regressions.')
+
+
+if __name__ == '__main__':
+    main()
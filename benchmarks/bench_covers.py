@@ -0,0 +1,78 @@
+"""
+Cover derivatives: render time and the image weight of a 100-album grid.
+
+    python benchmarks/bench_covers.py --albums 100 --workers 4
+
+Uploads photo-like covers (1500x1500 JPEG by default) to a temporary
+MEDIA_ROOT, renders their WebP variants with `build_all_cover_variants` in
+this process and then with a process pool, and compares the bytes a page
+downloads when it shows every album at each size with the originals.
+"""
+import argparse
+import io
+import os
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+from _django import setup_database, timer
+
+setup_database()
+
+from django.conf import settings  # noqa: E402
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from PIL import Image  # noqa: E402
+from catalog.covers import build_all_cover_variants, storage  # noqa: E402
+from catalog.imaging import COVER_SIZES  # noqa: E402
+from catalog.models import Album  # noqa: E402
+
+
+def photo(index, size):
+    """Noisy gradient: compresses about as well as a real cover photo"""
+    gradient = Image.linear_gradient('L').resize((size, size)).rotate(index * 7)
+    noise = Image.effect_noise((size, size), 40)
+    hue = Image.new('L', (size, size), index * 37 % 256)
+    image = Image.merge('RGB', (gradient, Image.blend(noise, gradient, 0.5), hue))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--albums', type=int, default=100)
+    parser.add_argument('--size', type=int, default=1500, help='Original cover size in pixels (default 1500)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    settings.MEDIA_ROOT = tempfile.mkdtemp()
+    settings.CATALOG_COVER_WORKERS = 0  # uploads below render nothing; the runs below do
+    try:
+        for index in range(args.albums):
+            Album.objects.create(
+                title=f'Album {index}', artist='Bench Artist', format='cd', price=Decimal('9.99'),
+                release_date=date(2020, 1, 1),
+                cover_image=SimpleUploadedFile(f'cover-{index}.jpg', photo(index, args.size)),
+            )
+        Album.objects.update(cover_variants={})
+
+        for workers in (0, args.workers):
+            with timer() as elapsed:
+                stats = build_all_cover_variants(Album.objects.all(), workers)
+            label = 'in process' if not workers else f'{workers} processes'
+            print(f'render {stats["rendered"]} covers, {label:<12} {elapsed["seconds"]:7.2f} s')
+
+        albums = list(Album.objects.all())
+        original = sum(storage.size(album.cover_image.name) for album in albums)
+        print(f'\n{"grid images":<12} {"KiB":>9} {"vs original":>12}')
+        print(f'{"original":<12} {original / 1024:>9,.0f} {1:>11.1f}x')
+        for size in COVER_SIZES:
+            total = sum(storage.size(album.cover_variants[size]) for album in albums)
+            print(f'{size:<12} {total / 1024:>9,.0f} {original / total:>11.1f}x')
+    finally:
+        shutil.rmtree(settings.MEDIA_ROOT)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+JSON rendering and parsing: DRF's stdlib classes vs catalog.renderers.
+
+    python benchmarks/bench_json.py --sizes 10,100,1000
+
+Renders album list pages of each size (the /api/albums/ payload, plus the
+same albums as raw values() rows holding Decimal prices and dates) with
+JSONRenderer ("before") and FastJSONRenderer ("after"), then parses the
+result back with JSONParser and FastJSONParser. Reports microseconds per
+page and checks that both renderers produce the same bytes.
+"""
+import argparse
+import io
+
+from _django import setup_database, timer
+
+setup_database()
+
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from catalog.models import Album  # noqa: E402
+from catalog.renderers import FastJSONParser, FastJSONRenderer, orjson  # noqa: E402
+from catalog.serializers import AlbumSerializer  # noqa: E402
+from catalog.synthetic import CatalogGenerator  # noqa: E402
+
+
+def best_of(function, repeat):
+    times = []
+    for _ in range(repeat):
+        with timer() as elapsed:
+            function()
+        times.append(elapsed['seconds'])
+    return min(times)
+
+
+def page(results):
+    return {'count': len(results), 'next': 'http://testserver/api/albums/?page=2', 'previous': None,
+            'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='10,100,1000', help='Albums per page (default 10,100,1000)')
+    parser.add_argument('--repeat', type=int, default=200, help='Renders per measurement (default 200)')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    if orjson is None:
+        print('orjson is not installed: both columns use the stdlib json module')
+    CatalogGenerator(max(sizes), 0, tracks_per_album=0, seed=1, covers=False).run()
+    context = {'request': APIRequestFactory().get('/api/albums/')}
+    albums = Album.objects.order_by('pk')
+
+    print(f'{"payload":<18} {"albums":>6} {"render before µs":>16} {"after µs":>9} {"speedup":>8} '
+          f'{"parse before µs":>16} {"after µs":>9} {"speedup":>8}')
+    for size in sizes:
+        cases = [
+            ('serialized page', page(AlbumSerializer(albums[:size], many=True, context=context).data)),
+            ('values() rows', page(list(albums[:size].values()))),
+        ]
+        for name, data in cases:
+            expected = JSONRenderer().render(data)
+            if FastJSONRenderer().render(data) != expected:
+                raise SystemExit(f'{name}: FastJSONRenderer output differs from JSONRenderer')
+            repeat = max(1, args.repeat * 10 // size)
+            timings = [
+                best_of(lambda: [renderer.render(data) for _ in range(repeat)], 3) / repeat * 1e6
+                for renderer in (JSONRenderer(), FastJSONRenderer())
+            ]
+            timings += [
+                best_of(lambda: [parser.parse(io.BytesIO(expected)) for _ in range(repeat)], 3) / repeat * 1e6
+                for parser in (JSONParser(), FastJSONParser())
+            ]
+            print(f'{name:<18} {size:>6} {timings[0]:>16,.0f} {timings[1]:>9,.0f} {timings[0] / timings[1]:>7.1f}x '
+                  f'{timings[2]:>16,.0f} {timings[3]:>9,.0f} {timings[2] / timings[3]:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
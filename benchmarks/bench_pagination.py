@@ -0,0 +1,80 @@
+"""
+Deep-page latency: page-number (COUNT + OFFSET) vs keyset cursor pagination.
+
+    python benchmarks/bench_pagination.py --albums 200000
+
+Walks /api/albums/ to increasingly deep positions and times a single page
+request at each depth with both pagination modes.
+"""
+import argparse
+from datetime import date
+from decimal import Decimal
+
+from _django import setup_database, timer
+
+setup_database()
+
+from django.conf import settings  # noqa: E402
+from django.test import Client  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from catalog.models import Album  # noqa: E402
+from catalog.pagination import KeysetPagination  # noqa: E402
+
+
+def seed(count, batch_size=5000):
+    for start in range(0, count, batch_size):
+        Album.objects.bulk_create([
+            Album(
+                title=f'Album {i % (count // 3 or 1):07d}',
+                artist=f'Artist {i}',
+                artist_key=f'artist {i}',
+                slug=f'album-{i}',
+                format='cd',
+                price=Decimal('9.99'),
+                release_date=date(2020, 1, 1),
+            )
+            for i in range(start, min(start + batch_size, count))
+        ])
+
+
+def cursor_at(position):
+    """Cursor pointing just before the album at `position` in (title, id) order"""
+    row = Album.objects.order_by('title', 'id').values('title', 'id')[position - 1]
+    paginator = KeysetPagination()
+    paginator.ordering = ['title', 'id']
+    paginator.request = Request(APIRequestFactory().get('/api/albums/'))
+    return paginator.encode_cursor(row, reverse=False)
+
+
+def best_of(client, url, repeat=5):
+    times = []
+    for _ in range(repeat):
+        with timer() as elapsed:
+            response = client.get(url)
+        assert response.status_code == 200, response.status_code
+        times.append(elapsed['seconds'])
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--albums', type=int, default=200000)
+    args = parser.parse_args()
+
+    settings.CATALOG_RESPONSE_CACHE = False  # time the queries, not cache hits
+    seed(args.albums)
+    client = Client()
+    page_size = KeysetPagination.page_size
+    print(f'{"depth":>9}  {"page-number ms":>15}  {"cursor ms":>10}')
+    depth = page_size
+    while depth < args.albums:
+        page = depth // page_size + 1
+        numbered = best_of(client, f'/api/albums/?page={page}')
+        keyset = best_of(client, cursor_at(depth))
+        print(f'{depth:>9}  {numbered:>15.2f}  {keyset:>10.2f}')
+        depth *= 10
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Refresh-token throughput against a large blacklist, with and without the revocation filter.
+
+    python benchmarks/bench_revocation.py --revoked 1000000 --refreshes 2000
+
+Fills the blacklist of a throwaway SQLite database with --revoked
+unexpired tokens, then times
+  * building the Bloom filter from the table (once per process),
+  * the blacklist check alone for a live token, and for a revoked one,
+  * full rotations through POST /api/token/refresh/,
+with CATALOG_REVOCATION_FILTER on (catalog.revocation) and off (one
+blacklist query per check, as simplejwt does).
+"""
+import argparse
+import uuid
+from datetime import timedelta
+
+from _django import count_queries, setup_database, timer
+
+setup_database()
+
+from django.db import connection, transaction  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken  # noqa: E402
+from catalog.models import MusicManagerUser  # noqa: E402
+from catalog.revocation import revoked_tokens  # noqa: E402
+
+
+def fill_blacklist(count, batch_size=20000):
+    expires_at = timezone.now() + timedelta(days=1)
+    with timer() as elapsed, transaction.atomic():
+        for start in range(0, count, batch_size):
+            size = min(batch_size, count - start)
+            tokens = OutstandingToken.objects.bulk_create(
+                [OutstandingToken(jti=uuid.uuid4().hex, token='', expires_at=expires_at) for _ in range(size)],
+                batch_size=2000,
+            )
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens], batch_size=2000)
+    print(f'{"seeded blacklist":<32} {count:>9} tokens {elapsed["seconds"]:9.2f}s')
+
+
+def time_checks(label, jtis):
+    revoked_tokens.is_revoked(jtis[0])  # builds the filter if on
+    with count_queries() as queries, timer() as elapsed:
+        for jti in jtis:
+            revoked_tokens.is_revoked(jti)
+    print(f'{label:<32} {len(jtis):>9} checks {elapsed["seconds"] / len(jtis) * 1e6:9.1f} us/check '
+          f'{queries["count"]:>7} queries')
+
+
+def time_refreshes(label, client, count):
+    token = client.post('/api/token/', {'username': 'bench-refresh', 'password': 'bench-pass-123'}).json()['refresh']
+    with count_queries() as queries, timer() as elapsed:
+        for _ in range(count):
+            response = client.post('/api/token/refresh/', {'refresh': token})
+            assert response.status_code == 200, response.content
+            token = response.json()['refresh']
+    seconds = elapsed['seconds']
+    print(f'{label:<32} {count:>9} refreshes {count / seconds:8.0f} /s '
+          f'{queries["count"] / count:7.1f} queries each')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--revoked', type=int, default=1000000)
+    parser.add_argument('--refreshes', type=int, default=2000)
+    parser.add_argument('--checks', type=int, default=20000)
+    args = parser.parse_args()
+
+    fill_blacklist(args.revoked)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    MusicManagerUser.objects.create_user(username='bench-refresh', password='bench-pass-123', role='viewer')
+    client = Client()
+    live = [uuid.uuid4().hex for _ in range(args.checks)]
+    revoked = list(
+        BlacklistedToken.objects.order_by('?').values_list('token__jti', flat=True)[:min(args.checks, 2000)]
+    )
+
+    # The sync interval is left at its default: a sync per second of the run
+    with override_settings(CATALOG_REVOCATION_FILTER=True):
+        revoked_tokens.reset()
+        with timer() as elapsed:
+            revoked_tokens.is_revoked(live[0])
+        bloom = revoked_tokens.filter
+        print(f'{"filter: build":<32} {bloom.count:>9} tokens {elapsed["seconds"]:9.2f}s '
+              f'{len(bloom.bits) / 2 ** 20:7.1f} MiB, {bloom.hashes} hashes')
+        time_checks('filter: check live token', live)
+        time_checks('filter: check revoked token', revoked)
+        time_refreshes('filter: refresh', client, args.refreshes)
+    with override_settings(CATALOG_REVOCATION_FILTER=False):
+        time_checks('table: check live token', live)
+        time_checks('table: check revoked token', revoked)
+        time_refreshes('table: refresh', client, args.refreshes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Concurrent-connection throughput of the read API: WSGI vs ASGI on one machine.
+
+    python benchmarks/load_asgi.py --concurrency 1,10,50,200 --duration 10
+
+Seeds a throwaway SQLite file with a synthetic catalog, then serves it in
+turn with gunicorn (WSGI, gthread workers) and uvicorn (ASGI), the same
+number of processes each, and drives every server with keep-alive
+connections that request the album list, album detail, song list and
+tracklist pages round-robin for --duration seconds. Three deployments are
+compared:
+
+    wsgi         gunicorn, the DRF views at /api/
+    asgi         uvicorn, the same DRF views (each request runs in a thread)
+    asgi-async   uvicorn, the async views at /api/async/ (catalog.async_views)
+
+Needs gunicorn and uvicorn (`pip install gunicorn uvicorn`). The load
+generator runs in this process, so on a small machine it competes with the
+server for CPU; compare the rows with each other, not with production. The
+album response cache is off, as the async views do not use it.
+"""
+import argparse
+import asyncio
+import importlib.util
+import itertools
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+WORKDIR = Path(tempfile.mkdtemp(prefix='load-asgi-'))
+LOAD_SETTINGS = f'''
+from settings import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1']
+DATABASES = {{'default': {{'ENGINE': 'django.db.backends.sqlite3', 'NAME': {str(WORKDIR / 'load.sqlite3')!r}}}}}
+LOGGING = {{'version': 1, 'disable_existing_loggers': False, 'root': {{'level': 'WARNING'}}}}
+CATALOG_RESPONSE_CACHE = False
+CATALOG_BUS_BACKEND = None
+'''
+(WORKDIR / 'load_settings.py').write_text(LOAD_SETTINGS)
+sys.path.insert(0, str(WORKDIR))
+os.environ['DJANGO_SETTINGS_MODULE'] = 'load_settings'
+
+from _django import ROOT  # noqa: E402  (configures Django with the settings above)
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connections  # noqa: E402
+from catalog.models import Album, Song  # noqa: E402
+from catalog.synthetic import CatalogGenerator  # noqa: E402
+
+TRACKS_PER_ALBUM = 8
+DEPLOYMENTS = {
+    'wsgi': ('gunicorn', '/api/'),
+    'asgi': ('uvicorn', '/api/'),
+    'asgi-async': ('uvicorn', '/api/async/'),
+}
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def server_command(server, port, args):
+    app_dir = str(ROOT / 'django-app')
+    if server == 'gunicorn':
+        return [
+            sys.executable, '-m', 'gunicorn', '--chdir', app_dir, '--bind', f'127.0.0.1:{port}',
+            '--workers', str(args.processes), '--worker-class', 'gthread', '--threads', str(args.threads),
+            '--keep-alive', '30', '--log-level', 'warning', 'wsgi:application',
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', '--app-dir', app_dir, '--host', '127.0.0.1', '--port', str(port),
+        '--workers', str(args.processes), '--log-level', 'warning', '--no-access-log', 'asgi:application',
+    ]
+
+
+def start_server(server, args):
+    port = free_port()
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join([str(WORKDIR), str(ROOT / 'django-app')])}
+    process = subprocess.Popen(server_command(server, port, args), env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f'{server} exited with status {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit(f'{server} did not start listening on port {port}')
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = dict(line.lower().split(': ', 1) for line in lines[1:] if line)
+    if 'content-length' not in headers:
+        raise RuntimeError(f'Response without Content-Length: {lines[0]}')
+    await reader.readexactly(int(headers['content-length']))
+    return status
+
+
+async def connection(port, paths, deadline, latencies, errors):
+    """One keep-alive connection sending requests back to back until the deadline"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for path in paths:
+            if time.perf_counter() >= deadline:
+                break
+            start = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: application/json\r\n\r\n'.encode())
+            status = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_load(port, paths, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        # Each connection starts at a different point of the round-robin
+        connection(port, itertools.islice(itertools.cycle(paths), index % len(paths), None),
+                   deadline, latencies, errors)
+        for index in range(concurrency)
+    ))
+    return latencies, errors
+
+
+def request_paths(prefix):
+    album = Album.objects.order_by('pk').values_list('pk', flat=True)[Album.objects.count() // 2]
+    song = Song.objects.order_by('pk').values_list('pk', flat=True)[Song.objects.count() // 2]
+    return [
+        f'{prefix}albums/', f'{prefix}albums/?page=5', f'{prefix}albums/{album}/',
+        f'{prefix}songs/', f'{prefix}songs/{song}/', f'{prefix}tracklist/',
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--albums', type=int, default=2000)
+    parser.add_argument('--concurrency', default='1,10,50,200', help='Comma-separated connection counts')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run (default 10)')
+    parser.add_argument('--processes', type=int, default=1, help='Server worker processes (default 1)')
+    parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker (default 8)')
+    parser.add_argument('--deployments', default=','.join(DEPLOYMENTS), help='Comma-separated subset to run')
+    args = parser.parse_args()
+
+    deployments = args.deployments.split(',')
+    for server in sorted({DEPLOYMENTS[name][0] for name in deployments}):
+        if importlib.util.find_spec(server) is None:
+            sys.exit(f'{server} is not installed: pip install {server}')
+
+    try:
+        call_command('migrate', verbosity=0)
+        CatalogGenerator(
+            args.albums, args.albums * TRACKS_PER_ALBUM,
+            tracks_per_album=TRACKS_PER_ALBUM, seed=args.albums, covers=False,
+        ).run()
+        paths = {name: request_paths(DEPLOYMENTS[name][1]) for name in deployments}
+        connections.close_all()
+
+        print(f'{"deployment":<12} {"conns":>6} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+        for name in deployments:
+            process, port = start_server(DEPLOYMENTS[name][0], args)
+            try:
+                asyncio.run(run_load(port, paths[name], 1, 1.0))  # warm up
+                for concurrency in map(int, args.concurrency.split(',')):
+                    latencies, errors = asyncio.run(run_load(port, paths[name], concurrency, args.duration))
+                    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+                    print(f'{name:<12} {concurrency:>6} {len(latencies) / args.duration:>8,.0f} '
+                          f'{cuts[49] * 1000:>8.1f} {cuts[98] * 1000:>8.1f} {len(errors):>7}')
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        shutil.rmtree(WORKDIR)
+
+
+if __name__ == '__main__':
+    main()
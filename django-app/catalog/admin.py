@@ -1,9 +1,16 @@
+import hashlib
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import MusicManagerUser, Album, Song, AlbumTracklistItem
+from django.db import IntegrityError, transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import MusicManagerUser, Album, Song, AlbumTracklistItem, Job
+from . import jobs, search
+from .export import streaming_export_response
 
 # Custom admin site configuration
 admin.site.site_header = "🎵 MyMusicMaestro Admin"
@@ -46,10 +53,22 @@ class MusicManagerUserAdmin(UserAdmin):
         )
     role_badge.short_description = 'Role'
     
+    def get_queryset(self, request):
+        """Count each artist's albums in the changelist query via the artist_key index"""
+        albums = (
+            Album.objects.filter(artist_key=OuterRef('display_name_key'))
+            .order_by().values('artist_key').annotate(count=Count('pk')).values('count')
+        )
+        return super().get_queryset(request).annotate(
+            artist_album_count=Coalesce(Subquery(albums), Value(0))
+        )
+    
     def album_count(self, obj):
         """Show number of albums for artists"""
         if obj.role == 'artist':
-            count = Album.objects.filter(artist=obj.display_name).count()
+            count = getattr(obj, 'artist_album_count', None)
+            if count is None:
+                count = Album.objects.filter(artist_key=obj.display_name_key).count()
             return f"🎵 {count} albums"
         return "—"
     album_count.short_description = 'Albums'
@@ -88,10 +107,13 @@ class AlbumAdmin(admin.ModelAdmin):
     """Enhanced admin for Album model"""
     list_display = ['cover_thumbnail', 'title', 'artist', 'format_badge', 'release_date', 'price_display', 'track_count', 'view_detail']
     list_filter = ['format', 'release_date', 'artist']
-    search_fields = ['title', 'artist', 'description']
+    search_fields = ['title', 'artist', 'description']  # served by the full-text index
     readonly_fields = ['slug', 'cover_preview', 'album_stats']
     inlines = [AlbumTracklistItemInline]
-    actions = ['delete_selected_albums', 'export_albums']
+    actions = [
+        'delete_selected_albums', 'export_albums', 'export_albums_ndjson',
+        'export_albums_in_background', 'rebuild_stats_in_background', 'rebuild_covers_in_background',
+    ]
     
     fieldsets = (
         ('🎵 Basic Information', {
@@ -116,20 +138,24 @@ class AlbumAdmin(admin.ModelAdmin):
         """Display small cover image thumbnail"""
         if obj.cover_image:
             return format_html(
-                '<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />',
-                obj.cover_image.url
+                '<img src="{}" loading="lazy" style="width: 50px; height: 50px; object-fit: cover; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />',
+                obj.cover_images['thumb']
             )
         return format_html(
             '<div style="width: 50px; height: 50px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 8px; display: flex; align-items: center; justify-content: center; color: white; font-size: 12px;">🎵</div>'
         )
     cover_thumbnail.short_description = 'Cover'
     
+    def get_search_results(self, request, queryset, search_term):
+        """Use the full-text index instead of LIKE '%term%' scans"""
+        return search.filter_queryset(queryset, search_term), False
+    
     def cover_preview(self, obj):
         """Display larger cover image preview"""
         if obj.cover_image:
             return format_html(
                 '<img src="{}" style="max-width: 200px; max-height: 200px; border-radius: 12px; box-shadow: 0 4px 8px rgba(0,0,0,0.2);" />',
-                obj.cover_image.url
+                obj.cover_images['card']
             )
         return format_html(
             '<div style="width: 200px; height: 200px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 12px; display: flex; align-items: center; justify-content: center; color: white; font-size: 24px;">🎵<br/>No Cover</div>'
@@ -163,28 +189,26 @@ class AlbumAdmin(admin.ModelAdmin):
     
     def track_count(self, obj):
         """Display number of tracks"""
-        count = obj.tracks.count()
-        return f"🎵 {count} tracks"
+        return f"🎵 {obj.track_count} tracks"
     track_count.short_description = 'Tracks'
+    track_count.admin_order_field = 'track_count'
     
     def album_stats(self, obj):
         """Display album statistics"""
-        track_count = obj.tracks.count()
-        total_time = sum(track.song.running_time for track in obj.tracks.all())
-        total_minutes = total_time // 60
-        total_seconds = total_time % 60
+        total_minutes = obj.total_playtime // 60
+        total_seconds = obj.total_playtime % 60
         
         return format_html(
             '''
             <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; border-left: 4px solid #667eea;">
                 <strong>📊 Album Statistics</strong><br/>
                 🎵 Tracks: {}<br/>
-                ⏱️ Total Duration: {}:{:02d}<br/>
+                ⏱️ Total Duration: {}:{}<br/>
                 📅 Release Year: {}<br/>
                 🏷️ Slug: <code>{}</code>
             </div>
             ''',
-            track_count, total_minutes, total_seconds, obj.release_year, obj.slug
+            obj.track_count, total_minutes, f'{total_seconds:02d}', obj.release_year, obj.slug
         )
     album_stats.short_description = 'Statistics'
     
@@ -205,33 +229,74 @@ class AlbumAdmin(admin.ModelAdmin):
     delete_selected_albums.short_description = "🗑️ Delete selected albums"
     
     def export_albums(self, request, queryset):
-        """Export albums data"""
-        # This would implement CSV export functionality
-        self.message_user(request, f'📁 Export functionality coming soon! Selected {queryset.count()} albums.')
-    export_albums.short_description = "📁 Export selected albums"
+        """Stream the selected albums and their tracklists as CSV (one row per track)"""
+        return streaming_export_response(queryset, 'csv')
+    export_albums.short_description = "📁 Export selected albums (CSV)"
+    
+    def export_albums_ndjson(self, request, queryset):
+        """Stream the selected albums as NDJSON (one album per line, tracklist nested)"""
+        return streaming_export_response(queryset, 'ndjson')
+    export_albums_ndjson.short_description = "📁 Export selected albums (NDJSON)"
+    
+    def enqueue_for_albums(self, request, queryset, task, description, **kwargs):
+        """Queue a background job for the selected albums; selecting the same albums again reuses it"""
+        album_ids = sorted(queryset.values_list('pk', flat=True))
+        digest = hashlib.md5(repr(album_ids).encode(), usedforsecurity=False).hexdigest()
+        job = jobs.enqueue(task, key=f'{task}:{digest}', album_ids=album_ids, **kwargs)
+        self.message_user(request, format_html(
+            '⏳ {} for {} albums queued as <a href="{}">job #{}</a>.',
+            description, len(album_ids), reverse('admin:catalog_job_change', args=[job.pk]), job.pk,
+        ))
+    
+    def export_albums_in_background(self, request, queryset):
+        """Write the CSV export to storage in a background job, for selections too large to stream"""
+        self.enqueue_for_albums(request, queryset, 'export_albums', 'Export', export_format='csv')
+    export_albums_in_background.short_description = "📁 Export selected albums (CSV, background job)"
+    
+    def rebuild_stats_in_background(self, request, queryset):
+        """Correct the stored track count and playtime in a background job"""
+        self.enqueue_for_albums(request, queryset, 'rebuild_album_stats', 'Statistics rebuild')
+    rebuild_stats_in_background.short_description = "📊 Rebuild statistics (background job)"
+    
+    def rebuild_covers_in_background(self, request, queryset):
+        """Re-render the cover thumbnails in a background job"""
+        self.enqueue_for_albums(request, queryset, 'build_cover_variants', 'Cover rendering', missing_only=False)
+    rebuild_covers_in_background.short_description = "🖼️ Re-render cover thumbnails (background job)"
 
 @admin.register(Song)
 class SongAdmin(admin.ModelAdmin):
     """Enhanced admin for Song model"""
     list_display = ['title', 'duration_badge', 'album_count', 'created_info']
-    search_fields = ['title']
+    search_fields = ['title']  # served by the full-text index
     actions = ['recalculate_durations']
     
+    def get_search_results(self, request, queryset, search_term):
+        """Use the full-text index instead of LIKE '%term%' scans"""
+        return search.filter_queryset(queryset, search_term), False
+    
     def duration_badge(self, obj):
         """Display duration as a badge"""
         minutes = obj.running_time // 60
         seconds = obj.running_time % 60
         return format_html(
-            '<span style="background-color: #17a2b8; color: white; padding: 3px 8px; border-radius: 12px; font-size: 11px; font-weight: bold;">⏱️ {}:{:02d}</span>',
-            minutes, seconds
+            '<span style="background-color: #17a2b8; color: white; padding: 3px 8px; border-radius: 12px; font-size: 11px; font-weight: bold;">⏱️ {}:{}</span>',
+            minutes, f'{seconds:02d}'
         )
     duration_badge.short_description = 'Duration'
     
+    def get_queryset(self, request):
+        """Count each song's albums with a per-row subquery (only the page is counted)"""
+        albums = (
+            AlbumTracklistItem.objects.filter(song=OuterRef('pk'))
+            .order_by().values('song').annotate(count=Count('pk')).values('count')
+        )
+        return super().get_queryset(request).annotate(album_total=Coalesce(Subquery(albums), Value(0)))
+    
     def album_count(self, obj):
         """Show how many albums this song appears in"""
-        count = obj.album_tracks.count()
-        return f"💿 {count} albums"
+        return f"💿 {obj.album_total} albums"
     album_count.short_description = 'Albums'
+    album_count.admin_order_field = 'album_total'
     
     def created_info(self, obj):
         """Show creation info"""
@@ -247,8 +312,9 @@ class SongAdmin(admin.ModelAdmin):
 class AlbumTracklistItemAdmin(admin.ModelAdmin):
     """Enhanced admin for AlbumTracklistItem"""
     list_display = ['album_link', 'position_badge', 'song_link', 'duration_display']
-    list_filter = ['album', 'album__format']
-    ordering = ['album', 'position']
+    list_select_related = ['album', 'song']
+    list_filter = ['album__format']  # a per-album filter would list every album
+    ordering = ['album_id', 'position']  # 'album' sorts the whole table by album title
     search_fields = ['album__title', 'song__title']
     
     def album_link(self, obj):
@@ -283,8 +349,87 @@ class AlbumTracklistItemAdmin(admin.ModelAdmin):
             minutes = obj.song.running_time // 60
             seconds = obj.song.running_time % 60
             return format_html(
-                '<span style="color: #6c757d; font-family: monospace;">⏱️ {}:{:02d}</span>',
-                minutes, seconds
+                '<span style="color: #6c757d; font-family: monospace;">⏱️ {}:{}</span>',
+                minutes, f'{seconds:02d}'
             )
         return "—"
-    duration_display.short_description = 'Duration'
\ No newline at end of file
+    duration_display.short_description = 'Duration'
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Background jobs (catalog.jobs) and their progress; run them with `manage.py run_workers`"""
+    list_display = ['id', 'task', 'status_badge', 'progress_bar', 'attempts_display', 'run_at', 'created_at', 'finished_at']
+    list_filter = ['status', 'task']
+    search_fields = ['task', 'key']
+    actions = ['retry_jobs']
+    readonly_fields = [
+        'task', 'kwargs', 'key', 'status_badge', 'progress_bar', 'result_display', 'last_error',
+        'attempts', 'max_attempts', 'run_at', 'worker', 'heartbeat_at', 'created_at', 'started_at', 'finished_at',
+    ]
+    fields = readonly_fields
+    
+    def has_add_permission(self, request):
+        """Jobs are queued by the application, not by hand"""
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def status_badge(self, obj):
+        """Display status as a colored badge"""
+        colors = {
+            Job.QUEUED: '#6c757d',
+            Job.RUNNING: '#007bff',
+            Job.DONE: '#28a745',
+            Job.FAILED: '#dc3545',
+        }
+        label = obj.get_status_display()
+        if obj.status == Job.QUEUED and obj.attempts:
+            label = f'{label} (retry)'
+        return format_html(
+            '<span style="background-color: {}; color: white; padding: 3px 8px; border-radius: 12px; font-size: 11px; font-weight: bold;">{}</span>',
+            colors.get(obj.status, '#6c757d'), label
+        )
+    status_badge.short_description = 'Status'
+    status_badge.admin_order_field = 'status'
+    
+    def progress_bar(self, obj):
+        """Progress reported by the running task"""
+        progress = obj.progress
+        if progress is None:
+            return obj.progress_message or (f'{obj.progress_done:,}' if obj.progress_done else '—')
+        return format_html(
+            '<div style="width: 120px; background: #e9ecef; border-radius: 4px;" title="{}">'
+            '<div style="width: {}%; background: #667eea; color: white; font-size: 11px; border-radius: 4px; padding: 0 4px; white-space: nowrap;">{}%</div>'
+            '</div>',
+            obj.progress_message, round(progress * 100), round(progress * 100)
+        )
+    progress_bar.short_description = 'Progress'
+    
+    def attempts_display(self, obj):
+        """Runs so far out of the allowed attempts"""
+        return f"{obj.attempts}/{obj.max_attempts}"
+    attempts_display.short_description = 'Attempts'
+    
+    def result_display(self, obj):
+        """The task's result, with a download link for exports"""
+        if not obj.result:
+            return "—"
+        if isinstance(obj.result, dict) and obj.result.get('url'):
+            return format_html('<a href="{}">📥 {}</a> {}', obj.result['url'], obj.result.get('file', 'Download'), obj.result)
+        return str(obj.result)
+    result_display.short_description = 'Result'
+    
+    def retry_jobs(self, request, queryset):
+        """Queue failed jobs again, with their attempts reset"""
+        retried = 0
+        for job in queryset.filter(status=Job.FAILED):
+            try:
+                with transaction.atomic():
+                    retried += Job.objects.filter(pk=job.pk, status=Job.FAILED).update(
+                        status=Job.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None,
+                    )
+            except IntegrityError:
+                pass  # the same key is queued already
+        self.message_user(request, f'🔁 Queued {retried} failed jobs again.')
+    retry_jobs.short_description = "🔁 Retry failed jobs"
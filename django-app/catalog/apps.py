@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import signals  # noqa: F401  (connects the signal receivers)
+        from . import tasks  # noqa: F401  (registers the background tasks)
+        from .search import install_search_index
+
+        post_migrate.connect(install_search_index, sender=self)
@@ -0,0 +1,179 @@
+"""
+Async read-only API views, for ASGI deployments.
+
+DRF views are synchronous: under ASGI, Django runs each of them in a thread
+for the whole request, so concurrent connections are bounded by threads
+exactly as under WSGI. These views serve the public reads with the async ORM
+instead, leaving the event loop free while a query runs:
+
+    /api/async/albums/          /api/async/albums/<id>/
+    /api/async/songs/           /api/async/songs/<id>/
+    /api/async/tracklist/
+
+They answer with the same JSON as the /api/ endpoints: the compiled
+serializers (catalog.fast_serializers), CatalogPagination (page numbers, or
+cursors with `?cursor=`), ETag / Last-Modified and `304 Not Modified`, and
+the NDJSON stream of catalog.streaming for `Accept: application/x-ndjson`
+or `?format=ndjson` (which, as there, needs a JWT: requests are only
+authenticated for the stream). They skip the browsable API and the album payload
+cache, whose backend calls are synchronous. Set `CATALOG_ASYNC_API = False`
+to remove the URLs.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.request import Request
+from .authentication import CatalogJWTAuthentication
+from .conditional import add_validators, conditional_response, make_etag
+from .fast_serializers import ALBUM, ALBUM_DETAIL, SONG, TRACK
+from .models import Album, AlbumTracklistItem, Song
+from .pagination import CatalogPagination
+from .renderers import FastJSONRenderer, NDJSONRenderer
+from .streaming import CHUNK_SIZE
+
+
+class AsyncReadView(View):
+    """
+    Base class: `queryset` and `compiled` (the compiled serializer) say what
+    is read; subclasses implement `read()`. Without an `updated_at_field`
+    responses carry no validators.
+    """
+    http_method_names = ['get', 'head', 'options']
+    queryset = None
+    compiled = None
+    updated_at_field = 'updated_at'
+    renderer_classes = [FastJSONRenderer]
+
+    async def get(self, request, *args, **kwargs):
+        # DRF's request wrapper, for query_params and content negotiation
+        request = Request(request)
+        self.renderer = FastJSONRenderer()
+        try:
+            renderers = [renderer() for renderer in self.renderer_classes]
+            self.renderer, self.media_type = DefaultContentNegotiation().select_renderer(request, renderers)
+            return await self.read(request, *args, **kwargs)
+        except Http404 as exc:
+            return self.error(exceptions.NotFound(*exc.args))
+        except exceptions.APIException as exc:
+            return self.error(exc)
+
+    async def read(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def get_serializer_context(self, request):
+        return {'request': request}
+
+    def render(self, data, status=200):
+        return HttpResponse(
+            self.renderer.render(data, getattr(self, 'media_type', None), {}),
+            status=status, content_type=self.renderer.media_type,
+        )
+
+    def error(self, exc):
+        # As DRF's exception handler
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = self.render(data, status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response['WWW-Authenticate'] = CatalogJWTAuthentication().authenticate_header(self.request)
+        return response
+
+    def get_etag(self, request, validators):
+        return make_etag(self.queryset.model, validators, request.build_absolute_uri(), self.renderer.format)
+
+
+class AsyncListView(AsyncReadView):
+    """A paginated list, or every record as an NDJSON stream"""
+    renderer_classes = [FastJSONRenderer, NDJSONRenderer]
+    cursor_ordering = ('title', 'id')
+    stream_chunk_size = CHUNK_SIZE
+
+    async def read(self, request):
+        if isinstance(self.renderer, NDJSONRenderer):
+            await self.authenticate_stream(request)
+            queryset = self.queryset.order_by(*self.cursor_ordering).values(*self.compiled.sources)
+            return StreamingHttpResponse(self.stream_lines(request, queryset), content_type=self.renderer.media_type)
+
+        fields = {*self.compiled.sources, 'pk', *self.cursor_ordering}
+        if self.updated_at_field:
+            fields.add(self.updated_at_field)
+        paginator = CatalogPagination()
+        page = await paginator.apaginate_queryset(self.queryset.values(*fields), request, self)
+        etag = None
+        if self.updated_at_field:
+            # The validators of ConditionalGetMixin.get_list_etag()
+            links = paginator.get_paginated_response([]).data
+            etag = self.get_etag(request, [
+                *((row['pk'], row[self.updated_at_field]) for row in page),
+                sorted((key, value) for key, value in links.items() if key != 'results'),
+            ])
+            response = conditional_response(request, etag)
+            if response is not None:
+                return response
+        data = await self.compiled.amany(page, self.get_serializer_context(request))
+        response = self.render(paginator.get_paginated_response(data).data)
+        return response if etag is None else add_validators(response, etag)
+
+    async def authenticate_stream(self, request):
+        """As StreamingListMixin: the whole-table stream needs credentials, pages do not"""
+        # The token check may query (revocation, active users); run it in a thread
+        if await sync_to_async(CatalogJWTAuthentication().authenticate)(request) is None:
+            raise exceptions.NotAuthenticated()
+
+    async def stream_lines(self, request, queryset):
+        """Rendered NDJSON, one chunk of records per item"""
+        context = self.get_serializer_context(request)
+        chunk = []
+        async for row in queryset.aiterator(chunk_size=self.stream_chunk_size):
+            chunk.append(row)
+            if len(chunk) == self.stream_chunk_size:
+                yield self.renderer.render_lines(await self.compiled.amany(chunk, context))
+                chunk = []
+        if chunk:
+            yield self.renderer.render_lines(await self.compiled.amany(chunk, context))
+
+
+class AsyncDetailView(AsyncReadView):
+    """One record, looked up by primary key"""
+
+    async def read(self, request, pk):
+        model = self.queryset.model
+        try:
+            row = await self.queryset.values(*{*self.compiled.sources, self.updated_at_field}).aget(pk=pk)
+        except model.DoesNotExist:
+            raise Http404(f'No {model._meta.object_name} matches the given query.')
+        last_modified = row[self.updated_at_field]
+        etag = self.get_etag(request, [last_modified])
+        response = conditional_response(request, etag, last_modified)
+        if response is not None:
+            return response
+        data = (await self.compiled.amany([row], self.get_serializer_context(request)))[0]
+        return add_validators(self.render(data), etag, last_modified)
+
+
+class AlbumList(AsyncListView):
+    queryset = Album.objects.all()
+    compiled = ALBUM
+
+
+class AlbumDetail(AsyncDetailView):
+    queryset = Album.objects.all()
+    compiled = ALBUM_DETAIL
+
+
+class SongList(AsyncListView):
+    queryset = Song.objects.all()
+    compiled = SONG
+
+
+class SongDetail(AsyncDetailView):
+    queryset = Song.objects.all()
+    compiled = SONG
+
+
+class TracklistList(AsyncListView):
+    queryset = AlbumTracklistItem.objects.all()
+    compiled = TRACK
+    cursor_ordering = ('position', 'id')
+    updated_at_field = None  # as TracklistViewSet, which sends no validators
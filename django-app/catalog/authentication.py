@@ -0,0 +1,154 @@
+"""
+JWT authentication from token claims, without a user query per request.
+
+Tokens issued by /api/token/ carry the user's `role`, `display_name_key`
+(the normalized display name that albums are matched on), `is_staff` and
+`is_superuser`. `CatalogJWTAuthentication` turns an access token into a
+`CatalogTokenUser` built from those claims, which is all the permission
+classes in catalog.permissions and the viewsets look at. Anything else
+(e.g. `request.user.email`) loads the `MusicManagerUser` on first use.
+
+Deactivation still applies: whether a user is active is remembered per
+process for CATALOG_AUTH_ACTIVE_TTL seconds, so a deactivated (or deleted)
+user's tokens stop working within that time, and at once in the process
+that saved the change. Claims are refreshed from the database with every
+token refresh, so a role change reaches the access tokens within one
+ACCESS_TOKEN_LIFETIME. Tokens without the claims (issued before them) are
+authenticated with a user lookup, as before.
+"""
+import threading
+import time
+from django.conf import settings
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+from .models import MusicManagerUser
+from .revocation import revoked_tokens
+
+DEFAULT_ACTIVE_TTL = 30  # seconds
+CLAIMS = ('role', 'display_name_key', 'is_staff', 'is_superuser')
+
+
+def add_user_claims(token, user):
+    for claim in CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class CatalogRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens get the user's current claims, and
+    whose blacklist check goes through catalog.revocation. A rotation loads
+    the user once, where simplejwt's blacklist() and outstand() load it each.
+    """
+
+    @cached_property
+    def user(self):
+        return MusicManagerUser.objects.filter(pk=self.payload.get(api_settings.USER_ID_CLAIM)).first()
+
+    def check_blacklist(self):
+        if revoked_tokens.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+    def outstand(self):
+        return OutstandingToken.objects.get_or_create(
+            jti=self.payload[api_settings.JTI_CLAIM],
+            defaults={
+                'user': self.user,
+                'created_at': self.current_time,
+                'token': str(self),
+                'expires_at': datetime_from_epoch(self.payload['exp']),
+            },
+        )
+
+    def blacklist(self):
+        token, _ = self.outstand()
+        return BlacklistedToken.objects.get_or_create(token=token)
+
+    @property
+    def access_token(self):
+        if self.user is not None:
+            add_user_claims(self, self.user)  # also kept by the rotated refresh token
+        return super().access_token
+
+
+class CatalogTokenUser(TokenUser):
+    """
+    The user as the access token describes it. `user` (and any attribute
+    not defined here) loads the MusicManagerUser.
+    """
+
+    @cached_property
+    def role(self):
+        return self.token['role']
+
+    @cached_property
+    def display_name_key(self):
+        return self.token['display_name_key']
+
+    def is_artist_of(self, album):
+        """As MusicManagerUser.is_artist_of"""
+        return self.role == 'artist' and album.artist_key == self.display_name_key
+
+    @cached_property
+    def user(self):
+        return MusicManagerUser.objects.get(pk=self.id)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name in ('token', 'user'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+
+class ActiveUserCache:
+    """
+    Per-process map of user id -> is_active, each entry kept for
+    CATALOG_AUTH_ACTIVE_TTL seconds. Ids are keyed as strings, the form
+    they take in the token's user id claim.
+    """
+    max_entries = 10000
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def is_active(self, user_id):
+        user_id = str(user_id)
+        now = time.monotonic()
+        entry = self.entries.get(user_id)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        active = MusicManagerUser.objects.filter(pk=user_id, is_active=True).exists()
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                self.entries.clear()
+            self.entries[user_id] = (active, now + getattr(settings, 'CATALOG_AUTH_ACTIVE_TTL', DEFAULT_ACTIVE_TTL))
+        return active
+
+    def forget(self, user_id):
+        with self.lock:
+            self.entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+active_users = ActiveUserCache()
+
+
+class CatalogJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that builds the user from the token's claims"""
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in CLAIMS):
+            return super().get_user(validated_token)
+        user = CatalogTokenUser(validated_token)
+        if not active_users.is_active(user.id):
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
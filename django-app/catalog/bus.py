@@ -0,0 +1,223 @@
+"""
+Cross-process invalidation bus for the album response cache.
+
+Every worker process keeps its own cache (local memory by default), so a
+write in one worker has to reach the others. Writers publish the ids of
+the albums they changed once their transaction commits. Each worker polls
+the bus at most once per `CATALOG_BUS_POLL_INTERVAL` seconds, before
+handling a request (CatalogBusMiddleware), and expires the same albums in
+its own cache (catalog.caching). A change is therefore served everywhere
+within one poll interval.
+
+Two backends, neither needing a broker (`CATALOG_BUS_BACKEND`):
+
+* 'file': an append-only log of JSON lines in a local file shared by the
+  workers of one host (`CATALOG_BUS_PATH`, by default derived from the
+  database name). A poll is an os.stat(), plus reading any new lines, and
+  runs no SQL.
+* 'database': a CatalogGeneration counter bumped under a row lock, plus
+  one CatalogChange row per generation, for workers on several hosts. A
+  poll is one primary-key lookup; changes are read only when the counter
+  has moved.
+
+A worker that falls further behind than the log keeps expires its whole
+cache instead. Set `CATALOG_BUS_BACKEND = None` to turn the bus off, for
+example with a shared cache backend, where invalidations already reach
+every worker.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from .models import CatalogChange, CatalogGeneration
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends of one short line are not interleaved in practice
+    fcntl = None
+
+DEFAULT_POLL_INTERVAL = 1.0  # seconds
+EVERYTHING = None  # a change that expires every album
+
+
+def default_path():
+    """One log per database, so workers sharing a database share the log"""
+    name = str(settings.DATABASES['default']['NAME'])
+    digest = hashlib.md5(name.encode(), usedforsecurity=False).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'mymusicmaestro-bus-{digest}.log')
+
+
+class FileBackend:
+    max_bytes = 1024 * 1024  # rotate the log past this size
+
+    def __init__(self, path):
+        self.path = path
+        self.inode = None
+        self.position = None
+
+    def _locked(self):
+        handle = open(f'{self.path}.lock', 'a')
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def write(self, album_ids):
+        line = json.dumps({'albums': album_ids}) + '\n'
+        with self._locked():
+            try:
+                rotate = os.path.getsize(self.path) > self.max_bytes
+            except FileNotFoundError:
+                rotate = False
+            if rotate:
+                # Readers notice the new inode and expire everything
+                with open(f'{self.path}.new', 'w', encoding='utf-8') as log:
+                    log.write(line)
+                os.replace(f'{self.path}.new', self.path)
+                return
+            with open(self.path, 'a', encoding='utf-8') as log:
+                log.write(line)
+
+    def read(self):
+        try:
+            stat = os.stat(self.path)
+            inode, size = stat.st_ino, stat.st_size
+        except FileNotFoundError:
+            inode, size = None, 0
+        if self.position is None:
+            # A new worker starts with an empty cache: only later changes matter
+            self.inode, self.position = inode, size
+            return []
+        changes = []
+        if self.inode is None:
+            self.inode = inode  # the log did not exist yet
+        elif inode != self.inode or size < self.position:
+            # Rotated or removed: what happened in between is unknown
+            self.inode, self.position = inode, 0
+            changes.append(EVERYTHING)
+        if size == self.position:
+            return changes
+        with open(self.path, 'rb') as log:
+            log.seek(self.position)
+            data = log.read(size - self.position)
+        complete = data[:data.rfind(b'\n') + 1]  # a writer may be midway through a line
+        self.position += len(complete)
+        changes.extend(json.loads(line)['albums'] for line in complete.splitlines() if line)
+        return changes
+
+
+class DatabaseBackend:
+    name = 'catalog'
+    keep = 10000  # generations kept in CatalogChange
+    prune_every = 1000
+
+    def __init__(self):
+        self.seen = None
+
+    def write(self, album_ids):
+        generations = CatalogGeneration.objects.filter(name=self.name)
+        with transaction.atomic():
+            # The UPDATE takes the row lock first, so generations commit in order
+            if not generations.update(value=F('value') + 1):
+                CatalogGeneration.objects.get_or_create(name=self.name)
+                generations.update(value=F('value') + 1)
+            value = generations.values_list('value', flat=True).get()
+            CatalogChange.objects.create(generation=value, album_ids=album_ids)
+            if value % self.prune_every == 0:
+                CatalogChange.objects.filter(generation__lte=value - self.keep).delete()
+
+    def read(self):
+        value = CatalogGeneration.objects.filter(name=self.name).values_list('value', flat=True).first() or 0
+        if self.seen is None:
+            self.seen = value
+            return []
+        if value == self.seen:
+            return []
+        if value < self.seen or value - self.seen > self.keep:
+            self.seen = value
+            return [EVERYTHING]
+        changes = list(
+            CatalogChange.objects.filter(generation__gt=self.seen, generation__lte=value)
+            .order_by('generation').values_list('album_ids', flat=True)
+        )
+        if len(changes) != value - self.seen:  # pruned past what this worker had seen
+            changes = [EVERYTHING]
+        self.seen = value
+        return changes
+
+
+class _PendingChange:
+    """Albums changed in the current transaction, written to the bus once on commit"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.album_ids = set()
+        self.everything = False
+
+    def __call__(self):
+        self.backend.write(EVERYTHING if self.everything else sorted(self.album_ids))
+
+
+class InvalidationBus:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the backend and read position (settings changes, forked workers)"""
+        self._backend = None
+        self._config = None
+        self.next_poll = 0.0
+
+    def get_backend(self):
+        kind = getattr(settings, 'CATALOG_BUS_BACKEND', 'file')
+        path = getattr(settings, 'CATALOG_BUS_PATH', None) or default_path()
+        if (kind, path) != self._config:
+            self._config = (kind, path)
+            self._backend = {'file': lambda: FileBackend(path), 'database': DatabaseBackend, None: lambda: None}[kind]()
+            self.next_poll = 0.0
+        return self._backend
+
+    def publish(self, album_ids=EVERYTHING):
+        """Announce changed albums (EVERYTHING for all) to the other workers on commit"""
+        backend = self.get_backend()
+        if backend is None:
+            return
+        pending = getattr(connection, '_catalog_bus_pending', None)
+        scheduled = (
+            pending is not None and connection.in_atomic_block
+            and any(callback[1] is pending for callback in connection.run_on_commit)
+        )
+        if not scheduled:
+            pending = connection._catalog_bus_pending = _PendingChange(backend)
+        if album_ids is EVERYTHING:
+            pending.everything = True
+        else:
+            pending.album_ids.update(album_ids)
+        if not scheduled:
+            transaction.on_commit(pending)  # runs straight away outside a transaction
+
+    def due(self):
+        """Whether poll() would read the backend now"""
+        return self.get_backend() is not None and time.monotonic() >= self.next_poll
+
+    def poll(self):
+        """Changes published since the last poll, at most once per poll interval"""
+        backend = self.get_backend()
+        now = time.monotonic()
+        if backend is None or now < self.next_poll:
+            return []
+        if not self.lock.acquire(blocking=False):
+            return []  # another thread of this worker is polling
+        try:
+            self.next_poll = now + getattr(settings, 'CATALOG_BUS_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+            return backend.read()
+        finally:
+            self.lock.release()
+
+
+bus = InvalidationBus()
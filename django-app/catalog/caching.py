@@ -0,0 +1,174 @@
+"""
+Cached API payloads for the album detail and list endpoints.
+
+The serialized data (plus its ETag/Last-Modified) is stored in Django's
+cache framework under a key made of the absolute request URL (the payload
+embeds absolute cover URLs and pagination links), the renderer format and
+the current version tokens:
+
+* every album has its own version, so a change to one album only drops
+  that album's detail entries,
+* album list pages share one list version, bumped by any album change,
+* a catalog-wide generation covers bulk writes whose album ids are not known.
+
+Invalidation replaces a version with a fresh random token instead of
+deleting keys, so it is one `set_many()` however many URLs, hosts or
+formats were cached; stale entries simply age out. It runs from the catalog
+signals and stats helpers (see catalog.signals / catalog.stats), once
+straight away and once more when the transaction commits, so a request that
+read the old rows mid-transaction cannot cache them under the new version.
+Other worker processes learn about the change through catalog.bus.
+
+Hits and misses are counted in the cache itself (`cache_stats()`), so the
+numbers add up across worker processes when the cache backend is shared.
+"""
+import hashlib
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .bus import EVERYTHING, bus
+from .models import Album
+
+PREFIX = 'catalog'
+GENERATION_KEY = f'{PREFIX}:generation'
+LIST_VERSION_KEY = f'{PREFIX}:albums:version'
+COUNTER_KEYS = {'hits': f'{PREFIX}:cache:hits', 'misses': f'{PREFIX}:cache:misses'}
+DEFAULT_TIMEOUT = 60 * 60
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def cache_enabled():
+    return getattr(settings, 'CATALOG_RESPONSE_CACHE', True)
+
+
+def _album_version_key(album_id):
+    return f'{PREFIX}:album:{album_id}:version'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def _versions(keys):
+    """Current version tokens for `keys`, creating the missing ones"""
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            token = _new_version()
+            # add() keeps a token another process created meanwhile
+            versions[key] = token if cache.add(key, token, None) else cache.get(key, token)
+    return [versions[key] for key in keys]
+
+
+def _bump(keys):
+    get_cache().set_many({key: _new_version() for key in keys}, None)
+
+
+def _bump_now_and_on_commit(keys):
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def expire_albums(album_ids):
+    """Drop this worker's cached payloads for these albums (see catalog.bus)"""
+    _bump([*(_album_version_key(album_id) for album_id in album_ids), LIST_VERSION_KEY])
+
+
+def expire_catalog():
+    _bump([GENERATION_KEY])
+
+
+def invalidate_albums(album_ids):
+    """Drop the cached detail payloads of these albums and every cached list page, in every worker"""
+    album_ids = list(album_ids)
+    keys = [_album_version_key(album_id) for album_id in album_ids]
+    _bump_now_and_on_commit([*keys, LIST_VERSION_KEY])
+    bus.publish(album_ids)
+
+
+def invalidate_catalog():
+    """Drop every cached album payload, for bulk writes that do not know their ids"""
+    _bump_now_and_on_commit([GENERATION_KEY])
+    bus.publish(EVERYTHING)
+
+
+def apply_bus_changes():
+    """Expire what other workers changed since the last poll (CatalogBusMiddleware)"""
+    changes = bus.poll()
+    if EVERYTHING in changes:
+        expire_catalog()
+    elif changes:
+        expire_albums({album_id for album_ids in changes for album_id in album_ids})
+
+
+def _count(name):
+    cache = get_cache()
+    key = COUNTER_KEYS[name]
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:  # evicted between add() and incr()
+            cache.add(key, 1, None)
+
+
+def cache_stats():
+    """{'hits': n, 'misses': n} since the last reset"""
+    values = get_cache().get_many(COUNTER_KEYS.values())
+    return {name: values.get(key, 0) for name, key in COUNTER_KEYS.items()}
+
+
+def reset_cache_stats():
+    get_cache().delete_many(COUNTER_KEYS.values())
+
+
+def payload_key(request, album_id=None):
+    """Cache key for the payload answering `request`; album_id is None for list pages"""
+    version_keys = [GENERATION_KEY, LIST_VERSION_KEY if album_id is None else _album_version_key(album_id)]
+    generation, version = _versions(version_keys)
+    url = f'{request.build_absolute_uri()}|{request.accepted_renderer.format}'
+    digest = hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()
+    kind = 'albums' if album_id is None else f'album:{album_id}'
+    return f'{PREFIX}:{kind}:{digest}:{generation}:{version}'
+
+
+class CachedPayloadMixin:
+    """
+    Serves `ConditionalGetMixin` payloads from the cache for an Album
+    viewset. Goes before it in the bases; a hit runs no database query.
+    """
+
+    def get_payload(self, request, build, object_id=None):
+        if not cache_enabled():
+            return super().get_payload(request, build, object_id)
+        album_id = None
+        if object_id is not None:
+            try:
+                # '01' and '1' are the same album; normalize before keying on it
+                album_id = Album._meta.pk.to_python(object_id)
+            except ValidationError:
+                return super().get_payload(request, build, object_id)
+        cache = get_cache()
+        key = payload_key(request, album_id)
+        payload = cache.get(key)
+        if payload is not None:
+            _count('hits')
+            request._cache_status = 'HIT'
+            return payload
+        _count('misses')
+        request._cache_status = 'MISS'
+        payload = super().get_payload(request, build, object_id)
+        cache.set(key, payload, getattr(settings, 'CATALOG_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+        return payload
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        status = getattr(request, '_cache_status', None)
+        if status:
+            response['X-Cache'] = status
+        return response
@@ -0,0 +1,139 @@
+"""
+Conditional GET (ETag / Last-Modified) for the read-only API actions.
+
+Responses carry validators computed from data the view loads anyway:
+
+* retrieve: the object's `updated_at` (also sent as Last-Modified),
+* list: the `(pk, updated_at)` pairs of the page plus the pagination
+  links/count, so inserts, edits and deletions that change the page all
+  change the ETag. There is no Last-Modified, because a deletion does not
+  move any remaining row's timestamp.
+
+Both are hashed together with the absolute request URL (filters, page,
+cursor and host, which appears in cover URLs) and the negotiated renderer.
+
+Requests that send `If-None-Match` or `If-Modified-Since` are checked
+first with a metadata query that skips the serializers: a primary-key
+lookup of `updated_at` for retrieve, or the same page query over
+`values()` for list. Unchanged resources get `304 Not Modified`. The
+check runs before `get_object()`, so object-level permissions are not
+applied to the 304 path; only use it where reads are public.
+"""
+import hashlib
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def _row_value(row, field):
+    if isinstance(row, dict):
+        return row[field]
+    return getattr(row, field)
+
+
+def _timestamp(value):
+    return int(value.timestamp()) if value is not None else None
+
+
+class ConditionalGetMixin:
+    """For model viewsets whose model has an `updated_at` timestamp"""
+    updated_at_field = 'updated_at'
+
+    def is_conditional(self, request):
+        return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.is_conditional(request):
+            values = queryset.values(*self.get_validator_fields())
+            page = self.paginate_queryset(values)
+            etag = self.get_list_etag(request, list(values) if page is None else page, page is not None)
+            response = conditional_response(request, etag)
+            if response is not None:
+                return response
+
+        data, etag, last_modified = self.get_payload(request, self.build_list_payload)
+        return self.add_validators(Response(data), etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.is_conditional(request):
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            try:
+                last_modified = (
+                    self.get_queryset().prefetch_related(None).order_by()
+                    .filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+                    .values_list(self.updated_at_field, flat=True).first()
+                )
+            except (TypeError, ValueError, ValidationError):
+                last_modified = None  # a malformed pk: the full path below answers 404
+            if last_modified is not None:
+                response = conditional_response(request, self.get_etag(request, [last_modified]), last_modified)
+                if response is not None:
+                    return response
+
+        data, etag, last_modified = self.get_payload(
+            request, self.build_detail_payload, kwargs[self.lookup_url_kwarg or self.lookup_field],
+        )
+        return self.add_validators(Response(data), etag, last_modified)
+
+    def get_payload(self, request, build, object_id=None):
+        """(data, etag, last_modified) for the response; a hook for caching mixins"""
+        return build(request)
+
+    def build_list_payload(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            data = self.get_paginated_response(self.get_serializer(page, many=True).data).data
+            return data, self.get_list_etag(request, page, paginated=True), None
+        rows = list(queryset)
+        return self.get_serializer(rows, many=True).data, self.get_list_etag(request, rows), None
+
+    def build_detail_payload(self, request):
+        instance = self.get_object()
+        last_modified = getattr(instance, self.updated_at_field)
+        return self.get_serializer(instance).data, self.get_etag(request, [last_modified]), last_modified
+
+    def get_validator_fields(self):
+        """Columns needed to paginate and fingerprint a list page without loading full rows"""
+        ordering = getattr(self, 'cursor_ordering', None) or self.get_queryset().model._meta.ordering
+        return {'pk', self.updated_at_field, *(field.lstrip('-') for field in ordering)}
+
+    def get_list_etag(self, request, rows, paginated=False):
+        validators = [(_row_value(row, 'pk'), _row_value(row, self.updated_at_field)) for row in rows]
+        if paginated:
+            links = self.paginator.get_paginated_response([]).data
+            validators.append(sorted((key, value) for key, value in links.items() if key != 'results'))
+        return self.get_etag(request, validators)
+
+    def get_etag(self, request, validators):
+        return make_etag(
+            self.get_queryset().model, validators, request.build_absolute_uri(), request.accepted_renderer.format,
+        )
+
+    def add_validators(self, response, etag, last_modified=None):
+        return add_validators(response, etag, last_modified)
+
+
+def make_etag(model, validators, url, renderer_format):
+    key = '|'.join([model._meta.label, repr(validators), url, renderer_format])
+    return quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+
+
+def conditional_response(request, etag, last_modified=None):
+    """`304 Not Modified` (with the validators) if the client's copy is current, else None"""
+    response = get_conditional_response(request, etag=etag, last_modified=_timestamp(last_modified))
+    if response is None:
+        return None
+    return add_validators(response, etag, last_modified)
+
+
+def add_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(_timestamp(last_modified))
+    # Caches may store the response but must revalidate it every time
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ['Accept'])
+    return response
@@ -0,0 +1,235 @@
+"""
+Resized WebP copies of album covers.
+
+When an album's cover changes, the sizes in catalog.imaging.COVER_SIZES are
+rendered once the transaction commits, in a pool of `CATALOG_COVER_WORKERS`
+processes, so the upload request does not wait for Pillow. The files are
+stored in the cover storage like the original (named by content, so the
+variants of a shared cover are shared too) and recorded in
+`Album.cover_variants`;
+storing them bumps `updated_at` and invalidates the album's cached payloads.
+
+They are served through `Album.cover_images` (catalog.models.cover_urls), a
+size -> URL map used by the API, the BOP templates and the admin; sizes not
+rendered yet point at the original. `CATALOG_COVER_WORKERS = 0` renders in
+the committing thread instead (tests); `manage.py build_cover_variants`
+backfills existing covers.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import posixpath
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from itertools import islice
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from .caching import invalidate_albums
+from .imaging import render_cover_variants
+from .models import Album
+from .storage import is_content_addressed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+storage = Album._meta.get_field('cover_image').storage
+
+
+def upload_name(name):
+    """`name` moved into the cover field's upload_to, as an upload of that file would be"""
+    return Album._meta.get_field('cover_image').generate_filename(None, posixpath.basename(name))
+
+
+def variant_name(name, size):
+    """Upload name of a variant; the cover storage renames it after its content"""
+    return upload_name(f'{os.path.splitext(name)[0]}.{size}.webp')
+
+
+def cover_workers():
+    return getattr(settings, 'CATALOG_COVER_WORKERS', DEFAULT_WORKERS)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers=None):
+    """The process pool, started on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = new_executor(workers or cover_workers())
+        return _executor
+
+
+def new_executor(workers):
+    # 'spawn': forking a threaded server process is not safe, and the workers
+    # only need catalog.imaging, which does not import Django
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def _forget_executor():
+    global _executor, _executor_lock
+    _executor, _executor_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_executor)  # the pool belongs to the parent
+
+
+def store_cover_variants(album_id, name, images):
+    """Save rendered variants, unless the album's cover changed meanwhile; True if stored"""
+    current = Album.objects.filter(pk=album_id, cover_image=name)
+    if not current.exists():
+        return False
+    # Never deleted here: other albums may share the same files (catalog.storage)
+    variants = {size: storage.save(variant_name(name, size), ContentFile(data)) for size, data in images.items()}
+    if not current.update(cover_variants=variants, updated_at=timezone.now()):
+        return False
+    invalidate_albums([album_id])
+    return True
+
+
+def read_cover(name):
+    with storage.open(name, 'rb') as original:
+        return original.read()
+
+
+def _finish(album_id, name, future):
+    # Runs in the pool's result thread, which keeps no connection between jobs
+    try:
+        store_cover_variants(album_id, name, future.result())
+    except Exception:
+        logger.exception('Could not render the cover variants of album %s', album_id)
+    finally:
+        connections.close_all()
+
+
+def build_cover_variants(album_id, name):
+    """Render a cover's variants: in the process pool, or right here without workers"""
+    try:
+        data = read_cover(name)
+        if not cover_workers():
+            store_cover_variants(album_id, name, render_cover_variants(data))
+            return
+        future = get_executor().submit(render_cover_variants, data)
+    except Exception:
+        # A broken cover must not fail the save that uploaded it
+        logger.exception('Could not render the cover variants of album %s', album_id)
+        return
+    future.add_done_callback(partial(_finish, album_id, name))
+
+
+def schedule_cover_variants(album_id, name):
+    """Render the variants of an album's new cover once the transaction commits"""
+    transaction.on_commit(partial(build_cover_variants, album_id, name))
+
+
+def build_all_cover_variants(albums, workers=None, batch_size=100, progress=None):
+    """
+    Render the variants of every album in `albums` that has a cover, `workers`
+    covers at a time (0 renders here). Returns {'rendered': n, 'skipped': n, 'failed': n}.
+    """
+    workers = cover_workers() if workers is None else workers
+    rows = albums.exclude(cover_image='').exclude(cover_image=None).order_by('pk').values_list('pk', 'cover_image')
+    stats = {'rendered': 0, 'skipped': 0, 'failed': 0}
+    with new_executor(workers) if workers else nullcontext() as pool:
+        rows = rows.iterator(chunk_size=batch_size)
+        while batch := list(islice(rows, batch_size)):
+            jobs = []
+            for album_id, name in batch:
+                try:
+                    data = read_cover(name)
+                except OSError:
+                    logger.exception('Could not read the cover of album %s', album_id)
+                    stats['failed'] += 1
+                    continue
+                jobs.append((album_id, name, pool.submit(render_cover_variants, data) if pool else data))
+            for album_id, name, job in jobs:
+                try:
+                    images = job.result() if pool else render_cover_variants(job)
+                    # False when the cover was replaced meanwhile; its save renders the new one
+                    outcome = 'rendered' if store_cover_variants(album_id, name, images) else 'skipped'
+                except Exception:
+                    logger.exception('Could not render the cover variants of album %s', album_id)
+                    outcome = 'failed'
+                stats[outcome] += 1
+            if progress:
+                progress(stats)
+    return stats
+
+
+def _content_name(name):
+    """Name the cover storage would give the file stored as `name`, read in chunks"""
+    digest = hashlib.sha256()
+    with storage.open(name, 'rb') as original:
+        for chunk in original.chunks():
+            digest.update(chunk)
+    return storage.content_name(upload_name(name), digest.hexdigest())
+
+
+def migrate_to_content_addressed(dry_run=False, delete_old=True, batch_size=500, progress=None):
+    """
+    Move every album's cover and variants to content-addressed names (see
+    catalog.storage), rewriting the albums and deleting the replaced files.
+    Returns counts: albums, files (distinct old names), missing, and
+    bytes_before/bytes_after for the files moved.
+    """
+    renamed, sizes = {}, {}  # old name -> new name, new name -> bytes
+    stats = {'albums': 0, 'files': 0, 'missing': 0, 'bytes_before': 0, 'bytes_after': 0}
+
+    def move(name):
+        if name not in renamed:
+            if is_content_addressed(name):
+                renamed[name] = name
+                return name
+            if not storage.exists(name):
+                stats['missing'] += 1  # left as it is
+                renamed[name] = name
+                return name
+            size = storage.size(name)
+            stats['files'] += 1
+            stats['bytes_before'] += size
+            if dry_run:
+                renamed[name] = _content_name(name)
+            else:
+                with storage.open(name, 'rb') as original:
+                    renamed[name] = storage.save(upload_name(name), original)
+            sizes[renamed[name]] = size
+        return renamed[name]
+
+    rows = (
+        Album.objects.exclude(cover_image='').exclude(cover_image=None).order_by('pk')
+        .values_list('pk', 'cover_image', 'cover_variants').iterator(chunk_size=batch_size)
+    )
+    while batch := list(islice(rows, batch_size)):
+        changed = []
+        for album_id, name, variants in batch:
+            if is_content_addressed(name) and all(map(is_content_addressed, variants.values())):
+                continue
+            cover = move(name)
+            moved = {size: move(variant) for size, variant in variants.items()}
+            if cover == name and moved == variants:
+                continue  # only missing files
+            changed.append(album_id)
+            if not dry_run:
+                # Skipped if the cover was replaced meanwhile
+                Album.objects.filter(pk=album_id, cover_image=name).update(
+                    cover_image=cover, cover_variants=moved, updated_at=timezone.now(),
+                )
+        stats['albums'] += len(changed)
+        if changed and not dry_run:
+            invalidate_albums(changed)
+        if progress:
+            progress(stats)
+
+    stats['bytes_after'] = sum(sizes.values())
+    if delete_old and not dry_run:
+        for old, new in renamed.items():
+            if old != new:
+                storage.delete(old)
+    return stats
@@ -0,0 +1,132 @@
+"""
+Streaming album exports (CSV and NDJSON).
+
+Albums are read with `values().iterator(chunk_size=...)` and their
+tracklists are fetched one chunk of albums at a time, so memory stays
+flat however many rows are exported. Every function yields text lines
+that can feed a `StreamingHttpResponse` or be written to a file.
+
+CSV has one row per track, with the album columns repeated; albums
+without tracks get a single row with empty track columns. NDJSON has one
+JSON object per album with its tracklist nested.
+
+CSV text cells that a spreadsheet would run as a formula (starting with
+=, +, -, @, tab or carriage return) are written with a leading "'"; see
+`guard_cell`. The importer strips it again, so exports still round-trip.
+"""
+import csv
+import json
+import re
+from itertools import islice
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from .models import AlbumTracklistItem
+
+CHUNK_SIZE = 2000
+ALBUM_FIELDS = [
+    'id', 'title', 'artist', 'format', 'price', 'release_date', 'slug', 'track_count', 'total_playtime',
+]
+TRACK_FIELDS = ['position', 'song_id', 'song_title', 'running_time']
+CSV_HEADER = ['album_id', *ALBUM_FIELDS[1:], *TRACK_FIELDS]
+FORMULA = re.compile(r"'*[=+\-@\t\r]")  # formula text, behind any quotes a guard already added
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _album_chunks(queryset, chunk_size):
+    albums = queryset.values(*ALBUM_FIELDS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(albums, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _tracklists(album_ids):
+    """album id -> ordered track dicts for one chunk of albums"""
+    tracklists = {}
+    items = (
+        AlbumTracklistItem.objects.filter(album_id__in=album_ids)
+        .order_by('album_id', 'position', 'id')
+        .values_list('album_id', 'position', 'song_id', 'song__title', 'song__running_time')
+    )
+    for album_id, position, song_id, title, running_time in items:
+        tracklists.setdefault(album_id, []).append({
+            'position': position,
+            'song_id': song_id,
+            'song_title': title,
+            'running_time': running_time,
+        })
+    return tracklists
+
+
+def iter_albums(queryset, chunk_size=CHUNK_SIZE):
+    """Yield (album values, tracklist) pairs, keeping the queryset's ordering"""
+    for chunk in _album_chunks(queryset, chunk_size):
+        tracklists = _tracklists([album['id'] for album in chunk])
+        for album in chunk:
+            yield album, tracklists.get(album['id'], [])
+
+
+def guard_cell(value):
+    """
+    Text a spreadsheet would read as a formula, with a "'" in front. Text
+    already starting with quotes before such a character gets one more,
+    so `unguard_cell` can tell the two apart.
+    """
+    if isinstance(value, str) and FORMULA.match(value):
+        return "'" + value
+    return value
+
+
+def unguard_cell(value):
+    """The value `guard_cell` was given"""
+    if isinstance(value, str) and value.startswith("'") and FORMULA.match(value):
+        return value[1:]
+    return value
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    empty_track = dict.fromkeys(TRACK_FIELDS, '')
+    for album, tracklist in iter_albums(queryset, chunk_size):
+        album_columns = [album[field] for field in ALBUM_FIELDS]
+        for track in tracklist or [empty_track]:
+            row = album_columns + [track[field] for field in TRACK_FIELDS]
+            yield writer.writerow([guard_cell(value) for value in row])
+
+
+def iter_ndjson(queryset, chunk_size=CHUNK_SIZE):
+    for album, tracklist in iter_albums(queryset, chunk_size):
+        yield json.dumps({**album, 'tracklist': tracklist}, cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORTERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+}
+
+
+def export_albums(queryset, export_format='csv', chunk_size=CHUNK_SIZE):
+    """Lines of the export in `export_format` ('csv' or 'ndjson')"""
+    return EXPORTERS[export_format](queryset, chunk_size)
+
+
+def streaming_export_response(queryset, export_format='csv', filename='albums'):
+    """Download response that streams the export as it is generated"""
+    response = StreamingHttpResponse(
+        export_albums(queryset, export_format),
+        content_type=FORMATS[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
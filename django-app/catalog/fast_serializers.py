@@ -0,0 +1,262 @@
+"""
+Compiled read-only serializers for the public album and song reads.
+
+DRF's ModelSerializer resolves every field of every row through
+`get_attribute()`, builds a model instance per row and dispatches
+SerializerMethodFields by name. For list/retrieve that cost dominates the
+request. A `CompiledSerializer` does the introspection once: it walks the
+ModelSerializer's own field objects and turns them into a flat plan that
+reads `values()` rows:
+
+* plain model fields keep the DRF field's `to_representation` (skipped for
+  CharField/IntegerField/BooleanField, which return values() data
+  unchanged), so formatting of dates, decimals and choices is identical;
+  ISO datetimes are inlined with the current timezone looked up once per
+  call, since that lookup costs more than the formatting;
+* computed fields (properties, SerializerMethodFields, nested serializers)
+  are given as small functions of the row.
+
+The output is the same data, in the same key order, so the rendered JSON is
+byte-identical to the ModelSerializer's; catalog.tests checks that.
+`FastReadMixin` uses it for list/retrieve whenever the view's serializer
+class has a compiled counterpart and no permission checks objects.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.permissions import BasePermission
+from rest_framework.settings import api_settings
+from .models import Album, AlbumTracklistItem, cover_urls, shorten_description
+from .serializers import AlbumDetailSerializer, AlbumSerializer, AlbumTracklistItemSerializer, SongSerializer
+
+# DRF fields whose to_representation() returns values() data unchanged
+PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+
+class CompiledSerializer:
+    """
+    Read-only stand-in for a ModelSerializer class, fed with values() rows.
+
+    `computed` maps field names to functions `(row, context) -> value`, with
+    the extra values() columns they read listed in `extra_sources`. `prefix`
+    reads the model fields through a relation (e.g. 'song__').
+    """
+
+    def __init__(self, serializer_class, computed=None, extra_sources=(), prefix=''):
+        self.serializer_class = serializer_class
+        self.computed = computed or {}
+        self.extra_sources = extra_sources
+        self.prefix = prefix
+        self._plan = None
+
+    @property
+    def plan(self):
+        if self._plan is None:
+            plan, sources = [], []
+            for name, field in self.serializer_class().fields.items():
+                if field.write_only:
+                    continue
+                if name in self.computed:
+                    plan.append((name, None, self.computed[name]))
+                    continue
+                source = self.prefix + field.source
+                sources.append(source)
+                if _is_iso_datetime(field):
+                    plan.append((name, None, _iso_datetime(field, source)))
+                else:
+                    convert = None if type(field) in PASSTHROUGH_FIELDS else field.to_representation
+                    plan.append((name, source, convert))
+            self._plan, self._sources = plan, sources
+        return self._plan
+
+    @property
+    def sources(self):
+        """values() columns a row must carry"""
+        self.plan
+        extra = self.extra_sources() if callable(self.extra_sources) else self.extra_sources
+        return [*self._sources, *extra]
+
+    def load_related(self, rows):
+        """Attach data that values() cannot select (overridden for tracklists)"""
+
+    async def aload_related(self, rows):
+        """load_related() with the async ORM"""
+
+    def to_representation(self, row, context):
+        data = {}
+        for name, source, convert in self.plan:
+            if source is None:
+                data[name] = convert(row, context)
+            else:
+                value = row[source]
+                data[name] = value if value is None or convert is None else convert(value)
+        return data
+
+    def many(self, rows, context):
+        self.load_related(rows)
+        return self.represent(rows, context)
+
+    async def amany(self, rows, context):
+        """many() for async views"""
+        await self.aload_related(rows)
+        return self.represent(rows, context)
+
+    def represent(self, rows, context):
+        # Looked up once per call rather than once per datetime value
+        context = {**context, 'timezone': timezone.get_current_timezone() if settings.USE_TZ else None}
+        return [self.to_representation(row, context) for row in rows]
+
+
+def _is_iso_datetime(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    return (
+        type(field) is serializers.DateTimeField and not hasattr(field, 'timezone')
+        and output_format is not None and output_format.lower() == ISO_8601
+    )
+
+
+def _iso_datetime(field, source):
+    """DateTimeField.to_representation for aware values, with the timezone from many()"""
+    def convert(row, context):
+        value = row[source]
+        if value is None:
+            return None
+        field_timezone = context.get('timezone')
+        if field_timezone is None or value.utcoffset() is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+_cover_storage = Album._meta.get_field('cover_image').storage
+
+
+def _cover_image_url(row, context):
+    # Same as AlbumSerializer.get_cover_image_url
+    if not row['cover_image']:
+        return None
+    return context['request'].build_absolute_uri(_cover_storage.url(row['cover_image']))
+
+
+def _cover_images(row, context):
+    # Same as AlbumSerializer.get_cover_images
+    urls = cover_urls(row['cover_image'], row['cover_variants'])
+    if urls is None:
+        return None
+    return {size: context['request'].build_absolute_uri(url) for size, url in urls.items()}
+
+
+ALBUM_COMPUTED = {
+    'short_description': lambda row, context: shorten_description(row['description']),
+    'release_year': lambda row, context: row['release_date'].year,
+    'cover_image_url': _cover_image_url,
+    'cover_images': _cover_images,
+}
+ALBUM_SOURCES = ['description', 'release_date', 'cover_image', 'cover_variants']
+
+
+class CompiledAlbumDetail(CompiledSerializer):
+    """Adds each album's tracklist, fetched for all rows in one query"""
+
+    def tracklist_items(self, rows):
+        return (
+            AlbumTracklistItem.objects.filter(album_id__in=[row['id'] for row in rows])
+            .order_by('position')  # the order of Album.objects.with_tracklist()
+            .values('album_id', *TRACK.sources)
+        )
+
+    def load_related(self, rows):
+        self.attach_tracklists(rows, self.tracklist_items(rows))
+
+    async def aload_related(self, rows):
+        self.attach_tracklists(rows, [item async for item in self.tracklist_items(rows)])
+
+    def attach_tracklists(self, rows, items):
+        tracklists = {}
+        for item in items:
+            tracklists.setdefault(item['album_id'], []).append(item)
+        for row in rows:
+            row['tracklist'] = tracklists.get(row['id'], [])
+
+
+SONG = CompiledSerializer(SongSerializer)
+TRACK_SONG = CompiledSerializer(SongSerializer, prefix='song__')
+TRACK = CompiledSerializer(
+    AlbumTracklistItemSerializer,
+    computed={'song': TRACK_SONG.to_representation},
+    extra_sources=lambda: TRACK_SONG.sources,
+)
+ALBUM = CompiledSerializer(AlbumSerializer, computed=ALBUM_COMPUTED, extra_sources=ALBUM_SOURCES)
+ALBUM_DETAIL = CompiledAlbumDetail(
+    AlbumDetailSerializer,
+    computed={
+        **ALBUM_COMPUTED,
+        'tracklist': lambda row, context: [TRACK.to_representation(item, context) for item in row['tracklist']],
+    },
+    extra_sources=ALBUM_SOURCES,
+)
+
+COMPILED_SERIALIZERS = {
+    AlbumSerializer: ALBUM,
+    AlbumDetailSerializer: ALBUM_DETAIL,
+    SongSerializer: SONG,
+    AlbumTracklistItemSerializer: TRACK,
+}
+
+
+def get_compiled_serializer(view):
+    """Compiled counterpart of the view's serializer class, or None to use DRF's"""
+    if not getattr(settings, 'CATALOG_FAST_SERIALIZERS', True):
+        return None
+    # Object permissions need model instances, which this path never builds
+    for permission in view.get_permissions():
+        if type(permission).has_object_permission is not BasePermission.has_object_permission:
+            return None
+    return COMPILED_SERIALIZERS.get(view.get_serializer_class())
+
+
+class FastReadMixin:
+    """
+    Serves list/retrieve from compiled serializers. Goes before
+    ConditionalGetMixin in the bases, whose payload builders it replaces.
+    """
+
+    def get_compiled_serializer(self):
+        return get_compiled_serializer(self)
+
+    def build_list_payload(self, request):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return super().build_list_payload(request)
+        queryset = (
+            self.filter_queryset(self.get_queryset()).prefetch_related(None)
+            .values(*{*compiled.sources, *self.get_validator_fields()})
+        )
+        context = self.get_serializer_context()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            data = self.get_paginated_response(compiled.many(page, context)).data
+            return data, self.get_list_etag(request, page, paginated=True), None
+        rows = list(queryset)
+        return compiled.many(rows, context), self.get_list_etag(request, rows), None
+
+    def build_detail_payload(self, request):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return super().build_detail_payload(request)
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            row = queryset.values(*{*compiled.sources, self.updated_at_field}).get(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except queryset.model.DoesNotExist:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        except (TypeError, ValueError, ValidationError):
+            raise Http404  # as rest_framework.generics.get_object_or_404()
+        last_modified = row[self.updated_at_field]
+        data = compiled.many([row], self.get_serializer_context())[0]
+        return data, self.get_etag(request, [last_modified]), last_modified
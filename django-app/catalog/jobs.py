@@ -0,0 +1,178 @@
+"""
+Background jobs kept in the database, with no broker to run.
+
+Tasks are functions registered with `@task('name')` (catalog.tasks) and
+called as `func(job, **kwargs)`. `enqueue()` inserts a `Job` row in the
+caller's transaction, so a job queued by a view or admin action only exists
+if that transaction commits. `manage.py run_workers` claims due jobs, runs
+them and records the outcome:
+
+* a job is claimed with `UPDATE ... WHERE id = ? AND status = 'queued'`, and
+  only the worker whose update matched runs it; that needs no row locks, so
+  it works the same on SQLite and PostgreSQL;
+* a job that raises is queued again after `retry_delay(attempts)` seconds
+  (RETRY_DELAY doubling per attempt, at most RETRY_MAX_DELAY) until it has
+  run `max_attempts` times, then marked failed with the traceback;
+* a job enqueued with a `key` is not queued twice: while one with the same
+  key waits, `enqueue()` returns it. Running jobs do not count, since they
+  may have read their data before the change that queued the new one;
+* `job.report_progress()` records progress for the admin and doubles as a
+  heartbeat: a job running without one for CATALOG_JOB_TIMEOUT seconds
+  (its worker died) counts as a failed attempt.
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAY = 10  # seconds before the first retry
+RETRY_MAX_DELAY = 60 * 60
+DEFAULT_TIMEOUT = 10 * 60
+DEFAULT_POLL_INTERVAL = 1.0
+CLAIM_CANDIDATES = 10  # due jobs tried per claim, in case other workers take the first ones
+
+TASKS = {}
+
+
+def task(name, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Register a task function under `name`"""
+    def register(func):
+        func.task_name = name
+        func.max_attempts = max_attempts
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, key=None, run_at=None, **kwargs):
+    """Queue task `name` with `kwargs` (JSON values); returns the Job, or the queued one with the same key"""
+    func = TASKS.get(name)
+    if func is None:
+        raise LookupError(f'Unknown task: {name}')
+    job = Job(task=name, kwargs=kwargs, key=key, max_attempts=func.max_attempts, run_at=run_at or timezone.now())
+    if key is None:
+        job.save()
+        return job
+    while True:
+        existing = Job.objects.filter(key=key, status=Job.QUEUED).first()
+        if existing is not None:
+            return existing
+        try:
+            with transaction.atomic():
+                job.save()
+            return job
+        except IntegrityError:
+            # Another request queued the same key meanwhile; it wins unless it was claimed already
+            job.pk = None
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the `attempts`-th failed run"""
+    return min(RETRY_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def job_timeout():
+    return getattr(settings, 'CATALOG_JOB_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def claim(worker):
+    """The next due job, marked running for `worker`, or None"""
+    now = timezone.now()
+    due = (
+        Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        .order_by('run_at', 'pk').values_list('pk', flat=True)[:CLAIM_CANDIDATES]
+    )
+    for job_id in due:
+        claimed = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, attempts=F('attempts') + 1,
+            started_at=now, heartbeat_at=now, finished_at=None,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def fail(job, error):
+    """Record a failed run: queue the job again after a delay, or mark it failed for good"""
+    now = timezone.now()
+    running = Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker)
+    if job.attempts < job.max_attempts and job.task in TASKS:
+        try:
+            with transaction.atomic():
+                retried = running.update(
+                    status=Job.QUEUED, run_at=now + timedelta(seconds=retry_delay(job.attempts)),
+                    last_error=error, worker='',
+                )
+            return retried
+        except IntegrityError:
+            error += '\nNot retried: a job with the same key is already queued'
+    return running.update(status=Job.FAILED, last_error=error, finished_at=now)
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome; True if it succeeded"""
+    started = time.monotonic()
+    try:
+        func = TASKS.get(job.task)
+        if func is None:
+            raise LookupError(f'Unknown task: {job.task}')
+        result = func(job, **job.kwargs)
+    except Exception:
+        logger.exception('Job %s (%s) failed on attempt %s of %s', job.pk, job.task, job.attempts, job.max_attempts)
+        fail(job, traceback.format_exc())
+        return False
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+        status=Job.DONE, result=result, finished_at=timezone.now(), last_error='',
+    )
+    logger.info('Job %s (%s) done in %.1fs', job.pk, job.task, time.monotonic() - started)
+    return True
+
+
+def requeue_stale(timeout=None):
+    """Treat running jobs whose heartbeat is older than `timeout` seconds as failed runs"""
+    limit = timezone.now() - timedelta(seconds=job_timeout() if timeout is None else timeout)
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=limit)
+    for job in stale:
+        fail(job, f'Worker {job.worker} sent no heartbeat after {job.heartbeat_at:%Y-%m-%d %H:%M:%S}')
+    return len(stale)
+
+
+class Worker:
+    """Claims and runs jobs until stopped; several may share a process, one per thread"""
+
+    def __init__(self, name=None, poll_interval=None):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_interval = poll_interval or getattr(settings, 'CATALOG_JOB_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        self.succeeded = self.failed = 0
+
+    def run_once(self):
+        """Run one due job; the job, or None when none was due"""
+        job = claim(self.name)
+        if job is None:
+            return None
+        if run_job(job):
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        return job
+
+    def run(self, stop, burst=False):
+        """Until `stop` (a threading.Event) is set, or the queue is empty with `burst`"""
+        while not stop.is_set():
+            # Between jobs, as between requests: drop broken or expired connections
+            close_old_connections()
+            if self.run_once() is None:
+                requeue_stale()
+                if burst:
+                    break
+                stop.wait(self.poll_interval)
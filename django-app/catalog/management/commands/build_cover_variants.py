@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from catalog.covers import build_all_cover_variants, cover_workers
+from catalog.models import Album
+
+
+class Command(BaseCommand):
+    help = 'Render the resized WebP copies (thumb, card, large) of album covers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render covers that already have variants')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Worker processes; 0 renders in this process (default CATALOG_COVER_WORKERS)',
+        )
+        parser.add_argument('--batch-size', type=int, default=100, help='Covers read per batch (default 100)')
+
+    def handle(self, *args, **options):
+        workers = cover_workers() if options['workers'] is None else options['workers']
+        if workers < 0 or options['batch_size'] < 1:
+            raise CommandError('--workers must be 0 or more and --batch-size positive')
+        albums = Album.objects.all() if options['all'] else Album.objects.filter(cover_variants={})
+
+        def progress(stats):
+            self.stdout.write(f'{sum(stats.values())} covers...')
+
+        stats = build_all_cover_variants(albums, workers, options['batch_size'], progress)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully rendered variants for {stats["rendered"]} covers '
+                f'({stats["skipped"]} replaced meanwhile, {stats["failed"]} failed)'
+            )
+        )
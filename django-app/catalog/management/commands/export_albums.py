@@ -0,0 +1,47 @@
+import time
+from django.core.management.base import BaseCommand
+from catalog.export import CHUNK_SIZE, FORMATS, export_albums
+from catalog.models import Album
+
+
+class Command(BaseCommand):
+    help = 'Export every album with its tracklist as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Output file path, or '-' for stdout")
+        parser.add_argument(
+            '--format',
+            dest='export_format',
+            choices=list(FORMATS),
+            default='csv',
+            help='csv (one row per track, default) or ndjson (one album per line)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Albums read per database round trip (default {CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Album.objects.order_by('pk')
+        lines = export_albums(queryset, options['export_format'], options['chunk_size'])
+        started = time.monotonic()
+        written = 0
+
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for line in lines:
+                output.write(line)
+                written += 1
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully exported {written} lines to {options["output"]} in {elapsed:.1f}s'
+            )
+        )
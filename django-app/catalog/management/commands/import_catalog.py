@@ -0,0 +1,73 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from catalog.importer import BATCH_SIZE, READERS, CatalogImporter, CatalogImportError, detect_format
+
+
+class Command(BaseCommand):
+    help = 'Import albums, songs and tracklists from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (one row per track) or JSONL (one album per line) file')
+        parser.add_argument(
+            '--format',
+            dest='file_format',
+            choices=list(READERS),
+            help='Input format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Albums written per transaction (default {BATCH_SIZE})',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Validate and count without writing anything')
+        parser.add_argument(
+            '--checkpoint',
+            help='Progress file used to resume after a failure (default: <path>.checkpoint)',
+        )
+        parser.add_argument('--restart', action='store_true', help='Ignore any saved checkpoint and start over')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        if options['restart'] and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        def progress(done, stats, elapsed):
+            albums = stats['albums_created'] + stats['albums_updated']
+            line = f'{done} records: {albums} albums, {stats["tracks"]} tracks, {stats["rejected"]} rejected'
+            if elapsed:
+                # Rates cover this run only, not work restored from a checkpoint
+                records = done - importer.resumed['records']
+                tracks = stats['tracks'] - importer.resumed['tracks']
+                line += f' ({records / elapsed:,.0f} records/s, {tracks / elapsed:,.0f} tracks/s)'
+            self.stdout.write(line)
+
+        importer = CatalogImporter(batch_size=options['batch_size'], dry_run=options['dry_run'], progress=progress)
+        try:
+            stats = importer.import_file(
+                path,
+                options['file_format'] or detect_format(path),
+                checkpoint_path=checkpoint,
+            )
+        except CatalogImportError as exc:
+            raise CommandError(str(exc))
+
+        for error in importer.errors:
+            self.stderr.write(error)
+        if stats['rejected'] > len(importer.errors):
+            self.stderr.write(f'... and {stats["rejected"] - len(importer.errors)} more rejected records')
+
+        summary = (
+            f'{stats["albums_created"]} albums created, {stats["albums_updated"]} updated, '
+            f'{stats["songs_created"]} songs created, {stats["songs_reused"]} reused, '
+            f'{stats["tracks"]} tracklist items written, {stats["rejected"]} records rejected'
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Dry run, nothing written: {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Successfully imported: {summary}'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from catalog.covers import migrate_to_content_addressed, storage
+from catalog.storage import ContentAddressedStorage
+
+
+def _megabytes(size):
+    return f'{size / 1024 / 1024:,.1f} MB'
+
+
+class Command(BaseCommand):
+    help = 'Move album covers stored under their upload names to content-addressed, deduplicated names'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Hash the files and report, without moving anything')
+        parser.add_argument('--keep-originals', action='store_true', help='Do not delete the files that were moved')
+        parser.add_argument('--batch-size', type=int, default=500, help='Albums rewritten per batch (default 500)')
+
+    def handle(self, *args, **options):
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError("STORAGES['covers'] is not a catalog.storage.ContentAddressedStorage")
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        def progress(stats):
+            self.stdout.write(f'{stats["albums"]} albums, {stats["files"]} files...')
+
+        stats = migrate_to_content_addressed(
+            dry_run=options['dry_run'],
+            delete_old=not options['keep_originals'],
+            batch_size=options['batch_size'],
+            progress=progress,
+        )
+        saved = stats['bytes_before'] - stats['bytes_after']
+        if stats['missing']:
+            self.stdout.write(self.style.WARNING(f'{stats["missing"]} referenced files do not exist and were left as they are'))
+        verb = 'Would move' if options['dry_run'] else 'Successfully moved'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{verb} {stats["files"]} files for {stats["albums"]} albums: '
+                f'{_megabytes(stats["bytes_before"])} -> {_megabytes(stats["bytes_after"])} '
+                f'({_megabytes(saved)} saved)'
+            )
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired refresh tokens (and their blacklist entries) in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of tokens deleted per DELETE statement (default 5000)',
+        )
+
+    def handle(self, *args, **options):
+        # Tokens expire in issue order, so a batch is the lowest expired ids;
+        # short transactions keep the table writable for refreshes meanwhile
+        now = timezone.now()
+        expired = OutstandingToken.objects.filter(expires_at__lte=now).order_by('pk').values_list('pk', flat=True)
+        tokens = revoked = 0
+        while True:
+            batch = list(expired[:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                revoked += BlacklistedToken.objects.filter(token_id__in=batch).delete()[0]
+                tokens += OutstandingToken.objects.filter(pk__in=batch).delete()[0]
+            self.stdout.write(f'Deleted {tokens} tokens, {revoked} revoked...')
+        self.stdout.write(self.style.SUCCESS(f'Successfully pruned {tokens} expired tokens ({revoked} revoked)'))
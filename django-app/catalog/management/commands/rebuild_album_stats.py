@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from catalog.stats import rebuild_album_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored track_count/total_playtime columns on every album'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of albums recomputed per UPDATE statement (default 5000)',
+        )
+
+    def handle(self, *args, **options):
+        checked, corrected = rebuild_album_stats(
+            batch_size=options['batch_size'],
+            progress=lambda checked, corrected: self.stdout.write(
+                f'Checked {checked} albums, corrected {corrected}...'
+            ),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt stats for {checked} albums ({corrected} corrected)')
+        )
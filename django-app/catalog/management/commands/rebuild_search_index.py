@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from catalog.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Create (if missing) and rebuild the album/song full-text search index'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.install(connection)
+        backend.rebuild(connection)
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt the search index ({connection.vendor})')
+        )
@@ -0,0 +1,87 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from catalog.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs (catalog.jobs) until stopped with Ctrl+C or SIGTERM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Jobs run at the same time (default 1)')
+        parser.add_argument(
+            '--pool',
+            choices=['threads', 'processes'],
+            default='threads',
+            help='threads (default; I/O-bound jobs) or processes (CPU-bound jobs), one job each',
+        )
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due')
+        parser.add_argument('--poll-interval', type=float, help='Seconds between polls of an empty queue')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        if concurrency < 1:
+            raise CommandError('--concurrency must be positive')
+        stop = threading.Event()
+        # Stop taking jobs; the running ones are finished first
+        handlers = {signum: signal.signal(signum, lambda *args: stop.set()) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            self.run_pool(concurrency, options, stop)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def run_pool(self, concurrency, options, stop):
+        self.stdout.write(f'Running jobs, {concurrency} {options["pool"] if concurrency > 1 else "worker"}...')
+        if options['pool'] == 'processes' and concurrency > 1:
+            failed = self.run_processes(concurrency, options, stop)
+            if failed:
+                raise CommandError(f'{failed} worker processes exited with an error')
+            self.stdout.write(self.style.SUCCESS(f'Successfully stopped {concurrency} worker processes'))
+            return
+
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        workers = [Worker(f'{prefix}:{index}', options['poll_interval']) for index in range(concurrency)]
+        if concurrency == 1:
+            workers[0].run(stop, options['burst'])
+        else:
+            threads = [
+                threading.Thread(target=self.run_thread, args=(worker, stop, options['burst']), daemon=True)
+                for worker in workers
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                # Polling join: a plain join() would keep Ctrl+C from reaching the handler
+                while thread.is_alive():
+                    thread.join(0.5)
+        succeeded = sum(worker.succeeded for worker in workers)
+        failed = sum(worker.failed for worker in workers)
+        self.stdout.write(self.style.SUCCESS(f'Successfully ran {succeeded + failed} jobs ({failed} failed)'))
+
+    def run_thread(self, worker, stop, burst):
+        try:
+            worker.run(stop, burst)
+        finally:
+            connections.close_all()  # this thread's connections
+
+    def run_processes(self, concurrency, options, stop):
+        """One single-worker copy of this command per process; returns how many failed"""
+        command = [sys.executable, os.path.abspath(sys.argv[0]), 'run_workers', '--concurrency', '1']
+        if options['burst']:
+            command.append('--burst')
+        if options['poll_interval'] is not None:
+            command += ['--poll-interval', str(options['poll_interval'])]
+        children = [subprocess.Popen(command) for _ in range(concurrency)]
+        while any(child.poll() is None for child in children):
+            if stop.wait(0.5):
+                for child in children:
+                    if child.poll() is None:
+                        child.terminate()  # each finishes its current job first
+                break
+        return sum(child.wait() != 0 for child in children)
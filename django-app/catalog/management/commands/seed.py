@@ -1,13 +1,67 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import Group
 from catalog.models import MusicManagerUser, Album, Song, AlbumTracklistItem
+from catalog.synthetic import BATCH_SIZE, SHARED_TRACK_RATIO, CatalogGenerator, next_album_index
 from datetime import date, timedelta
 from decimal import Decimal
 
 class Command(BaseCommand):
-    help = 'Seed database with sample data for testing'
-    
+    help = (
+        'Seed database with sample data for testing, or with a large synthetic '
+        'catalog when --albums is given'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--albums', type=int, help='Generate this many synthetic albums')
+        parser.add_argument(
+            '--songs', type=int,
+            help='Size of the song pool (default: enough for every track, less the shared ones)',
+        )
+        parser.add_argument('--tracks-per-album', type=int, default=10, help='Mean tracks per album (default 10)')
+        parser.add_argument('--artists', type=int, help='Number of distinct artists (default albums / 10)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same catalog')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help=f'Rows per bulk insert (default {BATCH_SIZE})')
+        parser.add_argument('--no-covers', action='store_true', help='Do not give any album a cover image')
+
     def handle(self, *args, **options):
+        if options['albums'] is not None:
+            self.seed_catalog(options)
+        else:
+            self.seed_samples()
+
+    def seed_catalog(self, options):
+        albums = options['albums']
+        tracks_per_album = options['tracks_per_album']
+        songs = options['songs']
+        if songs is None:
+            songs = int(albums * tracks_per_album * (1 - SHARED_TRACK_RATIO))
+        if min(albums, songs, tracks_per_album, options['batch_size']) < 0 or options['batch_size'] == 0:
+            raise CommandError('Sizes must be positive')
+
+        def progress(stage, done, total, elapsed):
+            rate = done / elapsed if elapsed else 0
+            self.stdout.write(f'{stage}: {done}/{total} ({rate:,.0f}/s)')
+
+        generator = CatalogGenerator(
+            albums, songs,
+            tracks_per_album=tracks_per_album,
+            artists=options['artists'],
+            seed=options['seed'],
+            # Continue numbering after earlier runs so album titles stay unique
+            first_index=next_album_index(),
+            batch_size=options['batch_size'],
+            covers=not options['no_covers'],
+            progress=progress,
+        )
+        song_count, album_count, track_count = generator.run()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully generated {album_count} albums, {song_count} songs '
+                f'and {track_count} tracklist items'
+            )
+        )
+
+    def seed_samples(self):
         # Create sample users
         editor_group = Group.objects.get(name='Editor')
         artist_group = Group.objects.get(name='Artist')
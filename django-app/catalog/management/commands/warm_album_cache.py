@@ -0,0 +1,54 @@
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from catalog.caching import cache_enabled, cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Fill the album API cache with the first list pages and the albums on them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=10,
+            help='Number of /api/albums/ pages to warm, following their next links (default 10)',
+        )
+        parser.add_argument(
+            '--base-url',
+            default='http://localhost:8000',
+            help='Scheme and host clients use; cached payloads embed absolute URLs (default http://localhost:8000)',
+        )
+
+    def handle(self, *args, **options):
+        if not cache_enabled():
+            raise CommandError('CATALOG_RESPONSE_CACHE is off; nothing to warm')
+        base = urlsplit(options['base_url'])
+        client = Client(HTTP_HOST=base.netloc, HTTP_ACCEPT='application/json')
+        secure = base.scheme == 'https'
+
+        def get(url):
+            response = client.get(url, secure=secure)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: HTTP {response.status_code}')
+            return response.json()
+
+        url, pages, album_ids = '/api/albums/', 0, []
+        while url and pages < options['pages']:
+            data = get(url)
+            album_ids.extend(album['id'] for album in data['results'])
+            pages += 1
+            next_url = data.get('next')
+            url = urlsplit(next_url)._replace(scheme='', netloc='').geturl() if next_url else None
+            self.stdout.write(f'Warmed {pages} pages...')
+
+        for album_id in album_ids:
+            get(f'/api/albums/{album_id}/')
+
+        stats = cache_stats()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully warmed {pages} list pages and {len(album_ids)} albums '
+                f'(cache hits {stats["hits"]}, misses {stats["misses"]})'
+            )
+        )
@@ -0,0 +1,31 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from .bus import bus
+from .caching import apply_bus_changes
+
+
+class CatalogBusMiddleware:
+    """
+    Expires cached album payloads that other worker processes invalidated.
+    Polls the bus at most once per CATALOG_BUS_POLL_INTERVAL (see catalog.bus).
+
+    Async-capable, so ASGI requests to async views do not switch to a thread
+    for it; the poll itself, when due, runs in one.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        apply_bus_changes()
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if bus.due():
+            await sync_to_async(apply_bus_changes)()
+        return await self.get_response(request)
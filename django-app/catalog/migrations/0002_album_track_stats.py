@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_track_stats(apps, schema_editor):
+    Album = apps.get_model('catalog', 'Album')
+    AlbumTracklistItem = apps.get_model('catalog', 'AlbumTracklistItem')
+
+    def aggregate(expression):
+        per_album = (
+            AlbumTracklistItem.objects.filter(album=OuterRef('pk'))
+            .order_by().values('album').annotate(value=expression).values('value')
+        )
+        return Coalesce(Subquery(per_album), Value(0))
+
+    Album.objects.update(
+        track_count=aggregate(Count('id')),
+        total_playtime=aggregate(Sum('song__running_time')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='total_playtime',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='track_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_track_stats, migrations.RunPython.noop),
+    ]
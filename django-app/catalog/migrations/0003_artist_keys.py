@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:31
+
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 2000
+
+
+def normalize_artist(value):
+    # Frozen copy of catalog.models.normalize_artist
+    return ' '.join((value or '').split()).casefold()[:512]
+
+
+def backfill_keys(model, source, target):
+    last_pk = 0
+    while True:
+        batch = list(model.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', source)[:BATCH_SIZE])
+        if not batch:
+            break
+        for obj in batch:
+            setattr(obj, target, normalize_artist(getattr(obj, source)))
+        with transaction.atomic():
+            model.objects.bulk_update(batch, [target])
+        last_pk = batch[-1].pk
+
+
+def backfill_artist_keys(apps, schema_editor):
+    backfill_keys(apps.get_model('catalog', 'Album'), 'artist', 'artist_key')
+    backfill_keys(apps.get_model('catalog', 'MusicManagerUser'), 'display_name', 'display_name_key')
+
+
+class Migration(migrations.Migration):
+
+    # Let each backfill batch commit on its own for large catalogs
+    atomic = False
+
+    dependencies = [
+        ('catalog', '0002_album_track_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='artist_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=512),
+        ),
+        migrations.AddField(
+            model_name='musicmanageruser',
+            name='display_name_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=512),
+        ),
+        migrations.RunPython(backfill_artist_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_artist_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['title', 'id'], name='album_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='albumtracklistitem',
+            index=models.Index(fields=['position', 'id'], name='tracklist_position_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['title', 'id'], name='song_title_id_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:21
+
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 2000
+
+
+def normalize_title(value):
+    # Frozen copy of catalog.models.normalize_title
+    return ' '.join((value or '').split()).casefold()[:512]
+
+
+def backfill_title_keys(apps, schema_editor):
+    Song = apps.get_model('catalog', 'Song')
+    last_pk = 0
+    while True:
+        batch = list(Song.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'title')[:BATCH_SIZE])
+        if not batch:
+            break
+        for song in batch:
+            song.title_key = normalize_title(song.title)
+        with transaction.atomic():
+            Song.objects.bulk_update(batch, ['title_key'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    # Let each backfill batch commit on its own for large catalogs
+    atomic = False
+
+    dependencies = [
+        ('catalog', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='title_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=512),
+        ),
+        migrations.RunPython(backfill_title_keys, migrations.RunPython.noop),
+    ]
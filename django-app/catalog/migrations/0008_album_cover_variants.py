@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_catalog_bus'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='cover_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
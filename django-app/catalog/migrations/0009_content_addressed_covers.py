@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:19
+
+import catalog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_album_cover_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='album',
+            name='cover_image',
+            field=models.ImageField(blank=True, null=True, storage=catalog.storage.cover_storage, upload_to='album_covers/'),
+        ),
+    ]
@@ -1,9 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from datetime import date, timedelta
+from .imaging import COVER_SIZES
+from .slugs import save_with_slug
+from .storage import cover_storage
 
 def validate_release_date(value):
     """Validate that release_date is not more than 3 years in the future"""
@@ -11,6 +14,31 @@ def validate_release_date(value):
     if value > max_future_date:
         raise ValidationError('Release date cannot be more than 3 years in the future.')
 
+def normalize_artist(value):
+    """Artist matching key: casefolded with runs of whitespace collapsed"""
+    return ' '.join((value or '').split()).casefold()[:512]
+
+def shorten_description(value):
+    """First 100 characters of a description, with an ellipsis when cut"""
+    if value:
+        return value[:100] + '...' if len(value) > 100 else value
+    return ''
+
+def normalize_title(value):
+    """Song matching key, normalized the same way as artist names"""
+    return normalize_artist(value)
+
+def cover_urls(name, variants):
+    """{'original': url, <size>: url, ...}; sizes without a variant use the original"""
+    if not name:
+        return None
+    storage = Album._meta.get_field('cover_image').storage
+    original = storage.url(name)
+    urls = {'original': original}
+    for size in COVER_SIZES:
+        urls[size] = storage.url(variants[size]) if size in variants else original
+    return urls
+
 class MusicManagerUser(AbstractUser):
     """Custom user model with display_name and role"""
     ROLE_CHOICES = [
@@ -20,11 +48,32 @@ class MusicManagerUser(AbstractUser):
     ]
     
     display_name = models.CharField(max_length=512)
+    display_name_key = models.CharField(max_length=512, db_index=True, editable=False, default='')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='viewer')
 
+    def save(self, *args, **kwargs):
+        self.display_name_key = normalize_artist(self.display_name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'display_name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'display_name_key'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.display_name
 
+    def is_artist_of(self, album):
+        """True when this user is an artist and the album is credited to them"""
+        return self.role == 'artist' and album.artist_key == self.display_name_key
+
+class AlbumQuerySet(models.QuerySet):
+    def with_tracklist(self):
+        """Prefetch the ordered tracklist and its songs in one extra query"""
+        return self.prefetch_related(models.Prefetch(
+            'albumtracklistitem_set',
+            queryset=AlbumTracklistItem.objects.select_related('song').order_by('position'),
+            to_attr='prefetched_tracklist',
+        ))
+
 class Album(models.Model):
     """Album model with string artist field"""
     FORMAT_CHOICES = [
@@ -33,10 +82,13 @@ class Album(models.Model):
         ('vi', 'Vinyl'),
     ]
     
-    cover_image = models.ImageField(upload_to='album_covers/', blank=True, null=True)
+    cover_image = models.ImageField(upload_to='album_covers/', storage=cover_storage, blank=True, null=True)
+    # Size name -> storage name of the resized WebP copies (see catalog.covers)
+    cover_variants = models.JSONField(default=dict, blank=True, editable=False)
     title = models.CharField(max_length=512)
     description = models.TextField(blank=True)
     artist = models.CharField(max_length=512)  # String field, not FK
+    artist_key = models.CharField(max_length=512, db_index=True, editable=False, default='')  # normalize_artist(artist)
     price = models.DecimalField(
         max_digits=5, 
         decimal_places=2,
@@ -45,35 +97,82 @@ class Album(models.Model):
     format = models.CharField(max_length=2, choices=FORMAT_CHOICES)
     release_date = models.DateField(validators=[validate_release_date])
     slug = models.SlugField(unique=True, blank=True)
+
+    # Denormalized tracklist stats, maintained by catalog.signals / catalog.stats
+    track_count = models.PositiveIntegerField(default=0, editable=False)
+    total_playtime = models.PositiveIntegerField(default=0, editable=False)  # seconds
+
+    # Bumped on every save and on tracklist/song edits (see catalog.signals);
+    # drives the API's ETag/Last-Modified headers
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     # Many-to-many relationship with Song through AlbumTracklistItem
     tracks = models.ManyToManyField('Song', through='AlbumTracklistItem', blank=True)
+
+    objects = AlbumQuerySet.as_manager()
+
+    STATS_FIELDS = ('track_count', 'total_playtime')  # never written by save()
     
     class Meta:
         unique_together = ('title', 'artist', 'format')
         ordering = ['title']  # Default ordering to fix pagination warnings
+        indexes = [
+            models.Index(fields=['title', 'id'], name='album_title_id_idx'),  # keyset pagination
+        ]
 
     def save(self, *args, **kwargs):
+        self.artist_key = normalize_artist(self.artist)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # The stats columns belong to catalog.signals / catalog.stats; an
+            # instance loaded before a tracklist change would overwrite them
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in self.STATS_FIELDS and field.attname not in deferred
+            ]
+            kwargs['update_fields'] = update_fields
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'updated_at'}
+            if 'artist' in update_fields:
+                kwargs['update_fields'].add('artist_key')
+        self._cover_changed = self.cover_image_changed() and (update_fields is None or 'cover_image' in update_fields)
+        if self._cover_changed:
+            # The old cover's variants no longer apply; catalog.signals renders new ones
+            self.cover_variants = {}
+            if update_fields is not None:
+                kwargs['update_fields'].add('cover_variants')
         if not self.slug:
-            base_slug = slugify(f"{self.title}-{self.artist}")
-            slug = base_slug
-            counter = 1
-            while Album.objects.filter(slug=slug).exclude(id=self.id).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
+            # Allocates the next free slug in one query and retries on a lost race
+            save_with_slug(self, lambda: super(Album, self).save(*args, **kwargs))
+            return
         super().save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded cover so a save can tell whether it was replaced
+        instance._loaded_cover_image = instance.__dict__.get('cover_image')
+        return instance
+
+    def cover_image_changed(self):
+        """True when the cover was uploaded or replaced since the album was loaded"""
+        cover = self.cover_image
+        return not cover._committed or (cover.name or '') != (getattr(self, '_loaded_cover_image', None) or '')
+
     def __str__(self):
         return f"{self.title} by {self.artist}"
     
     @property
     def short_description(self):
         """Return first 100 characters of description"""
-        if self.description:
-            return self.description[:100] + '...' if len(self.description) > 100 else self.description
-        return ''
+        return shorten_description(self.description)
     
+    @property
+    def cover_images(self):
+        """Cover URL per size ('original', 'thumb', 'card', 'large'), or None without a cover"""
+        return cover_urls(self.cover_image.name, self.cover_variants)
+
     @property
     def release_year(self):
         """Return year of release"""
@@ -86,26 +185,43 @@ class Album(models.Model):
             return self.cover_image.url
         return '/static/default_album_cover.jpg'  # You should add a default image
     
-    @property
-    def total_playtime(self):
-        """Calculate total playtime from tracks"""
-        total = 0
-        for track_item in self.albumtracklistitem_set.all():
-            total += track_item.song.running_time
-        return total
-    
     @property
     def tracklist(self):
-        """Return ordered tracklist"""
-        return self.albumtracklistitem_set.all().order_by('position')
+        """Return ordered tracklist, using Album.objects.with_tracklist() data when present"""
+        prefetched = getattr(self, 'prefetched_tracklist', None)
+        if prefetched is not None:
+            return prefetched
+        return self.albumtracklistitem_set.select_related('song').order_by('position')
 
 class Song(models.Model):
     """Song model - no direct FK to artist/album, only many-to-many through AlbumTracklistItem"""
     title = models.CharField(max_length=512)
+    title_key = models.CharField(max_length=512, db_index=True, editable=False, default='')  # normalize_title(title)
     running_time = models.PositiveIntegerField(validators=[MinValueValidator(10)])  # seconds, minimum 10
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['title']  # Default ordering to fix pagination warnings
+        indexes = [
+            models.Index(fields=['title', 'id'], name='song_title_id_idx'),  # keyset pagination
+        ]
+
+    def save(self, *args, **kwargs):
+        self.title_key = normalize_title(self.title)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'updated_at'}
+            if 'title' in update_fields:
+                kwargs['update_fields'].add('title_key')
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded values so signals can tell whether albums need a refresh
+        instance._loaded_running_time = instance.__dict__.get('running_time')
+        instance._loaded_title = instance.__dict__.get('title')
+        return instance
 
     def __str__(self):
         return self.title
@@ -117,10 +233,109 @@ class AlbumTracklistItem(models.Model):
     song = models.ForeignKey(Song, on_delete=models.CASCADE)
     album = models.ForeignKey(Album, on_delete=models.CASCADE)
     position = models.PositiveIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['position']
         unique_together = ('album', 'song')
+        indexes = [
+            models.Index(fields=['position', 'id'], name='tracklist_position_id_idx'),  # keyset pagination
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded album so moving an item refreshes both albums
+        instance._loaded_album_id = instance.__dict__.get('album_id')
+        return instance
 
     def __str__(self):
-        return f"{self.album.title} - Track {self.position}: {self.song.title}"
\ No newline at end of file
+        return f"{self.album.title} - Track {self.position}: {self.song.title}"
+
+class CatalogGeneration(models.Model):
+    """
+    Catalog-wide change counter for the database invalidation bus (catalog.bus).
+    Bumped under a row lock, so generations commit in order.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class CatalogChange(models.Model):
+    """Albums changed in one catalog generation; album_ids is null when everything changed"""
+    generation = models.PositiveBigIntegerField(primary_key=True)
+    album_ids = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Generation {self.generation}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by `manage.py run_workers` (see catalog.jobs).
+    At most one job per `key` waits in the queue at a time.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=200, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)  # not before; pushed back between retries
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+
+    progress_done = models.PositiveBigIntegerField(default=0)
+    progress_total = models.PositiveBigIntegerField(null=True, blank=True)
+    progress_message = models.CharField(max_length=200, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # last progress report while running
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),  # claiming
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=models.Q(status='queued'), name='job_queued_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+    @property
+    def progress(self):
+        """Fraction done, or None while the total is unknown"""
+        if self.status == self.DONE:
+            return 1.0
+        if not self.progress_total:
+            return None
+        return min(self.progress_done / self.progress_total, 1.0)
+
+    def report_progress(self, done, total=None, message=''):
+        """Record progress for the admin; also the running job's heartbeat"""
+        self.progress_done, self.progress_total, self.progress_message = done, total, message[:200]
+        self.heartbeat_at = timezone.now()
+        Job.objects.filter(pk=self.pk).update(
+            progress_done=done, progress_total=total, progress_message=self.progress_message,
+            heartbeat_at=self.heartbeat_at,
+        )
@@ -0,0 +1,204 @@
+import base64
+import binascii
+import json
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _row_value(row, field):
+    if isinstance(row, dict):
+        return row[field]
+    return getattr(row, field)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination on a composite ordering such as (title, id).
+
+    Each page is fetched with `WHERE (title, id) > (last_title, last_id)
+    ORDER BY title, id LIMIT n`, which an index on the same columns answers
+    directly, so there is no COUNT(*) and no OFFSET scan: page 10,000 costs
+    the same as page 1. The last key of the page is encoded in an opaque
+    cursor; nullable keys follow the backend's native NULL ordering.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    page_size = api_settings.PAGE_SIZE
+
+    def get_ordering(self, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering:
+            return list(ordering)
+        return [*queryset.model._meta.ordering, 'id']
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, with the same result"""
+        return self.set_page([row async for row in self.get_page_queryset(queryset, request, view)])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """The page's rows plus one, to tell whether there is another page"""
+        self.request = request
+        self.ordering = self.get_ordering(queryset, view)
+        self.model = queryset.model
+        self.cursor = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if self.cursor is not None:
+            values, reverse = self.cursor
+            queryset = queryset.filter(self.seek_filter(values, 'lt' if reverse else 'gt'))
+            if reverse:
+                queryset = queryset.reverse()
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        cursor = self.cursor
+        reverse = cursor is not None and cursor[1]
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = rows
+        return rows
+
+    def seek_filter(self, values, lookup):
+        """Rows strictly after ('gt') or before ('lt') the given key in sort order"""
+        condition = Q(pk__in=[])
+        equal_prefix = Q()
+        for field, value in zip(self.ordering, values):
+            condition |= equal_prefix & self._beyond(field, value, lookup)
+            equal_prefix &= Q(**{f'{field}__isnull': True}) if value is None else Q(**{field: value})
+        # The OR above is exact but not sargable; an explicit range on the
+        # leading column lets the database seek into the index instead of
+        # scanning it from the start.
+        return self._leading_bound(self.ordering[0], values[0], lookup) & condition
+
+    def _leading_bound(self, field, value, lookup):
+        nullable = self.model._meta.get_field(field).null
+        nulls_last = (lookup == 'gt') == connection.features.nulls_order_largest
+        if value is None:
+            return Q(**{f'{field}__isnull': True}) if nulls_last else Q()
+        bound = Q(**{f'{field}__{lookup}e': value})
+        if nullable and nulls_last:
+            bound |= Q(**{f'{field}__isnull': True})
+        return bound
+
+    def _beyond(self, field, value, lookup):
+        nullable = self.model._meta.get_field(field).null
+        nulls_last = (lookup == 'gt') == connection.features.nulls_order_largest
+        if value is None:
+            # NULL sits at one end of the ordering
+            return Q(pk__in=[]) if nulls_last else Q(**{f'{field}__isnull': False})
+        condition = Q(**{f'{field}__{lookup}': value})
+        if nullable and nulls_last:
+            condition |= Q(**{f'{field}__isnull': True})
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            values, reverse = payload['v'], bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [self.cursor_value(field, value) for field, value in zip(self.ordering, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def cursor_value(self, name, value):
+        """A decoded cursor value as the ordering field's Python type"""
+        field = self.model._meta.get_field(name)
+        if value is None:
+            if not field.null:
+                raise ValueError(name)
+            return None
+        if isinstance(value, (list, dict)):
+            raise TypeError(name)
+        value = field.to_python(value)
+        field.run_validators(value)  # e.g. the backend's integer range
+        return value
+
+    def encode_cursor(self, row, reverse):
+        payload = {'v': [_row_value(row, field) for field in self.ordering]}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Ran past the end; restart from the first page in cursor mode
+            return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, '')
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class CatalogPagination(PageNumberPagination):
+    """
+    Page-number pagination by default; clients opt into keyset pagination
+    by sending a `cursor` parameter (empty for the first page) and then
+    following the returned `next`/`previous` links.
+    """
+    cursor_query_param = 'cursor'
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views: counts and fetches the page with the async ORM"""
+        if self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+        self.keyset = None
+        self.request = request
+        paginator = self.django_paginator_class(queryset, self.page_size)
+        # Django's Paginator counts synchronously; its count is a cached_property
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [row async for row in self.page.object_list]
+        return self.page.object_list
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
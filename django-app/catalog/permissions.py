@@ -20,4 +20,4 @@ class IsViewer(BasePermission):
     
 class IsViewerOrEditor(BasePermission):
     def has_permission(self, request, view):
-        return request.user.role in ['editor', 'viewer', 'artist']
\ No newline at end of file
+        return getattr(request.user, "role", None) in ['editor', 'viewer', 'artist']
\ No newline at end of file
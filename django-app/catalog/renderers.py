@@ -0,0 +1,97 @@
+"""
+JSON renderer and parser backed by orjson, when it is installed.
+
+Drop-in replacements for DRF's JSONRenderer/JSONParser, enabled through
+`DEFAULT_RENDERER_CLASSES` / `DEFAULT_PARSER_CLASSES` in `REST_FRAMEWORK`
+(list DRF's own classes there instead to switch back). The output is the same bytes as DRF's compact, unicode JSON. orjson writes
+dates, times and datetimes itself (ISO 8601 with a `Z` suffix for UTC, as
+DRF's JSONEncoder does); Decimal values that reach the renderer unconverted
+become numbers, as with DRF, and the few other types DRF's JSONEncoder knows
+go through its `default()`.
+
+Anything orjson cannot do exactly like DRF goes to the stdlib classes
+unchanged: indented output (the browsable API, `; indent=4`), non-compact or
+ASCII-only settings, integers beyond 64 bits, bodies in another charset and
+malformed bodies, whose error messages therefore stay the same. Without
+orjson both classes are DRF's.
+"""
+import codecs
+import io
+from decimal import Decimal
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib json module
+    orjson = None
+
+if orjson is not None:
+    OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.get_default(), option=OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like DRF does, so the output is a strict javascript subset
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
+
+    def get_default(self):
+        fallback = self.encoder_class().default
+
+        def default(obj):
+            # Prices are the common case; skip the encoder's isinstance() chain
+            return float(obj) if type(obj) is Decimal else fallback(obj)
+        return default
+
+
+class NDJSONRenderer(FastJSONRenderer):
+    """
+    Newline-delimited JSON: one compact document per line, one line per list
+    item. List endpoints stream it instead (catalog.streaming); this renders
+    everything else, such as single records and errors.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return self.render_lines(data if isinstance(data, list) else [data])
+
+    def render_lines(self, records):
+        return b''.join([super(NDJSONRenderer, self).render(record) + b'\n' for record in records])
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None or not self.strict or not _is_utf8((parser_context or {}).get('encoding')):
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+def _is_utf8(encoding):
+    try:
+        return codecs.lookup(encoding or settings.DEFAULT_CHARSET).name == 'utf-8'
+    except LookupError:
+        return False  # DRF's parser rejects it
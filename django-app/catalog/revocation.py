@@ -0,0 +1,141 @@
+"""
+Revoked refresh tokens, checked against an in-memory Bloom filter first.
+
+With ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION every refresh adds
+the old token to simplejwt's blacklist table, and every refresh checks the
+presented token against that table. `CatalogRefreshToken.check_blacklist`
+asks `revoked_tokens` instead. Each process keeps a Bloom filter of the
+revoked token ids (jti) that have not expired yet:
+
+* a jti the filter does not contain was not revoked, and no query is run;
+  that is nearly every refresh;
+* a jti it contains (a revoked token, or a false positive, about
+  CATALOG_REVOCATION_ERROR_RATE of the others) is looked up in the table.
+
+The filter is built from the table on first use in the process, and
+rebuilt with twice the room once it holds more ids than it was sized for.
+Tokens revoked in this process are added as they are saved. Those revoked
+by other processes are read at most every CATALOG_REVOCATION_SYNC_INTERVAL
+seconds, by id, so a token revoked elsewhere is refused everywhere within
+that interval. Ids skipped by a sync (rows of a transaction that had not
+committed yet) are asked for again for GAP_TIMEOUT seconds.
+
+`manage.py prune_revoked_tokens` deletes expired tokens from the tables.
+CATALOG_REVOCATION_FILTER = False checks the table for every refresh.
+"""
+import hashlib
+import math
+import threading
+import time
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+DEFAULT_CAPACITY = 100000  # ids before the first rebuild
+DEFAULT_ERROR_RATE = 0.01
+DEFAULT_SYNC_INTERVAL = 1.0  # seconds
+GAP_TIMEOUT = 60  # seconds a skipped id is looked for; a rolled back one never appears
+
+
+class BloomFilter:
+    """
+    Set of strings that may answer "present" for an absent one (at about
+    `error_rate` once it holds `capacity` strings) but never the reverse
+    """
+
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))  # bits
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, value):
+        # Double hashing: the k positions from two halves of one digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+
+class RevocationList:
+    """The revoked jtis of this process, see the module docstring"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the filter; the next check builds it again"""
+        self.filter = None
+        self.last_id = 0
+        self.gaps = {}  # id -> monotonic time it was found missing
+        self.synced_at = 0.0
+
+    def enabled(self):
+        return getattr(settings, 'CATALOG_REVOCATION_FILTER', True)
+
+    def live_rows(self, queryset):
+        return queryset.filter(token__expires_at__gt=timezone.now()).values_list('pk', 'token__jti')
+
+    def build(self, capacity=None):
+        """Load every unexpired revoked jti into a new filter"""
+        last_id = BlacklistedToken.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+        rows = list(self.live_rows(BlacklistedToken.objects.filter(pk__lte=last_id)).iterator(chunk_size=10000))
+        capacity = max(capacity or 0, len(rows) * 2, getattr(settings, 'CATALOG_REVOCATION_CAPACITY', DEFAULT_CAPACITY))
+        self.filter = BloomFilter(capacity, getattr(settings, 'CATALOG_REVOCATION_ERROR_RATE', DEFAULT_ERROR_RATE))
+        for _, jti in rows:
+            self.filter.add(jti)
+        self.last_id = last_id
+        self.gaps = {}
+        self.synced_at = time.monotonic()
+
+    def sync(self):
+        """Add the tokens revoked since the last sync (by any process)"""
+        now = time.monotonic()
+        self.gaps = {pk: since for pk, since in self.gaps.items() if now - since < GAP_TIMEOUT}
+        queryset = BlacklistedToken.objects.filter(Q(pk__gt=self.last_id) | Q(pk__in=list(self.gaps)))
+        for pk, jti in self.live_rows(queryset).order_by('pk'):
+            self.filter.add(jti)
+            self.gaps.pop(pk, None)
+            if pk > self.last_id:
+                self.gaps.update(dict.fromkeys(range(self.last_id + 1, pk), now))
+                self.last_id = pk
+        self.synced_at = now
+        self.grow()
+
+    def grow(self):
+        if self.filter.count > self.filter.capacity:
+            self.build(self.filter.capacity * 2)
+
+    def add(self, jti):
+        """Record a token revoked in this process"""
+        with self.lock:
+            if self.filter is None:
+                return  # it is read with the rest when the filter is built
+            self.filter.add(jti)
+            self.grow()
+
+    def is_revoked(self, jti):
+        if not self.enabled():
+            return BlacklistedToken.objects.filter(token__jti=jti).exists()
+        with self.lock:
+            if self.filter is None:
+                self.build()
+            elif time.monotonic() - self.synced_at >= getattr(
+                settings, 'CATALOG_REVOCATION_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL,
+            ):
+                self.sync()
+            maybe = jti in self.filter
+        return maybe and BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+revoked_tokens = RevocationList()
@@ -0,0 +1,257 @@
+"""
+Full-text search over albums and songs.
+
+SQLite uses FTS5 external-content tables that mirror `Album.title/artist/
+description` and `Song.title`; triggers keep them in sync on every write,
+including bulk_create/update() paths that skip Django signals. PostgreSQL
+uses GIN expression indexes over a weighted `to_tsvector`. Other backends
+fall back to `icontains` filters.
+
+All terms must match (AND) and every term is matched as a prefix, so
+"abb roa" finds "Abbey Road".
+"""
+import re
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import Album, Song
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# kind -> (model, indexed columns, bm25 column weights); Postgres ranks
+# columns with setweight labels A, B, C in the same order instead
+INDEXES = {
+    'albums': (Album, ('title', 'artist', 'description'), (10.0, 5.0, 1.0)),
+    'songs': (Song, ('title',), (1.0,)),
+}
+PG_WEIGHT_LABELS = 'ABCD'
+
+
+def search_terms(query):
+    """Split user input into lowercase word tokens"""
+    return [term.lower() for term in TERM_RE.findall(query or '')]
+
+
+def _fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+class SQLiteSearchBackend:
+    """FTS5 external-content tables ranked with bm25()"""
+
+    def match_param(self, terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def matching_ids_sql(self, kind):
+        table = _fts_table(INDEXES[kind][0])
+        return f'SELECT rowid FROM {table} WHERE {table} MATCH %s'
+
+    def count(self, kind, terms):
+        table = _fts_table(INDEXES[kind][0])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {table} WHERE {table} MATCH %s', [self.match_param(terms)])
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, kind, terms, offset, limit):
+        model, columns, weights = INDEXES[kind]
+        table = _fts_table(model)
+        bm25_args = ', '.join(str(weight) for weight in weights)
+        sql = (
+            f'SELECT rowid FROM {table} WHERE {table} MATCH %s '
+            f'ORDER BY bm25({table}, {bm25_args}), rowid LIMIT %s OFFSET %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.match_param(terms), limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+    def install(self, conn):
+        """Create missing FTS tables/triggers; rebuild any index that was (re)created"""
+        with conn.cursor() as cursor:
+            for model, columns, weights in INDEXES.values():
+                source = model._meta.db_table
+                table = _fts_table(model)
+                cols = ', '.join(columns)
+                new_cols = ', '.join(f'new.{col}' for col in columns)
+                old_cols = ', '.join(f'old.{col}' for col in columns)
+                cursor.execute(
+                    "SELECT count(*) FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+                    [table, f'{table}_ai', f'{table}_ad', f'{table}_au'],
+                )
+                if cursor.fetchone()[0] == 4:
+                    # Fully installed; only an emptied (flushed) source table
+                    # needs its stale index entries dropped by the rebuild below
+                    cursor.execute(f'SELECT 1 FROM {source} LIMIT 1')
+                    if cursor.fetchone() is not None:
+                        continue
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                    f"{cols}, content='{source}', content_rowid='id', "
+                    f"tokenize='unicode61 remove_diacritics 2')"
+                )
+                # Schema changes on SQLite rebuild the source table and drop its
+                # triggers, so they are re-created here after every migrate.
+                cursor.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {source} BEGIN '
+                    f'INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_cols}); END'
+                )
+                cursor.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {source} BEGIN '
+                    f"INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END"
+                )
+                cursor.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {cols} ON {source} BEGIN '
+                    f"INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+                    f'INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_cols}); END'
+                )
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+    def rebuild(self, conn):
+        with conn.cursor() as cursor:
+            for model, columns, weights in INDEXES.values():
+                table = _fts_table(model)
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+class PostgresSearchBackend:
+    """Weighted tsvector expressions backed by GIN expression indexes"""
+
+    def vector_sql(self, kind):
+        # Must stay byte-for-byte identical to the indexed expression
+        model, columns, weights = INDEXES[kind]
+        return ' || '.join(
+            f"setweight(to_tsvector('simple', coalesce({col}, '')), '{label}')"
+            for col, label in zip(columns, PG_WEIGHT_LABELS)
+        )
+
+    def match_param(self, terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def matching_ids_sql(self, kind):
+        table = INDEXES[kind][0]._meta.db_table
+        return f"SELECT id FROM {table} WHERE ({self.vector_sql(kind)}) @@ to_tsquery('simple', %s)"
+
+    def count(self, kind, terms):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM ({self.matching_ids_sql(kind)}) matches', [self.match_param(terms)])
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, kind, terms, offset, limit):
+        table = INDEXES[kind][0]._meta.db_table
+        vector = self.vector_sql(kind)
+        sql = (
+            f"SELECT id FROM {table} WHERE ({vector}) @@ to_tsquery('simple', %s) "
+            f"ORDER BY ts_rank(({vector}), to_tsquery('simple', %s)) DESC, id LIMIT %s OFFSET %s"
+        )
+        param = self.match_param(terms)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [param, param, limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+    def install(self, conn):
+        with conn.cursor() as cursor:
+            for kind, (model, columns, weights) in INDEXES.items():
+                table = model._meta.db_table
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} '
+                    f'USING gin (({self.vector_sql(kind)}))'
+                )
+
+    def rebuild(self, conn):
+        with conn.cursor() as cursor:
+            for model, columns, weights in INDEXES.values():
+                cursor.execute(f'REINDEX INDEX {model._meta.db_table}_search_idx')
+
+
+class FallbackSearchBackend:
+    """Unindexed icontains matching for backends without full-text support"""
+
+    def matching_queryset(self, kind, terms):
+        model, columns, weights = INDEXES[kind]
+        condition = Q()
+        for term in terms:
+            term_match = Q()
+            for column in columns:
+                term_match |= Q(**{f'{column}__icontains': term})
+            condition &= term_match
+        return model.objects.filter(condition)
+
+    def count(self, kind, terms):
+        return self.matching_queryset(kind, terms).count()
+
+    def ranked_ids(self, kind, terms, offset, limit):
+        ids = self.matching_queryset(kind, terms).values_list('pk', flat=True)
+        return list(ids[offset:offset + limit])
+
+    def install(self, conn):
+        pass
+
+    def rebuild(self, conn):
+        pass
+
+
+def get_backend(conn=None):
+    vendor = (conn or connection).vendor
+    if vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    if vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return FallbackSearchBackend()
+
+
+class SearchResults:
+    """
+    Lazily evaluated, ranked search hits.
+
+    Behaves enough like a queryset for Django's Paginator (and therefore
+    DRF's PageNumberPagination): `count()` runs one index query and slicing
+    fetches only the ids for that page plus one `in_bulk` lookup.
+    """
+
+    def __init__(self, kind, query):
+        self.kind = kind
+        self.terms = search_terms(query)
+        self.model = INDEXES[kind][0]
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = get_backend().count(self.kind, self.terms) if self.terms else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        stop = self.count() if item.stop is None else item.stop
+        if not self.terms or stop <= start:
+            return []
+        ids = get_backend().ranked_ids(self.kind, self.terms, start, stop - start)
+        objects = self.model.objects.in_bulk(ids)
+        return [objects[pk] for pk in ids if pk in objects]
+
+
+def search(kind, query):
+    """Ranked search over 'albums' or 'songs'"""
+    return SearchResults(kind, query)
+
+
+def filter_queryset(queryset, query):
+    """Restrict `queryset` to rows matching `query`, keeping its own ordering"""
+    kind = 'albums' if queryset.model is Album else 'songs'
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+    backend = get_backend()
+    if isinstance(backend, FallbackSearchBackend):
+        return queryset.filter(pk__in=backend.matching_queryset(kind, terms).values('pk'))
+    return queryset.filter(pk__in=RawSQL(backend.matching_ids_sql(kind), [backend.match_param(terms)]))
+
+
+def install_search_index(using='default', **kwargs):
+    """post_migrate hook: make sure the index structures exist for this database"""
+    from django.db import connections
+    conn = connections[using]
+    get_backend(conn).install(conn)
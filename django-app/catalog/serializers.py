@@ -1,17 +1,32 @@
+from collections import Counter
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from .models import Album, Song, AlbumTracklistItem, MusicManagerUser
 from django.contrib.auth.password_validation import validate_password
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from .authentication import CatalogRefreshToken, add_user_claims
+from .tracklists import in_chunks, replace_tracklist
 
 User = get_user_model()
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Tokens carry the claims catalog.authentication builds request.user from"""
+    token_class = CatalogRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         data = super().validate(attrs)
         data['role'] = self.user.role
         return data
 
+class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    """Re-reads the claims from the database, so role changes reach new access tokens"""
+    token_class = CatalogRefreshToken
+
 class RegisterSerializer(serializers.ModelSerializer):
     confirm_password = serializers.CharField(write_only=True)
 
@@ -44,7 +59,7 @@ class SongSerializer(serializers.ModelSerializer):
     """Basic Song serializer"""
     class Meta:
         model = Song
-        fields = '__all__'
+        fields = ['id', 'title', 'running_time', 'updated_at']  # title_key is internal
 
 class AlbumTracklistItemSerializer(serializers.ModelSerializer):
     """Tracklist item serializer with song details"""
@@ -57,15 +72,15 @@ class AlbumTracklistItemSerializer(serializers.ModelSerializer):
 class AlbumSerializer(serializers.ModelSerializer):
     """Album serializer with computed fields for API"""
     cover_image_url = serializers.SerializerMethodField()
+    cover_images = serializers.SerializerMethodField()
     short_description = serializers.CharField(read_only=True)
     release_year = serializers.IntegerField(read_only=True)
-    total_playtime = serializers.SerializerMethodField()
 
     class Meta:
         model = Album
         fields = [
             'id', 'title', 'artist', 'short_description', 
-            'release_year', 'cover_image_url', 'total_playtime'
+            'release_year', 'cover_image_url', 'cover_images', 'track_count', 'total_playtime'
         ]
 
     def get_cover_image_url(self, obj):
@@ -74,8 +89,13 @@ class AlbumSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.cover_image.url)
         return None
 
-    def get_total_playtime(self, obj):
-        return obj.total_playtime
+    def get_cover_images(self, obj):
+        """Absolute cover URL per size (original, thumb, card, large)"""
+        request = self.context.get('request')
+        urls = obj.cover_images
+        if urls is None:
+            return None
+        return {size: request.build_absolute_uri(url) for size, url in urls.items()}
 
 class AlbumDetailSerializer(AlbumSerializer):
     """Detailed Album serializer with full tracklist"""
@@ -85,16 +105,92 @@ class AlbumDetailSerializer(AlbumSerializer):
         fields = AlbumSerializer.Meta.fields + ['description', 'price', 'format', 'release_date', 'tracklist']
 
     def get_tracklist(self, obj):
-        track_items = obj.albumtracklistitem_set.all().order_by('position')
-        return AlbumTracklistItemSerializer(track_items, many=True).data
+        # Served from Album.objects.with_tracklist() when the view prefetched it
+        return AlbumTracklistItemSerializer(obj.tracklist, many=True).data
+
+class TracklistListSerializer(serializers.ListSerializer):
+    """
+    An ordered tracklist write, validated to the song ids in order: each
+    song at most once (the ('album', 'song') unique constraint) and all of
+    them existing, checked with one query for the whole list
+    """
+
+    def validate(self, entries):
+        song_ids = [entry['song'] for entry in entries]
+        repeated = sorted(pk for pk, count in Counter(song_ids).items() if count > 1)
+        if repeated:
+            raise serializers.ValidationError(f'Songs listed more than once: {", ".join(map(str, repeated))}.')
+        existing = set()
+        for ids in in_chunks(song_ids):
+            existing.update(Song.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        missing = [pk for pk in song_ids if pk not in existing]
+        if missing:
+            raise serializers.ValidationError(f'Songs that do not exist: {", ".join(map(str, missing))}.')
+        return song_ids
+
+class TracklistEntrySerializer(serializers.Serializer):
+    """A track to write, by song id; its position is its place in the list"""
+    song = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        list_serializer_class = TracklistListSerializer
+
+class TracklistReplaceSerializer(serializers.Serializer):
+    """PUT /api/albums/:id/tracklist/ - the album's whole tracklist, in order"""
+    tracklist = TracklistEntrySerializer(many=True)
+
+class TracklistMoveSerializer(serializers.Serializer):
+    song = serializers.IntegerField(min_value=1)
+    position = serializers.IntegerField(min_value=1)
+
+class TracklistMovesSerializer(serializers.Serializer):
+    """
+    PATCH /api/albums/:id/tracklist/ - moves of tracks already on the album,
+    applied in turn to its current order (context['song_ids']); validated
+    to the resulting song ids in order
+    """
+    moves = TracklistMoveSerializer(many=True, allow_empty=False)
+
+    def validate_moves(self, moves):
+        song_ids = list(self.context['song_ids'])
+        for move in moves:
+            if move['song'] not in song_ids:
+                raise serializers.ValidationError(f'Song {move["song"]} is not on this album.')
+            if move['position'] > len(song_ids):
+                raise serializers.ValidationError(
+                    f'Position {move["position"]} is past the end of the tracklist ({len(song_ids)} tracks).'
+                )
+            song_ids.remove(move['song'])
+            song_ids.insert(move['position'] - 1, move['song'])
+        return song_ids
 
 class AlbumCreateUpdateSerializer(serializers.ModelSerializer):
-    """Serializer for creating/updating albums with tracklist"""
-    tracklist = AlbumTracklistItemSerializer(many=True, required=False)
+    """
+    Serializer for creating/updating albums with tracklist. `tracklist`
+    (write-only, as for PUT /api/albums/:id/tracklist/) replaces the album's
+    tracks in the same transaction; left out, they are kept.
+    """
+    tracklist = TracklistEntrySerializer(many=True, required=False, write_only=True)
 
     class Meta:
         model = Album
         fields = [
             'title', 'description', 'artist', 'price', 
-            'format', 'release_date', 'cover_image'
+            'format', 'release_date', 'cover_image', 'tracklist'
         ]
+
+    def create(self, validated_data):
+        song_ids = validated_data.pop('tracklist', None)
+        with transaction.atomic():
+            album = super().create(validated_data)
+            if song_ids is not None:
+                replace_tracklist(album, song_ids)
+        return album
+
+    def update(self, instance, validated_data):
+        song_ids = validated_data.pop('tracklist', None)
+        with transaction.atomic():
+            album = super().update(instance, validated_data)
+            if song_ids is not None:
+                replace_tracklist(album, song_ids)
+        return album
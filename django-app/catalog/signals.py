@@ -0,0 +1,118 @@
+from django.db.models import F, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .authentication import active_users
+from .caching import invalidate_albums
+from .covers import schedule_cover_variants
+from .models import Album, Song, AlbumTracklistItem, MusicManagerUser
+from .revocation import revoked_tokens
+from .stats import refresh_album_stats, touch_albums
+
+
+def _deleted_with_album(origin):
+    """True when a tracklist item is being removed as part of deleting its album"""
+    if isinstance(origin, Album):
+        return True
+    return isinstance(origin, QuerySet) and origin.model is Album
+
+
+@receiver(post_save, sender=AlbumTracklistItem)
+def tracklist_item_saved(sender, instance, created, raw=False, **kwargs):
+    """Keep the parent album's track_count/total_playtime in step with its tracklist"""
+    if raw:
+        return
+    if created:
+        Album.objects.filter(pk=instance.album_id).update(
+            track_count=F('track_count') + 1,
+            total_playtime=F('total_playtime') + instance.song.running_time,
+            updated_at=timezone.now(),
+        )
+        invalidate_albums([instance.album_id])
+        return
+    album_ids = {instance.album_id, getattr(instance, '_loaded_album_id', instance.album_id)}
+    refresh_album_stats(album_ids)
+    instance._loaded_album_id = instance.album_id
+
+
+@receiver(post_delete, sender=AlbumTracklistItem)
+def tracklist_item_deleted(sender, instance, origin=None, **kwargs):
+    """
+    Refresh album stats when a track is removed (skipped when the album itself
+    goes, and for catalog.tracklists.delete_items, whose callers refresh once)
+    """
+    if _deleted_with_album(origin) or getattr(origin, 'skip_stats_refresh', False):
+        return
+    refresh_album_stats([instance.album_id])
+
+
+@receiver(m2m_changed, sender=Album.tracks.through)
+def album_tracks_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Album.tracks.add()/remove()/clear() bypass post_save, so refresh explicitly"""
+    if reverse and action == 'pre_clear':
+        # song.album_set.clear(): remember the albums before the links disappear
+        instance._cleared_album_ids = list(
+            AlbumTracklistItem.objects.filter(song=instance).values_list('album_id', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_album_stats([instance.pk])
+    elif action == 'post_clear':
+        refresh_album_stats(getattr(instance, '_cleared_album_ids', []))
+    else:
+        refresh_album_stats(pk_set)
+
+
+@receiver(post_save, sender=Song)
+def song_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """A song edit changes every album containing it (playtime and/or tracklist titles)"""
+    if raw or created:
+        return
+    time_changed = getattr(instance, '_loaded_running_time', None) != instance.running_time
+    title_changed = getattr(instance, '_loaded_title', None) != instance.title
+    if update_fields is not None:
+        time_changed = time_changed and 'running_time' in update_fields
+        title_changed = title_changed and 'title' in update_fields
+    if time_changed or title_changed:
+        albums = list(AlbumTracklistItem.objects.filter(song=instance).values_list('album_id', flat=True))
+    if time_changed:
+        refresh_album_stats(albums)
+    elif title_changed:
+        touch_albums(albums)
+    instance._loaded_running_time = instance.running_time
+    instance._loaded_title = instance.title
+
+
+@receiver(post_save, sender=Album)
+@receiver(post_delete, sender=Album)
+def album_changed(sender, instance, **kwargs):
+    """Drop the album's cached API payloads (and the cached list pages)"""
+    invalidate_albums([instance.pk])
+
+
+@receiver(post_save, sender=Album)
+def album_cover_saved(sender, instance, raw=False, **kwargs):
+    """Render the resized copies of a new cover once the save commits"""
+    if raw:
+        return
+    if getattr(instance, '_cover_changed', False) and instance.cover_image:
+        schedule_cover_variants(instance.pk, instance.cover_image.name)
+    instance._cover_changed = False
+    instance._loaded_cover_image = instance.cover_image.name
+
+
+@receiver(post_save, sender=MusicManagerUser)
+@receiver(post_delete, sender=MusicManagerUser)
+def user_changed(sender, instance, **kwargs):
+    """Re-check a (de)activated or deleted user's API tokens from the next request on"""
+    active_users.forget(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def token_revoked(sender, instance, created, raw=False, **kwargs):
+    """Refuse the token in this process at once; others pick it up on their next sync"""
+    if created and not raw:
+        revoked_tokens.add(instance.token.jti)
@@ -0,0 +1,185 @@
+"""
+Slug allocation for albums.
+
+Slugs are `<title>-<artist>` with a numeric suffix for collisions
+(`abbey-road-the-beatles`, `abbey-road-the-beatles-1`, ...). The next free
+slug is found with one indexed query over the slug "family" instead of
+probing candidates one by one, and uniqueness is left to the database:
+a save that loses a race retries with a fresh allocation.
+"""
+import re
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.db.models.functions import Length
+from django.utils.text import slugify
+
+SLUG_MAX_LENGTH = 50  # Album.slug is a default SlugField
+SUFFIX_RESERVE = 7  # room for "-999999"
+SAVE_ATTEMPTS = 5
+FAMILY_QUERY_CHUNK = 200  # bases looked up per query in batch mode
+SUFFIX_SCAN_CHUNK = 20
+
+
+def album_slug_base(title, artist):
+    """Slug used for an album before any collision suffix is added"""
+    base = slugify(f"{title}-{artist}")[:SLUG_MAX_LENGTH - SUFFIX_RESERVE].rstrip('-')
+    return base or 'album'
+
+
+def _family_filter(base):
+    """Q matching `base` and its numbered variants `base-<n>` via the slug index"""
+    if connection.vendor == 'sqlite':
+        # SQLite only uses an index for LIKE on NOCASE columns; a range scan
+        # over the binary-collated unique index does the same job.
+        return Q(slug=base) | Q(slug__gte=f'{base}-0', slug__lt=f'{base}-:')
+    # Other backends index LIKE 'prefix%' (Postgres creates a *_like index)
+    return Q(slug=base) | Q(slug__startswith=f'{base}-', slug__regex=rf'^{re.escape(base)}-[0-9]+$')
+
+
+def _suffix_pattern(base):
+    return re.compile(rf'^{re.escape(base)}-(\d+)$')
+
+
+def _suffix_states(slugs):
+    """
+    Map every base to [base_taken, highest_suffix] for a set of taken slugs.
+
+    A slug counts as taken for its own base, and as a numbered variant of
+    `head` when it looks like `head-<n>`; one pass covers all families.
+    """
+    states = {}
+    for slug in slugs:
+        states.setdefault(slug, [False, 0])[0] = True
+        head, sep, suffix = slug.rpartition('-')
+        if sep and suffix.isdecimal():
+            state = states.setdefault(head, [False, 0])
+            state[1] = max(state[1], int(suffix))
+    return states
+
+
+def _next_slug(base, base_taken, highest):
+    if not base_taken:
+        return base
+    return f'{base}-{highest + 1}'
+
+
+def next_free_slug(base, exclude_pk=None):
+    """
+    Next unused slug for `base`, found with a single query.
+
+    Suffixes are handed out as max + 1, so the highest suffix is also the
+    longest, lexicographically greatest slug: the database sorts the family
+    and normally only the first row is read.
+    """
+    from .models import Album
+
+    slugs = Album.objects.filter(_family_filter(base))
+    if exclude_pk is not None:
+        slugs = slugs.exclude(pk=exclude_pk)
+    slugs = slugs.order_by(Length('slug').desc(), '-slug').values_list('slug', flat=True)
+
+    pattern = _suffix_pattern(base)
+    for slug in slugs.iterator(chunk_size=SUFFIX_SCAN_CHUNK):
+        if slug == base:
+            # The base is the shortest member, so no numbered variant exists
+            return f'{base}-1'
+        match = pattern.match(slug)
+        if match:
+            return f'{base}-{int(match.group(1)) + 1}'
+    return base
+
+
+def save_with_slug(album, save):
+    """
+    Allocate a slug for `album` and run `save()`, retrying on IntegrityError.
+
+    The unique index is the source of truth: if another writer claims the
+    slug between allocation and insert, the save is rolled back to a
+    savepoint and a new slug is allocated. Errors from other constraints
+    are re-raised unchanged.
+    """
+    from .models import Album
+
+    base = album_slug_base(album.title, album.artist)
+    for attempt in range(SAVE_ATTEMPTS):
+        album.slug = next_free_slug(base, exclude_pk=album.pk)
+        try:
+            with transaction.atomic():
+                save()
+            return
+        except IntegrityError:
+            slug_taken = Album.objects.filter(slug=album.slug).exclude(pk=album.pk).exists()
+            album.slug = ''
+            if not slug_taken or attempt == SAVE_ATTEMPTS - 1:
+                raise
+
+
+def assign_slugs(albums):
+    """
+    Batch mode: fill in slugs for unsaved albums ahead of `bulk_create`.
+
+    Looks up every slug family touched by the batch in a handful of
+    queries and hands out suffixes in memory, so colliding titles inside
+    the batch also get distinct slugs.
+    """
+    from .models import Album
+
+    pending = {}
+    for album in albums:
+        if not album.slug:
+            pending.setdefault(album_slug_base(album.title, album.artist), []).append(album)
+
+    assigned = set()
+    bases = list(pending)
+    for start in range(0, len(bases), FAMILY_QUERY_CHUNK):
+        chunk = bases[start:start + FAMILY_QUERY_CHUNK]
+        family = Q()
+        for base in chunk:
+            family |= _family_filter(base)
+        # No ORDER BY: with Meta.ordering SQLite walks the title index instead
+        # of seeking each family in the slug index
+        taken = Album.objects.filter(family).order_by().values_list('slug', flat=True)
+        states = _suffix_states(taken)
+        for base in chunk:
+            base_taken, highest = states.get(base, (False, 0))
+            for album in pending[base]:
+                slug = _next_slug(base, base_taken, highest)
+                # A different base can produce the same slug ("x-1" vs "x" + "-1")
+                while slug in assigned:
+                    if base_taken:
+                        highest += 1
+                    base_taken = True
+                    slug = _next_slug(base, base_taken, highest)
+                if base_taken:
+                    highest += 1
+                base_taken = True
+                album.slug = slug
+                assigned.add(slug)
+    return albums
+
+
+def bulk_create_with_slugs(albums, batch_size=1000):
+    """
+    `bulk_create` albums after assigning slugs in batch mode.
+
+    bulk_create skips Album.save(), so the normalized artist key is filled
+    in here as well.
+    A concurrent writer can still claim one of the allocated slugs, so the
+    batch is retried with fresh allocations on IntegrityError.
+    """
+    from .models import Album, normalize_artist
+
+    albums = list(albums)
+    for album in albums:
+        album.artist_key = normalize_artist(album.artist)
+    unslugged = [album for album in albums if not album.slug]
+    for attempt in range(SAVE_ATTEMPTS):
+        assign_slugs(unslugged)
+        try:
+            with transaction.atomic():
+                return Album.objects.bulk_create(albums, batch_size=batch_size)
+        except IntegrityError:
+            if attempt == SAVE_ATTEMPTS - 1:
+                raise
+            for album in unslugged:
+                album.slug = ''
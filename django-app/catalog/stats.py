@@ -0,0 +1,99 @@
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .caching import invalidate_albums, invalidate_catalog
+from .models import Album, AlbumTracklistItem
+
+
+def _tracklist_aggregate(aggregate):
+    """Correlated subquery computing an aggregate over an album's tracklist"""
+    per_album = (
+        AlbumTracklistItem.objects
+        .filter(album=OuterRef('pk'))
+        .order_by()
+        .values('album')
+        .annotate(value=aggregate)
+        .values('value')
+    )
+    return Coalesce(Subquery(per_album), Value(0))
+
+
+def _album_ids(albums):
+    """Album ids from an iterable of ids or an Album queryset; None stays None (every album)"""
+    if albums is None:
+        return None
+    if hasattr(albums, 'values_list'):
+        return list(albums.order_by().values_list('pk', flat=True))
+    return list(albums)
+
+
+def refresh_album_stats(albums=None, only_changed=False):
+    """
+    Recompute the stored track_count/total_playtime columns with a single UPDATE.
+
+    `albums` may be an iterable of album ids, an Album queryset, or None to
+    rebuild every album. Updated albums also get a new `updated_at`, since
+    callers refresh after changing a tracklist, and their cached API
+    payloads are invalidated. With `only_changed`, albums whose stored stats
+    are already right are left alone (and not touched).
+    Returns the number of albums updated.
+    """
+    ids = _album_ids(albums)
+    if ids is not None and not ids:
+        return 0
+    queryset = Album.objects.all() if ids is None else Album.objects.filter(pk__in=ids)
+    track_count = _tracklist_aggregate(Count('id'))
+    total_playtime = _tracklist_aggregate(Sum('song__running_time'))
+    if only_changed:
+        # Select the drifted albums first, so exactly those get invalidated
+        ids = list(
+            queryset.exclude(track_count=track_count, total_playtime=total_playtime)
+            .order_by().values_list('pk', flat=True)
+        )
+        if not ids:
+            return 0
+        queryset = Album.objects.filter(pk__in=ids)
+    updated = queryset.update(
+        track_count=track_count,
+        total_playtime=total_playtime,
+        updated_at=timezone.now(),
+    )
+    if ids is None:
+        invalidate_catalog()
+    else:
+        invalidate_albums(ids)
+    return updated
+
+
+def rebuild_album_stats(albums=None, batch_size=5000, progress=None):
+    """
+    Check and correct the stats of `albums` (every album by default) in
+    batches of `batch_size`, one transaction each; only drifted albums are
+    rewritten, so correct ones keep their updated_at. Returns (checked,
+    corrected); `progress(checked, corrected)` is called after each batch.
+    """
+    ids = (Album.objects.all() if albums is None else albums).order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    checked = 0
+    corrected = 0
+    while True:
+        batch = list(ids.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            corrected += refresh_album_stats(batch, only_changed=True)
+        checked += len(batch)
+        last_pk = batch[-1]
+        if progress:
+            progress(checked, corrected)
+    return checked, corrected
+
+
+def touch_albums(albums):
+    """Bump `updated_at` for albums whose API representation changed indirectly"""
+    ids = _album_ids(albums)
+    if not ids:
+        return 0
+    invalidate_albums(ids)
+    return Album.objects.filter(pk__in=ids).update(updated_at=timezone.now())
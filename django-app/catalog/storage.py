@@ -0,0 +1,72 @@
+"""
+Content-addressed file storage for album covers.
+
+Every file is named after the SHA-256 of its bytes, under a two-character
+fan-out directory: an upload to `album_covers/front.JPG` is stored as
+`album_covers/3f/3f9a...e1.jpg`. Identical uploads (the same artwork for the
+CD, vinyl and digital editions) therefore share one file, and a name never
+changes content, so its URL can be cached forever (`IMMUTABLE_CACHE_CONTROL`,
+added by catalog.views.serve_media and the web server config in the README).
+
+The content is hashed while it is copied to a temporary file next to its
+destination, so large uploads are never held in memory, and the temporary
+file is renamed into place only if no file has that hash yet. Files may be
+shared, so nothing here deletes a file on behalf of one album;
+`manage.py migrate_cover_storage` moves covers stored under their upload
+names over and deletes the files it replaced.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from django.core.files.storage import FileSystemStorage, storages
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CONTENT_ADDRESSED_NAME = re.compile(r'(^|/)(?P<prefix>[0-9a-f]{2})/(?P=prefix)[0-9a-f]{62}(\.[a-z0-9]+)?$')
+
+
+def cover_storage():
+    """Storage of Album.cover_image: the 'covers' entry of settings.STORAGES"""
+    return storages['covers']
+
+
+def is_content_addressed(name):
+    return CONTENT_ADDRESSED_NAME.search(name) is not None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        return name  # _save() derives the final name from the content
+
+    def content_name(self, name, digest):
+        """Where content with this SHA-256 hex digest, uploaded as `name`, is stored"""
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        extension = os.path.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        directory = self.path(posixpath.dirname(name.replace('\\', '/')))
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=directory, prefix='.upload-', delete=False) as temporary:
+            try:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temporary.write(chunk)
+            except BaseException:
+                temporary.close()
+                os.unlink(temporary.name)
+                raise
+        name = self.content_name(name, digest.hexdigest())
+        path = self.path(name)
+        if os.path.exists(path):
+            os.unlink(temporary.name)  # already stored: share it
+            return name
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Temporary files are private; give it the permissions of a normal upload
+        os.chmod(temporary.name, self.file_permissions_mode if self.file_permissions_mode is not None else 0o644)
+        os.replace(temporary.name, path)  # atomic: readers never see a partial file
+        return name
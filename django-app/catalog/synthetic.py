@@ -0,0 +1,273 @@
+"""
+Deterministic synthetic catalogs for load and capacity testing.
+
+`generate_catalog()` writes songs, albums and tracklists with batched
+`bulk_create` calls, one transaction per batch. The same seed and sizes
+always produce the same catalog. The distributions are meant to look
+like a real store:
+
+* artist catalog sizes follow a Zipf-like curve (a few prolific artists,
+  a long tail with one or two albums),
+* track counts vary around the requested mean,
+* some tracks reuse popular songs, so songs are shared across albums,
+* only some albums have a cover image.
+
+Album stats (`track_count`, `total_playtime`) are computed in memory, so
+no refresh pass is needed afterwards.
+"""
+import io
+import random
+import re
+import time
+from datetime import date
+from decimal import Decimal
+from django.core.files.base import ContentFile
+from django.db import transaction
+from .caching import invalidate_catalog
+from .models import Album, AlbumTracklistItem, Song, normalize_title
+from .slugs import bulk_create_with_slugs
+
+BATCH_SIZE = 5000
+ARTIST_SKEW = 1.1  # Zipf exponent for albums per artist
+SHARED_TRACK_RATIO = 0.15  # tracks that reuse an already popular song
+COVER_RATIO = 0.4
+COVER_PLACEHOLDERS = 8
+FIRST_YEAR, LAST_YEAR = 1960, 2024
+FORMAT_PRICES = {
+    'dd': ['4.99', '7.99', '9.99'],
+    'cd': ['9.99', '12.99', '14.99'],
+    'vi': ['19.99', '24.99', '34.99'],
+}
+
+ADJECTIVES = [
+    'Electric', 'Silent', 'Golden', 'Broken', 'Midnight', 'Velvet', 'Crimson', 'Wild',
+    'Hollow', 'Neon', 'Lonely', 'Burning', 'Frozen', 'Distant', 'Restless', 'Paper',
+    'Silver', 'Northern', 'Secret', 'Endless', 'Glass', 'Quiet', 'Savage', 'Blue',
+]
+NOUNS = [
+    'Heart', 'River', 'Garden', 'Machine', 'Ocean', 'Highway', 'Mirror', 'Dream',
+    'Thunder', 'City', 'Shadow', 'Fire', 'Echo', 'Harbour', 'Signal', 'Horizon',
+    'Kingdom', 'Satellite', 'Summer', 'Storm', 'Letter', 'Wolf', 'Parade', 'Light',
+]
+FIRST_NAMES = [
+    'Ada', 'Billie', 'Cass', 'Dev', 'Eli', 'Frankie', 'Gray', 'Hana', 'Isa', 'Jude',
+    'Kit', 'Lou', 'Milo', 'Nia', 'Otis', 'Pip', 'Quinn', 'Rae', 'Sol', 'Tess',
+]
+LAST_NAMES = [
+    'Adams', 'Brooks', 'Cole', 'Diaz', 'Evans', 'Fox', 'Grant', 'Hart', 'Ito', 'James',
+    'Khan', 'Lane', 'Moss', 'Nash', 'Owen', 'Park', 'Reyes', 'Stone', 'Tran', 'Vale',
+]
+TITLE_STRIDE = 7919  # prime, so album_title() visits every adjective/noun pair
+ALBUM_TITLE = re.compile(r'(?P<adjective>\w+) (?P<noun>\w+)(?: Vol\. (?P<volume>[1-9]\d*))?')
+GENRES = ['rock', 'folk', 'jazz', 'soul', 'electronic', 'pop', 'blues', 'ambient', 'punk', 'country']
+
+
+def _unique_names(rng, count, make):
+    """`count` distinct names from the shuffled combinations, numbered once they run out"""
+    combos = make()
+    rng.shuffle(combos)
+    names = []
+    for index in range(count):
+        name = combos[index % len(combos)]
+        cycle = index // len(combos)
+        names.append(f'{name} {cycle + 1}' if cycle else name)
+    return names
+
+
+def artist_names(rng, count):
+    def make():
+        bands = [f'The {adj} {noun}s' for adj in ADJECTIVES for noun in NOUNS]
+        people = [f'{first} {last}' for first in FIRST_NAMES for last in LAST_NAMES]
+        return bands + people
+    return _unique_names(rng, count, make)
+
+
+def album_title(index):
+    """Deterministic title; unique per index, so (title, artist, format) never collides"""
+    combos = len(ADJECTIVES) * len(NOUNS)
+    position = (index * TITLE_STRIDE) % combos  # a prime stride spreads neighbouring indexes
+    title = f'{ADJECTIVES[position // len(NOUNS)]} {NOUNS[position % len(NOUNS)]}'
+    volume = index // combos
+    return f'{title} Vol. {volume + 1}' if volume else title
+
+
+def album_index(title):
+    """The index album_title() gives `title`, or None for any other title"""
+    match = ALBUM_TITLE.fullmatch(title)
+    if not match or match['adjective'] not in ADJECTIVES or match['noun'] not in NOUNS:
+        return None
+    volume = int(match['volume']) - 1 if match['volume'] else 0
+    if match['volume'] and not volume:
+        return None  # volume 1 has no suffix
+    combos = len(ADJECTIVES) * len(NOUNS)
+    position = ADJECTIVES.index(match['adjective']) * len(NOUNS) + NOUNS.index(match['noun'])
+    return volume * combos + position * pow(TITLE_STRIDE, -1, combos) % combos
+
+
+def next_album_index():
+    """
+    The index after the highest synthetic title stored, so another run only
+    adds new titles, whatever albums were deleted in between
+    """
+    titles = Album.objects.values_list('title', flat=True).iterator(chunk_size=10000)
+    return max(filter(None.__ne__, map(album_index, titles)), default=-1) + 1
+
+
+def song_title(rng):
+    """Mostly distinct titles: songs are deduplicated on their normalized title on import"""
+    words = [rng.choice(ADJECTIVES), rng.choice(NOUNS)]
+    if rng.random() < 0.3:
+        words.insert(0, rng.choice(['Into the', 'Under the', 'Songs for the', 'Last']))
+    words.append(f'({rng.choice(FIRST_NAMES)} Take {rng.randint(1, 999)})')
+    return ' '.join(words)
+
+
+def running_time(rng):
+    """Song length in seconds, centred on three and a half minutes"""
+    return int(min(max(rng.gauss(210, 70), 30), 1200))
+
+
+def release_date(rng):
+    """Dates weighted towards recent years"""
+    year = LAST_YEAR - int((LAST_YEAR - FIRST_YEAR) * rng.random() ** 2)
+    return date(year, rng.randint(1, 12), rng.randint(1, 28))
+
+
+def ensure_cover_placeholders():
+    """Write the small placeholder covers shared by generated albums, once"""
+    from PIL import Image
+
+    storage = Album._meta.get_field('cover_image').storage
+    names = []
+    for index in range(COVER_PLACEHOLDERS):
+        hue = index * 255 // COVER_PLACEHOLDERS
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 300), (hue, 80, 255 - hue)).save(buffer, 'PNG')
+        # Named by content, so every run reuses the same files
+        names.append(storage.save(f'album_covers/cover-{index}.png', ContentFile(buffer.getvalue())))
+    return names
+
+
+class CatalogGenerator:
+    """
+    Streams a synthetic catalog into the database.
+
+    `progress` is called as `progress(stage, done, total, elapsed_seconds)`
+    after every batch.
+    """
+
+    def __init__(self, albums, songs, tracks_per_album=10, artists=None, seed=0,
+                 first_index=0, batch_size=BATCH_SIZE, covers=True, progress=None):
+        self.albums = albums
+        self.songs = songs
+        self.tracks_per_album = tracks_per_album
+        self.artists = artists or max(1, albums // 10)
+        self.rng = random.Random(seed)
+        self.first_index = first_index
+        self.batch_size = batch_size
+        self.covers = covers
+        self.progress = progress or (lambda *args: None)
+
+    def run(self):
+        """Generate everything; returns (songs, albums, tracklist items) created"""
+        song_ids, song_times = self.create_songs()
+        albums, tracks = self.create_albums(song_ids, song_times)
+        return len(song_ids), albums, tracks
+
+    def create_songs(self):
+        rng = self.rng
+        song_ids, song_times = [], []
+        started = time.monotonic()
+        for start in range(0, self.songs, self.batch_size):
+            batch = [
+                Song(title=song_title(rng), running_time=running_time(rng))
+                for _ in range(min(self.batch_size, self.songs - start))
+            ]
+            for song in batch:
+                song.title_key = normalize_title(song.title)  # bulk_create skips Song.save()
+            with transaction.atomic():
+                Song.objects.bulk_create(batch)
+            song_ids.extend(song.pk for song in batch)
+            song_times.extend(song.running_time for song in batch)
+            self.progress('songs', len(song_ids), self.songs, time.monotonic() - started)
+        return song_ids, song_times
+
+    def pick_tracks(self, count, song_cursor, song_total):
+        """Song indexes for one album: mostly fresh songs, some popular shared ones"""
+        rng = self.rng
+        count = min(count, song_total)
+        chosen = []
+        seen = set()
+        while len(chosen) < count:
+            if rng.random() < SHARED_TRACK_RATIO:
+                index = int(song_total * rng.random() ** 3)  # skewed towards the "hits"
+            else:
+                index = song_cursor % song_total
+                song_cursor += 1
+            if index not in seen:
+                seen.add(index)
+                chosen.append(index)
+        return chosen, song_cursor
+
+    def create_albums(self, song_ids, song_times):
+        rng = self.rng
+        names = artist_names(rng, self.artists)
+        weights = [1 / (rank + 1) ** ARTIST_SKEW for rank in range(self.artists)]
+        cum_weights = []
+        total = 0.0
+        for weight in weights:
+            total += weight
+            cum_weights.append(total)
+        covers = ensure_cover_placeholders() if self.covers and self.albums else []
+        formats = list(FORMAT_PRICES)
+        low, high = max(1, self.tracks_per_album // 2), max(1, self.tracks_per_album * 3 // 2)
+
+        created_albums = created_tracks = 0
+        album_number = 0
+        song_cursor = 0
+        started = time.monotonic()
+        for start in range(0, self.albums, self.batch_size):
+            albums, tracklists = [], []
+            for offset in range(min(self.batch_size, self.albums - start)):
+                index = self.first_index + start + offset
+                if album_number < len(names):
+                    artist = names[album_number]  # every artist releases at least one album
+                else:
+                    artist = rng.choices(names, cum_weights=cum_weights)[0]
+                album_number += 1
+                album_format = rng.choice(formats)
+                picked, song_cursor = self.pick_tracks(rng.randint(low, high), song_cursor, len(song_ids))
+                album = Album(
+                    title=album_title(index),
+                    artist=artist,
+                    format=album_format,
+                    price=Decimal(rng.choice(FORMAT_PRICES[album_format])),
+                    release_date=release_date(rng),
+                    description=f'A {rng.choice(GENRES)} record by {artist}.' if rng.random() < 0.7 else '',
+                    track_count=len(picked),
+                    total_playtime=sum(song_times[i] for i in picked),
+                )
+                if covers and rng.random() < COVER_RATIO:
+                    album.cover_image.name = rng.choice(covers)
+                albums.append(album)
+                tracklists.append(picked)
+
+            with transaction.atomic():
+                bulk_create_with_slugs(albums, batch_size=self.batch_size)
+                items = [
+                    AlbumTracklistItem(album_id=album.pk, song_id=song_ids[song], position=position)
+                    for album, picked in zip(albums, tracklists)
+                    for position, song in enumerate(picked, start=1)
+                ]
+                AlbumTracklistItem.objects.bulk_create(items, batch_size=self.batch_size)
+            created_albums += len(albums)
+            created_tracks += len(items)
+            self.progress('albums', created_albums, self.albums, time.monotonic() - started)
+        if created_albums:
+            invalidate_catalog()  # bulk_create sends no signals; cached list pages are stale
+        return created_albums, created_tracks
+
+
+def generate_catalog(albums, songs, **options):
+    """Shortcut for `CatalogGenerator(albums, songs, **options).run()`"""
+    return CatalogGenerator(albums, songs, **options).run()
@@ -0,0 +1,73 @@
+"""
+Background tasks for the job queue (catalog.jobs), run by `manage.py run_workers`.
+
+Queue one with `enqueue(name, key=..., **kwargs)`; the admin actions do.
+Arguments are stored as JSON, so albums are passed as lists of ids (None
+for every album). Each task reports its progress and returns a small
+summary, stored as the job's result.
+"""
+import tempfile
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection
+from .covers import build_all_cover_variants
+from .export import export_albums as export_lines
+from .jobs import task
+from .models import Album
+from .search import get_backend
+from .stats import rebuild_album_stats as rebuild_stats
+
+EXPORT_PROGRESS_LINES = 1000
+
+
+def _albums(album_ids):
+    return Album.objects.all() if album_ids is None else Album.objects.filter(pk__in=album_ids)
+
+
+@task('rebuild_album_stats')
+def rebuild_album_stats(job, album_ids=None, batch_size=5000):
+    """Correct drifted track_count/total_playtime columns"""
+    total = _albums(album_ids).count()
+    checked, corrected = rebuild_stats(
+        _albums(album_ids), batch_size,
+        progress=lambda checked, corrected: job.report_progress(checked, total, f'{corrected} corrected'),
+    )
+    return {'checked': checked, 'corrected': corrected}
+
+
+@task('rebuild_search_index')
+def rebuild_search_index(job):
+    """Re-sync the full-text index, as `manage.py rebuild_search_index`"""
+    backend = get_backend()
+    backend.install(connection)
+    backend.rebuild(connection)
+    return {'vendor': connection.vendor}
+
+
+@task('build_cover_variants')
+def build_cover_variants(job, album_ids=None, missing_only=True, batch_size=100):
+    """Render the WebP variants of covers, by default only those that have none"""
+    albums = _albums(album_ids)
+    if missing_only:
+        albums = albums.filter(cover_variants={})
+    total = albums.exclude(cover_image='').exclude(cover_image=None).count()
+    return build_all_cover_variants(
+        albums, batch_size=batch_size,
+        progress=lambda stats: job.report_progress(
+            sum(stats.values()), total, f'{stats["rendered"]} rendered, {stats["failed"]} failed',
+        ),
+    )
+
+
+@task('export_albums')
+def export_albums(job, export_format='csv', album_ids=None):
+    """Write an album export to the default storage, under exports/"""
+    queryset = _albums(album_ids).order_by('pk')
+    written = 0
+    with tempfile.TemporaryFile() as output:
+        for written, line in enumerate(export_lines(queryset, export_format), 1):
+            output.write(line.encode('utf-8'))
+            if written % EXPORT_PROGRESS_LINES == 0:
+                job.report_progress(written, message=f'{written} lines written')
+        name = default_storage.save(f'exports/albums-{job.pk}.{export_format}', File(output))
+    return {'file': name, 'url': default_storage.url(name), 'lines': written}
@@ -1,4 +1,9 @@
-from django.test import TestCase, Client
+import os
+import time
+from unittest import skipUnless
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import Group
 from catalog.models import MusicManagerUser, Album, Song, AlbumTracklistItem
@@ -209,8 +214,10 @@ class APIViewsTest(TestCase):
         self.assertContains(response, 'API Test Album')
     
     def test_api_songs_list(self):
+        Song.objects.create(title='API Song', running_time=120)
         response = self.client.get('/api/songs/')
         self.assertEqual(response.status_code, 200)
+        self.assertNotIn('title_key', response.json()['results'][0])
     
     def test_api_tracklist(self):
         response = self.client.get('/api/tracklist/')
@@ -248,3 +255,2050 @@ class ValidationTest(TestCase):
         )
         with self.assertRaises(ValidationError):
             album.full_clean()
+
+
+class AlbumTrackStatsTest(TestCase):
+    def setUp(self):
+        self.album = Album.objects.create(
+            title='Stats Album',
+            artist='Stats Artist',
+            format='cd',
+            price=Decimal('12.99'),
+            release_date=date.today()
+        )
+        self.song1 = Song.objects.create(title='First', running_time=100)
+        self.song2 = Song.objects.create(title='Second', running_time=200)
+
+    def test_stats_follow_tracklist_changes(self):
+        AlbumTracklistItem.objects.create(album=self.album, song=self.song1, position=1)
+        track2 = AlbumTracklistItem.objects.create(album=self.album, song=self.song2, position=2)
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.track_count, 2)
+        self.assertEqual(self.album.total_playtime, 300)
+
+        track2.delete()
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.track_count, 1)
+        self.assertEqual(self.album.total_playtime, 100)
+
+    def test_saving_a_stale_album_keeps_the_stats(self):
+        stale = Album.objects.get(pk=self.album.pk)
+        AlbumTracklistItem.objects.create(album=self.album, song=self.song1, position=1)
+        stale.description = 'Edited'
+        stale.save()
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.description, 'Edited')
+        self.assertEqual((self.album.track_count, self.album.total_playtime), (1, 100))
+
+    def test_song_running_time_change_updates_album(self):
+        AlbumTracklistItem.objects.create(album=self.album, song=self.song1, position=1)
+        song = Song.objects.get(pk=self.song1.pk)
+        song.running_time = 150
+        song.save()
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.total_playtime, 150)
+
+    def test_m2m_add_and_clear_update_stats(self):
+        self.album.tracks.add(self.song1, self.song2, through_defaults={'position': 1})
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.track_count, 2)
+        self.song1.album_set.clear()
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.track_count, 1)
+        self.assertEqual(self.album.total_playtime, 200)
+
+    def test_rebuild_command_repairs_drift(self):
+        from django.core.management import call_command
+        from io import StringIO
+        AlbumTracklistItem.objects.bulk_create([
+            AlbumTracklistItem(album=self.album, song=self.song1, position=1),
+        ])
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.track_count, 0)  # bulk_create bypasses signals
+        call_command('rebuild_album_stats', stdout=StringIO())
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.track_count, 1)
+        self.assertEqual(self.album.total_playtime, 100)
+
+    def test_album_list_api_has_no_per_row_queries(self):
+        for i in range(5):
+            album = Album.objects.create(
+                title=f'Album {i}', artist='Stats Artist', format='dd',
+                price=Decimal('9.99'), release_date=date.today()
+            )
+            AlbumTracklistItem.objects.create(album=album, song=self.song1, position=1)
+        with self.assertNumQueries(2):  # COUNT for pagination + page rows
+            response = self.client.get('/api/albums/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['total_playtime'], 100)
+
+
+class SlugAllocationTest(TestCase):
+    def make_album(self, title='Greatest Hits', artist='The Band', format='cd'):
+        return Album(
+            title=title,
+            artist=artist,
+            format=format,
+            price=Decimal('9.99'),
+            release_date=date.today()
+        )
+
+    def test_colliding_titles_get_numbered_suffixes(self):
+        slugs = []
+        for format in ['cd', 'vi', 'dd']:
+            album = self.make_album(format=format)
+            album.save()
+            slugs.append(album.slug)
+        self.assertEqual(slugs, [
+            'greatest-hits-the-band',
+            'greatest-hits-the-band-1',
+            'greatest-hits-the-band-2',
+        ])
+
+    def test_single_query_allocation(self):
+        self.make_album(format='cd').save()
+        from catalog.slugs import next_free_slug
+        with self.assertNumQueries(1):
+            self.assertEqual(next_free_slug('greatest-hits-the-band'), 'greatest-hits-the-band-1')
+
+    def test_save_retries_when_slug_is_claimed_concurrently(self):
+        from unittest import mock
+        from catalog import slugs
+        self.make_album(format='cd').save()
+        real_next_free_slug = slugs.next_free_slug
+        stale = iter(['greatest-hits-the-band'])  # what a racing writer would have seen
+
+        def racing_next_free_slug(base, exclude_pk=None):
+            return next(stale, None) or real_next_free_slug(base, exclude_pk)
+
+        album = self.make_album(format='vi')
+        with mock.patch.object(slugs, 'next_free_slug', racing_next_free_slug):
+            album.save()
+        self.assertEqual(album.slug, 'greatest-hits-the-band-1')
+
+    def test_other_integrity_errors_are_not_retried(self):
+        from django.db import IntegrityError
+        self.make_album(format='cd').save()
+        with self.assertRaises(IntegrityError):
+            self.make_album(format='cd').save()
+
+    def test_batch_mode_for_bulk_create(self):
+        from catalog.slugs import bulk_create_with_slugs
+        self.make_album(format='cd').save()
+        albums = bulk_create_with_slugs([
+            self.make_album(format='vi'),
+            self.make_album(format='dd'),
+            self.make_album(title='Other', format='dd'),
+        ])
+        self.assertEqual([album.slug for album in albums], [
+            'greatest-hits-the-band-1',
+            'greatest-hits-the-band-2',
+            'other-the-band',
+        ])
+
+
+class ArtistKeyTest(TestCase):
+    def setUp(self):
+        self.artist = MusicManagerUser.objects.create_user(
+            username='spacey',
+            password='testpass123',
+            display_name='  The   Beatles ',
+            role='artist'
+        )
+        self.album = Album.objects.create(
+            title='Abbey Road',
+            artist='the beatles',
+            format='vi',
+            price=Decimal('25.99'),
+            release_date=date.today()
+        )
+        Album.objects.create(
+            title='Other Album',
+            artist='Someone Else',
+            format='cd',
+            price=Decimal('9.99'),
+            release_date=date.today()
+        )
+
+    def test_keys_are_casefolded_and_whitespace_collapsed(self):
+        self.assertEqual(self.artist.display_name_key, 'the beatles')
+        self.assertEqual(self.album.artist_key, 'the beatles')
+        self.assertTrue(self.artist.is_artist_of(self.album))
+
+    def test_update_fields_keeps_key_in_sync(self):
+        self.album.artist = 'The Rolling Stones'
+        self.album.save(update_fields=['artist'])
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.artist_key, 'the rolling stones')
+
+    def test_artist_album_list_uses_key(self):
+        self.client.login(username='spacey', password='testpass123')
+        response = self.client.get(reverse('album-list'))
+        self.assertEqual(list(response.context['albums']), [self.album])
+
+    def test_artist_can_edit_album_with_differently_spaced_name(self):
+        self.client.login(username='spacey', password='testpass123')
+        response = self.client.get(reverse('album-edit', kwargs={'pk': self.album.pk}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_album_count_is_annotated(self):
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+        model_admin = site._registry[MusicManagerUser]
+        request = RequestFactory().get('/admin/catalog/musicmanageruser/')
+        user = model_admin.get_queryset(request).get(pk=self.artist.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(model_admin.album_count(user), '🎵 1 albums')
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.abbey = Album.objects.create(
+            title='Abbey Road',
+            artist='The Beatles',
+            format='vi',
+            price=Decimal('25.99'),
+            release_date=date.today(),
+            description='Recorded at EMI studios'
+        )
+        self.road = Album.objects.create(
+            title='Road Trip',
+            artist='Abbey Lane',
+            format='cd',
+            price=Decimal('9.99'),
+            release_date=date.today()
+        )
+        Song.objects.create(title='Come Together', running_time=259)
+        Song.objects.create(title='Something', running_time=183)
+
+    def test_prefix_matching_and_ranking(self):
+        response = self.client.get('/api/search/', {'q': 'abb'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        # A title hit outranks an artist hit
+        self.assertEqual([album['title'] for album in data['results']], ['Abbey Road', 'Road Trip'])
+
+    def test_all_terms_must_match(self):
+        response = self.client.get('/api/search/', {'q': 'abbey emi'})
+        self.assertEqual([album['id'] for album in response.json()['results']], [self.abbey.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.road.title = 'Highway'
+        self.road.save()
+        response = self.client.get('/api/search/', {'q': 'highway'})
+        self.assertEqual(response.json()['count'], 1)
+        self.road.delete()
+        response = self.client.get('/api/search/', {'q': 'highway'})
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_song_search(self):
+        response = self.client.get('/api/search/', {'q': 'some', 'type': 'songs'})
+        self.assertEqual([song['title'] for song in response.json()['results']], ['Something'])
+
+    def test_missing_query_is_rejected(self):
+        response = self.client.get('/api/search/')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/search/', {'q': 'x', 'type': 'artists'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_changelist_uses_index(self):
+        editor = MusicManagerUser.objects.create_superuser(
+            username='admin', password='testpass123', display_name='Admin'
+        )
+        self.client.force_login(editor)
+        response = self.client.get('/admin/catalog/album/', {'q': 'beatles'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['cl'].result_list), [self.abbey])
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        # Duplicate titles make the id tiebreaker matter
+        for i in range(25):
+            Album.objects.create(
+                title=f'Album {i // 2:02d}',
+                artist=f'Artist {i}',
+                format='cd',
+                price=Decimal('9.99'),
+                release_date=date.today()
+            )
+
+    def walk(self, url):
+        ids = []
+        while url:
+            data = self.client.get(url).json()
+            self.assertNotIn('count', data)
+            ids.extend(album['id'] for album in data['results'])
+            url = data['next']
+        return ids
+
+    def test_cursor_walk_matches_ordering(self):
+        expected = list(Album.objects.order_by('title', 'id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/albums/?cursor='), expected)
+
+    def test_page_costs_one_query_without_count(self):
+        first = self.client.get('/api/albums/?cursor=').json()
+        with self.assertNumQueries(1):
+            response = self.client.get(first['next'])
+        self.assertEqual(len(response.json()['results']), 10)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get('/api/albums/?cursor=').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(back['previous'])
+
+    def test_nullable_positions_are_paged_completely(self):
+        song_ids = [Song.objects.create(title=f'Song {i}', running_time=60).pk for i in range(12)]
+        album = Album.objects.first()
+        for i, song_id in enumerate(song_ids):
+            AlbumTracklistItem.objects.create(album=album, song_id=song_id, position=None if i % 3 == 0 else i)
+        ids = []
+        url = '/api/tracklist/?cursor='
+        while url:
+            data = self.client.get(url).json()
+            ids.extend(item['id'] for item in data['results'])
+            url = data['next']
+        self.assertEqual(sorted(ids), sorted(AlbumTracklistItem.objects.values_list('id', flat=True)))
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_page_number_pagination_is_still_the_default(self):
+        data = self.client.get('/api/albums/').json()
+        self.assertEqual(data['count'], 25)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/albums/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_values_of_the_wrong_type(self):
+        import base64
+        import json
+
+        def cursor(values):
+            return base64.urlsafe_b64encode(json.dumps({'v': values}).encode()).decode()
+
+        for url in [
+            f'/api/albums/?cursor={cursor([[], {}])}',
+            f'/api/tracklist/?cursor={cursor(["a", 2])}',
+            f'/api/albums/?cursor={cursor(["Album", None])}',  # id is not nullable
+            f'/api/albums/?cursor={cursor(["Album", 10 ** 30])}',
+        ]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 404, url)
+            self.assertEqual(response.json()['detail'], 'Invalid cursor')
+        self.assertEqual(self.client.get(f'/api/tracklist/?cursor={cursor([None, 2])}').status_code, 200)
+
+
+class AlbumQueryCountTest(TestCase):
+    def setUp(self):
+        self.album = Album.objects.create(
+            title='Long Album',
+            artist='Prolific Artist',
+            format='cd',
+            price=Decimal('19.99'),
+            release_date=date.today()
+        )
+        for position in range(1, 31):
+            song = Song.objects.create(title=f'Track {position}', running_time=120)
+            AlbumTracklistItem.objects.create(album=self.album, song=song, position=position)
+
+    def test_api_detail_is_constant_queries(self):
+        with self.assertNumQueries(2):  # album + prefetched tracklist with songs
+            response = self.client.get(f'/api/albums/{self.album.pk}/')
+        tracklist = response.json()['tracklist']
+        self.assertEqual(len(tracklist), 30)
+        self.assertEqual([track['position'] for track in tracklist], list(range(1, 31)))
+        self.assertEqual(tracklist[0]['song']['title'], 'Track 1')
+
+    def test_bop_detail_does_not_query_per_track(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('album-detail', kwargs={'pk': self.album.pk}))
+        self.assertContains(response, 'Track 30')
+
+    def test_tracklist_api_selects_songs(self):
+        with self.assertNumQueries(2):  # COUNT + page with joined songs
+            response = self.client.get('/api/tracklist/')
+        self.assertEqual(len(response.json()['results']), 10)
+
+
+class QueryCountScalingTest(TestCase):
+    """Page query counts must not depend on how many rows the catalog holds"""
+
+    urls = [
+        '/',
+        '/admin/catalog/album/',
+        '/admin/catalog/song/',
+        '/admin/catalog/albumtracklistitem/',
+        '/admin/catalog/musicmanageruser/',
+        '/admin/register/',
+    ]
+
+    def setUp(self):
+        self.editor = MusicManagerUser.objects.create_superuser(
+            username='admin', password='adminpass123', display_name='Admin', role='editor'
+        )
+        self.client.force_login(self.editor)
+        self.albums = 0
+
+    def add_albums(self, count):
+        for n in range(self.albums, self.albums + count):
+            album = Album.objects.create(
+                title=f'Album {n}', artist=f'Artist {n % 3}', format='cd',
+                price=Decimal('9.99'), release_date=date.today()
+            )
+            for position in range(1, 4):
+                song = Song.objects.create(title=f'Song {n}-{position}', running_time=100)
+                AlbumTracklistItem.objects.create(album=album, song=song, position=position)
+        self.albums += count
+
+    def query_counts(self):
+        counts = {}
+        for url in self.urls:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(queries)
+        return counts
+
+    def test_query_counts_are_constant(self):
+        self.add_albums(2)
+        small = self.query_counts()
+        self.add_albums(30)
+        self.assertEqual(self.query_counts(), small)
+
+    def test_album_list_is_paginated(self):
+        self.add_albums(30)
+        response = self.client.get('/')
+        self.assertEqual(len(response.context['albums']), 24)
+        self.assertContains(response, 'Page 1 of 2')
+
+
+class SyntheticCatalogTest(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def seed(self, **options):
+        from django.core.management import call_command
+        from io import StringIO
+        options = {'albums': 40, 'songs': 120, 'tracks_per_album': 6, 'artists': 8, 'seed': 3, **options}
+        call_command('seed', stdout=StringIO(), **options)
+
+    def snapshot(self):
+        return list(
+            Album.objects.order_by('title').values_list(
+                'title', 'artist', 'format', 'price', 'release_date', 'track_count', 'total_playtime'
+            )
+        )
+
+    def test_generates_requested_sizes_with_consistent_stats(self):
+        self.seed()
+        self.assertEqual(Album.objects.count(), 40)
+        self.assertEqual(Song.objects.count(), 120)
+        self.assertEqual(len({album.artist for album in Album.objects.all()}), 8)
+        expected = self.snapshot()
+        from catalog.stats import refresh_album_stats
+        refresh_album_stats()
+        self.assertEqual(self.snapshot(), expected)
+        self.assertEqual(
+            AlbumTracklistItem.objects.count(),
+            sum(row[5] for row in expected),
+        )
+        self.assertTrue(all(album.slug for album in Album.objects.all()))
+
+    def test_same_seed_gives_same_catalog(self):
+        self.seed()
+        first = self.snapshot()
+        Album.objects.all().delete()
+        Song.objects.all().delete()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+        self.seed(seed=4)
+        self.assertEqual(Album.objects.count(), 80)  # a second run appends
+
+    def test_rerun_after_deletes_keeps_titles_unique(self):
+        from catalog.synthetic import album_index, album_title
+        self.assertEqual([album_index(album_title(index)) for index in range(2000)], list(range(2000)))
+        self.assertIsNone(album_index('Abbey Road'))
+        self.seed(artists=1)
+        Album.objects.filter(pk__in=Album.objects.order_by('pk').values('pk')[:10]).delete()
+        self.seed(artists=1)  # the same single artist: a reused title collides whenever the format matches
+        self.assertEqual(Album.objects.count(), 70)
+
+    def test_distributions_are_skewed_and_shared(self):
+        from django.db.models import Count
+        self.seed(albums=200, songs=800, artists=20)
+        sizes = list(
+            Album.objects.values('artist').annotate(n=Count('pk')).order_by('-n').values_list('n', flat=True)
+        )
+        self.assertGreater(sizes[0], 4 * sizes[-1])
+        shared = Song.objects.annotate(n=Count('albumtracklistitem')).filter(n__gt=1)
+        self.assertTrue(shared.exists())
+        with_cover = Album.objects.exclude(cover_image='').exclude(cover_image=None).count()
+        self.assertTrue(0 < with_cover < 200)
+
+
+class AlbumExportTest(TestCase):
+    def setUp(self):
+        MusicManagerUser.objects.create_user(username='exporter', password='testpass123', role='viewer')
+        access = self.client.post('/api/token/', {'username': 'exporter', 'password': 'testpass123'}).json()['access']
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {access}'
+        self.album = Album.objects.create(
+            title='Abbey Road', artist='The Beatles', format='vi',
+            price=Decimal('25.99'), release_date=date(2019, 9, 26)
+        )
+        self.empty = Album.objects.create(
+            title='Unreleased', artist='Nobody', format='cd',
+            price=Decimal('9.99'), release_date=date(2020, 1, 1)
+        )
+        for position, (title, running_time) in enumerate([('Come Together', 259), ('Something', 183)], start=1):
+            song = Song.objects.create(title=title, running_time=running_time)
+            AlbumTracklistItem.objects.create(album=self.album, song=song, position=position)
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_has_one_row_per_track(self):
+        import csv
+        from io import StringIO
+        response = self.client.get('/api/albums/export/')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(StringIO(self.read(response))))
+        self.assertEqual(len(rows), 3)  # two tracks + the empty album
+        self.assertEqual(rows[0]['title'], 'Abbey Road')
+        self.assertEqual(rows[0]['song_title'], 'Come Together')
+        self.assertEqual(rows[1]['running_time'], '183')
+        self.assertEqual(rows[1]['total_playtime'], '442')
+        self.assertEqual(rows[2]['title'], 'Unreleased')
+        self.assertEqual(rows[2]['song_id'], '')
+
+    def test_ndjson_nests_tracklist(self):
+        import json
+        response = self.client.get('/api/albums/export/?export_format=ndjson')
+        lines = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([line['title'] for line in lines], ['Abbey Road', 'Unreleased'])
+        self.assertEqual(lines[0]['price'], '25.99')
+        self.assertEqual(lines[0]['release_date'], '2019-09-26')
+        self.assertEqual([track['position'] for track in lines[0]['tracklist']], [1, 2])
+        self.assertEqual(lines[1]['tracklist'], [])
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get('/api/albums/export/?export_format=xml')
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_authentication(self):
+        self.assertEqual(Client().get('/api/albums/export/').status_code, 401)
+
+    def test_csv_guards_formula_cells(self):
+        import csv
+        from io import StringIO
+        from catalog.export import unguard_cell
+        titles = ['=HYPERLINK("x")', '-1+2', "'@SUM(A1)", "'Round Midnight", 'Plain']
+        for index, title in enumerate(titles):
+            Album.objects.create(
+                title=title, artist='Guarded', format='cd', price=Decimal('1.00'), release_date=date(2020, 1, index + 1),
+            )
+        rows = list(csv.DictReader(StringIO(self.read(self.client.get('/api/albums/export/')))))
+        exported = {unguard_cell(row['title']): row['title'] for row in rows if row['artist'] == 'Guarded'}
+        self.assertEqual(exported, {
+            '=HYPERLINK("x")': '\'=HYPERLINK("x")', '-1+2': "'-1+2", "'@SUM(A1)": "''@SUM(A1)",
+            "'Round Midnight": "'Round Midnight", 'Plain': 'Plain',
+        })
+
+    def test_export_queries_per_chunk_not_per_album(self):
+        from catalog.export import export_albums
+        with self.assertNumQueries(2):  # albums + tracklists for the single chunk
+            lines = list(export_albums(Album.objects.all(), 'ndjson'))
+        self.assertEqual(len(lines), 2)
+        with self.assertNumQueries(3):  # one tracklist query per chunk of one album
+            list(export_albums(Album.objects.all(), 'ndjson', chunk_size=1))
+
+    def test_admin_action_streams_selection(self):
+        editor = MusicManagerUser.objects.create_superuser(
+            username='admin', password='adminpass123', display_name='Admin', role='editor'
+        )
+        self.client.force_login(editor)
+        response = self.client.post('/admin/catalog/album/', {
+            'action': 'export_albums',
+            '_selected_action': [self.album.pk],
+        })
+        self.assertIn('attachment; filename="albums.csv"', response['Content-Disposition'])
+        content = self.read(response)
+        self.assertIn('Something', content)
+        self.assertNotIn('Unreleased', content)
+
+    def test_management_command_writes_file(self):
+        import json
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from io import StringIO
+        handle, path = tempfile.mkstemp(suffix='.ndjson')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command('export_albums', path, '--format', 'ndjson', stdout=StringIO())
+        with open(path, encoding='utf-8') as exported:
+            albums = [json.loads(line) for line in exported]
+        self.assertEqual([album['id'] for album in albums], [self.album.pk, self.empty.pk])
+
+
+class CatalogImportTest(TestCase):
+    CSV = (
+        'title,artist,format,price,release_date,description,position,song_title,running_time\n'
+        'Abbey Road,The Beatles,vi,25.99,1969-09-26,Classic,1,Come Together,259\n'
+        'Abbey Road,The Beatles,vi,25.99,1969-09-26,Classic,2,Something,183\n'
+        'Bad Dates,Nobody,cd,9.99,2999-01-01,,1,Lost,200\n'
+        'Help!,The Beatles,Vinyl,19.99,1965-08-06,,1,  something ,300\n'
+        'Empty,Nobody,dd,4.99,2020-01-01,,,,\n'
+    )
+
+    def write(self, content, suffix='.csv'):
+        import os
+        import tempfile
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as output:
+            output.write(content)
+        self.addCleanup(lambda: [os.remove(p) for p in (path, f'{path}.checkpoint') if os.path.exists(p)])
+        return path
+
+    def run_import(self, path, *args):
+        from django.core.management import call_command
+        from io import StringIO
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_catalog', path, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_csv_import_validates_and_dedupes_songs(self):
+        stdout, stderr = self.run_import(self.write(self.CSV))
+        self.assertIn('line 4:', stderr)
+        self.assertIn('Release date cannot be more than 3 years in the future', stderr)
+        self.assertEqual(Album.objects.count(), 3)
+        self.assertEqual(Song.objects.count(), 2)  # "  something " reuses "Something"
+        abbey = Album.objects.get(title='Abbey Road')
+        self.assertEqual(abbey.track_count, 2)
+        self.assertEqual(abbey.total_playtime, 442)
+        self.assertTrue(abbey.slug)
+        help_album = Album.objects.get(title='Help!')
+        self.assertEqual(help_album.format, 'vi')
+        self.assertEqual(help_album.total_playtime, 183)
+        self.assertEqual(Album.objects.get(title='Empty').track_count, 0)
+
+    def test_reimport_upserts_in_place(self):
+        self.run_import(self.write(self.CSV))
+        abbey = Album.objects.get(title='Abbey Road')
+        first_items = set(abbey.albumtracklistitem_set.values_list('pk', flat=True))
+        changed = (
+            'title,artist,format,price,release_date,position,song_title,running_time\n'
+            'Abbey Road,The Beatles,vi,30.00,1969-09-26,1,Something,183\n'
+            'Abbey Road,The Beatles,vi,30.00,1969-09-26,2,Octopus\'s Garden,171\n'
+        )
+        stdout, stderr = self.run_import(self.write(changed))
+        self.assertIn('0 albums created, 1 updated', stdout)
+        abbey.refresh_from_db()
+        self.assertEqual(abbey.price, Decimal('30.00'))
+        self.assertEqual(abbey.description, 'Classic')  # no description column: kept
+        self.assertEqual(
+            [(item.position, item.song.title) for item in abbey.tracklist],
+            [(1, 'Something'), (2, "Octopus's Garden")],
+        )
+        self.assertEqual(abbey.track_count, 2)
+        self.assertEqual(abbey.total_playtime, 354)
+        kept = set(abbey.albumtracklistitem_set.values_list('pk', flat=True))
+        self.assertEqual(len(kept & first_items), 1)  # "Something" was moved, not recreated
+
+    def test_jsonl_round_trips_an_export(self):
+        from catalog.export import export_albums
+        self.run_import(self.write(self.CSV))
+        exported = ''.join(export_albums(Album.objects.order_by('pk'), 'ndjson'))
+        Album.objects.all().delete()
+        stdout, stderr = self.run_import(self.write(exported, suffix='.jsonl'))
+        self.assertEqual(stderr, '')
+        self.assertEqual(Album.objects.count(), 3)
+        self.assertEqual(Song.objects.count(), 2)
+        self.assertEqual(Album.objects.get(title='Abbey Road').total_playtime, 442)
+
+    def test_negative_position_is_rejected(self):
+        csv = self.CSV.splitlines()[0] + '\nNegative,Nobody,cd,9.99,2020-01-01,,-1,Lost,200\n'
+        stdout, stderr = self.run_import(self.write(csv))
+        self.assertIn('position: "-1" is not a non-negative whole number', stderr)
+        self.assertFalse(Album.objects.filter(title='Negative').exists())
+
+    def test_csv_round_trips_guarded_cells(self):
+        from catalog.export import export_albums
+        Album.objects.create(title='=Sum', artist='-Minus', format='cd', price=Decimal('1.00'), release_date=date(2020, 1, 1))
+        exported = ''.join(export_albums(Album.objects.all(), 'csv'))
+        self.assertIn("'=Sum", exported)
+        Album.objects.all().delete()
+        stdout, stderr = self.run_import(self.write(exported))
+        self.assertEqual(stderr, '')
+        self.assertEqual(list(Album.objects.values_list('title', 'artist')), [('=Sum', '-Minus')])
+
+    def test_dry_run_writes_nothing(self):
+        stdout, stderr = self.run_import(self.write(self.CSV), '--dry-run')
+        self.assertIn('Dry run', stdout)
+        self.assertIn('3 albums created', stdout)
+        self.assertEqual(Album.objects.count(), 0)
+        self.assertEqual(Song.objects.count(), 0)
+
+    def test_reimport_only_touches_changed_albums(self):
+        self.run_import(self.write(self.CSV))
+        before = dict(Album.objects.values_list('title', 'updated_at'))
+        self.run_import(self.write(self.CSV.replace('Abbey Road,The Beatles,vi,25.99,1969-09-26,Classic,2,Something,183\n', '')))
+        after = dict(Album.objects.values_list('title', 'updated_at'))
+        self.assertEqual(after['Empty'], before['Empty'])
+        self.assertEqual(after['Help!'], before['Help!'])
+        self.assertGreater(after['Abbey Road'], before['Abbey Road'])
+
+    def test_resumes_from_checkpoint_after_failure(self):
+        import os
+        from unittest import mock
+        from catalog.importer import CatalogImporter
+        path = self.write(self.CSV)
+        real_write_batch = CatalogImporter.write_batch
+        calls = []
+
+        def failing_write_batch(importer, batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise RuntimeError('database went away')
+            return real_write_batch(importer, batch)
+
+        with mock.patch.object(CatalogImporter, 'write_batch', failing_write_batch):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, '--batch-size', '1')
+        self.assertEqual(Album.objects.count(), 1)
+        self.assertTrue(os.path.exists(f'{path}.checkpoint'))
+
+        stdout, stderr = self.run_import(path, '--batch-size', '1')
+        self.assertIn('3 albums created', stdout)  # totals include the first run
+        self.assertEqual(Album.objects.count(), 3)
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.album = Album.objects.create(
+            title='Revalidated', artist='Cache Friendly', format='cd',
+            price=Decimal('9.99'), release_date=date(2020, 1, 1),
+        )
+        self.song = Song.objects.create(title='Etag Song', running_time=200)
+        AlbumTracklistItem.objects.create(album=self.album, song=self.song, position=1)
+        self.detail_url = f'/api/albums/{self.album.pk}/'
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        return response['ETag']
+
+    def test_unchanged_album_answers_304_from_one_query(self):
+        response = self.client.get(self.detail_url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            revalidated = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+        with self.assertNumQueries(1):
+            revalidated = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(revalidated.status_code, 304)
+        etag = self.etag('/api/albums/?cursor=')
+        with self.assertNumQueries(1):  # the keyset page over values(), no serializers
+            revalidated = self.client.get('/api/albums/?cursor=', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, 304)
+        etag = self.etag('/api/songs/')
+        with self.assertNumQueries(2):  # COUNT + page
+            revalidated = self.client.get('/api/songs/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_tracklist_and_song_edits_change_album_etag(self):
+        etag = self.etag(self.detail_url)
+        AlbumTracklistItem.objects.create(
+            album=self.album, song=Song.objects.create(title='Bonus', running_time=100), position=2,
+        )
+        self.assertNotEqual(self.etag(self.detail_url), etag)
+        etag = self.etag(self.detail_url)
+        self.song.title = 'Renamed Song'
+        self.song.save()
+        self.assertNotEqual(self.etag(self.detail_url), etag)
+        etag = self.etag(self.detail_url)
+        AlbumTracklistItem.objects.filter(song=self.song).delete()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['tracklist']), 1)
+
+    def test_list_etag_tracks_deletions_filters_and_pages(self):
+        other = Album.objects.create(
+            title='Second', artist='Cache Friendly', format='dd',
+            price=Decimal('4.99'), release_date=date(2021, 1, 1),
+        )
+        etag = self.etag('/api/albums/')
+        self.assertEqual(self.etag('/api/albums/'), etag)
+        self.assertNotEqual(self.etag('/api/albums/?page=1'), etag)
+        self.assertNotEqual(self.etag('/api/albums/?cursor='), etag)
+        other.delete()
+        response = self.client.get('/api/albums/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        song_etag = self.etag('/api/songs/')
+        Song.objects.filter(pk=self.song.pk).update(running_time=300)
+        self.assertEqual(self.etag('/api/songs/'), song_etag)  # queryset.update() bypasses auto_now
+        self.song.refresh_from_db()
+        self.song.save()
+        self.assertNotEqual(self.etag('/api/songs/'), song_etag)
+
+    def test_missing_album_is_still_404(self):
+        self.assertEqual(self.client.get('/api/albums/999999/').status_code, 404)
+
+    def test_malformed_pk_with_validators_is_404(self):
+        for url in ['/api/albums/abc/', '/api/songs/abc/']:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"x"').status_code, 404, url)
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2024 00:00:00 GMT').status_code, 404, url,
+            )
+
+    def test_rebuild_stats_leaves_correct_albums_untouched(self):
+        from django.core.management import call_command
+        from io import StringIO
+        stale = Album.objects.create(
+            title='Stale', artist='Cache Friendly', format='dd',
+            price=Decimal('4.99'), release_date=date(2021, 1, 1),
+        )
+        Album.objects.filter(pk=stale.pk).update(track_count=5)
+        before = dict(Album.objects.values_list('pk', 'updated_at'))
+        stdout = StringIO()
+        call_command('rebuild_album_stats', stdout=stdout)
+        self.assertIn('(1 corrected)', stdout.getvalue())
+        after = dict(Album.objects.values_list('pk', 'updated_at'))
+        self.assertEqual(after[self.album.pk], before[self.album.pk])
+        self.assertGreater(after[stale.pk], before[stale.pk])
+
+
+class AlbumPayloadCacheTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.album = Album.objects.create(
+            title='Cached', artist='Warm Artist', format='cd',
+            price=Decimal('9.99'), release_date=date(2020, 1, 1),
+        )
+        self.song = Song.objects.create(title='First Take', running_time=200)
+        AlbumTracklistItem.objects.create(album=self.album, song=self.song, position=1)
+        self.detail_url = f'/api/albums/{self.album.pk}/'
+
+    def test_second_detail_request_runs_no_queries(self):
+        from catalog.caching import cache_stats
+        first = self.client.get(self.detail_url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get(self.detail_url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_song_and_tracklist_edits_invalidate_the_album(self):
+        padded_url = f'/api/albums/0{self.album.pk}/'  # same album, keyed on its normalized id
+        self.client.get(padded_url)
+        self.song.title = 'Second Take'
+        self.song.save()
+        response = self.client.get(padded_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['tracklist'][0]['song']['title'], 'Second Take')
+        AlbumTracklistItem.objects.create(
+            album=self.album, song=Song.objects.create(title='Bonus', running_time=100), position=2,
+        )
+        self.assertEqual(len(self.client.get(self.detail_url).json()['tracklist']), 2)
+        self.album.delete()
+        self.assertEqual(self.client.get(self.detail_url).status_code, 404)
+
+    def test_list_pages_invalidate_on_album_changes(self):
+        self.client.get('/api/albums/')
+        self.assertEqual(self.client.get('/api/albums/')['X-Cache'], 'HIT')
+        other = Album.objects.create(
+            title='Another', artist='Warm Artist', format='dd',
+            price=Decimal('4.99'), release_date=date(2021, 1, 1),
+        )
+        self.assertEqual(self.client.get('/api/albums/').json()['count'], 2)
+        self.song.running_time = 260
+        self.song.save()
+        results = {album['id']: album for album in self.client.get('/api/albums/').json()['results']}
+        self.assertEqual(results[self.album.pk]['total_playtime'], 260)
+        other_payload = self.client.get(f'/api/albums/{other.pk}/')
+        self.assertEqual(self.client.get(f'/api/albums/{other.pk}/')['X-Cache'], 'HIT')
+        self.assertEqual(other_payload.status_code, 200)
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_warm_command_fills_the_cache(self):
+        from django.core.management import call_command
+        from io import StringIO
+        stdout = StringIO()
+        call_command('warm_album_cache', '--pages', '1', stdout=stdout)
+        self.assertIn('1 list pages and 1 albums', stdout.getvalue())
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url, HTTP_HOST='localhost:8000', HTTP_ACCEPT='application/json')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+
+def _bus_worker(db_path, commands, results):
+    """A forked "WSGI worker": its own local-memory cache, sharing a database file"""
+    from django.core.cache import cache
+    from django.db import connections
+    from catalog.bus import bus
+    database = connections['default']
+    database.connection = None  # the parent's in-memory test database is not shared
+    database.settings_dict['NAME'] = db_path
+    cache.clear()
+    bus.reset()
+    client = Client()
+    for command, album_id, value in iter(commands.get, None):
+        if command == 'get':
+            response = client.get(f'/api/albums/{album_id}/')
+            results.put((response.json()['title'], response['X-Cache']))
+        elif command == 'rename':
+            album = Album.objects.get(pk=album_id)
+            album.title = value
+            album.save()
+            results.put(('saved', None))
+    database.close()
+
+
+@skipUnless(hasattr(os, 'fork'), 'needs fork() to share the test setup with worker processes')
+class InvalidationBusMultiprocessTest(TransactionTestCase):
+    POLL_INTERVAL = 0.2
+
+    def setUp(self):
+        import sqlite3
+        import tempfile
+        from django.db import connection
+        self.album = Album.objects.create(
+            title='Before', artist='Many Workers', format='cd',
+            price=Decimal('9.99'), release_date=date(2020, 1, 1),
+        )
+        handle, self.db_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(lambda: [os.remove(p) for p in (self.db_path, f'{self.db_path}.bus', f'{self.db_path}.bus.lock')
+                                 if os.path.exists(p)])
+        connection.ensure_connection()
+        with sqlite3.connect(self.db_path) as target:
+            connection.connection.backup(target)
+
+    def start_worker(self):
+        import multiprocessing
+        context = multiprocessing.get_context('fork')
+        commands, results = context.Queue(), context.Queue()
+        process = context.Process(target=_bus_worker, args=(self.db_path, commands, results))
+        process.start()
+
+        def stop():
+            commands.put(None)
+            process.join(10)
+        self.addCleanup(stop)
+
+        def send(command, value=None):
+            commands.put((command, self.album.pk, value))
+            return results.get(timeout=10)
+        return send
+
+    def test_write_in_one_worker_reaches_the_others(self):
+        for backend in ['file', 'database']:
+            with self.subTest(backend=backend), override_settings(
+                CATALOG_BUS_BACKEND=backend,
+                CATALOG_BUS_POLL_INTERVAL=self.POLL_INTERVAL,
+                CATALOG_BUS_PATH=f'{self.db_path}.bus',
+            ):
+                readers = [self.start_worker(), self.start_worker()]
+                writer = self.start_worker()
+                title = f'After ({backend})'
+                for reader in readers:
+                    self.assertEqual(reader('get')[0], self.album.title)
+                    self.assertEqual(reader('get'), (self.album.title, 'HIT'))
+                self.assertEqual(writer('rename', title), ('saved', None))
+                time.sleep(self.POLL_INTERVAL + 0.05)
+                for reader in readers:
+                    self.assertEqual(reader('get'), (title, 'MISS'))
+                    self.assertEqual(reader('get'), (title, 'HIT'))
+                self.album.title = title
+
+
+class InvalidationBusTest(TestCase):
+    def test_transaction_publishes_one_change_on_commit(self):
+        from catalog.bus import DatabaseBackend, bus
+        from catalog.models import CatalogChange
+        reader = DatabaseBackend()
+        self.assertEqual(reader.read(), [])
+        with override_settings(CATALOG_BUS_BACKEND='database'):
+            with self.captureOnCommitCallbacks(execute=True):
+                album = Album.objects.create(
+                    title='Published', artist='Bus', format='cd',
+                    price=Decimal('9.99'), release_date=date(2020, 1, 1),
+                )
+                song = Song.objects.create(title='Bus Song', running_time=100)
+                AlbumTracklistItem.objects.create(album=album, song=song, position=1)
+            self.assertEqual(CatalogChange.objects.count(), 1)
+            self.assertEqual(reader.read(), [[album.pk]])
+            self.assertEqual(reader.read(), [])
+            bus.publish()  # outside the test's transaction the write is immediate
+        self.assertEqual(reader.read(), [])
+        self.assertEqual(CatalogChange.objects.count(), 1)  # captured, not run yet
+
+    def test_file_log_rotation_expires_everything(self):
+        import tempfile
+        from catalog.bus import EVERYTHING, FileBackend
+        path = os.path.join(tempfile.mkdtemp(), 'bus.log')
+        writer, reader = FileBackend(path), FileBackend(path)
+        self.assertEqual(reader.read(), [])
+        writer.write([1, 2])
+        writer.write([3])
+        self.assertEqual(reader.read(), [[1, 2], [3]])
+        writer.max_bytes = 0
+        writer.write([4])
+        self.assertEqual(reader.read(), [EVERYTHING, [4]])
+
+
+@override_settings(CATALOG_RESPONSE_CACHE=False)
+class CompiledSerializerTest(TestCase):
+    def setUp(self):
+        self.albums = [
+            Album.objects.create(
+                title='Ünïcode "Quotes"', artist='Ártist', format='vi', price=Decimal('5'),
+                release_date=date(1999, 12, 31), description='x' * 150,
+            ),
+            Album.objects.create(
+                title='Plain', artist='Someone', format='dd', price=Decimal('12.50'),
+                release_date=date(2020, 2, 29), description='',
+            ),
+            Album.objects.create(
+                title='Empty Tracklist', artist='Nobody', format='cd', price=Decimal('0.99'),
+                release_date=date(2001, 1, 1), description='Short\nand multi-line',
+            ),
+        ]
+        Album.objects.filter(pk=self.albums[0].pk).update(cover_image='album_covers/cover art é.png')
+        for position, running_time in [(2, 125), (None, 59), (1, 3600)]:
+            song = Song.objects.create(title=f'Song {running_time} ✓', running_time=running_time)
+            AlbumTracklistItem.objects.create(album=self.albums[0], song=song, position=position)
+            AlbumTracklistItem.objects.create(album=self.albums[1], song=song, position=position)
+
+    def render_both(self, url):
+        with override_settings(CATALOG_FAST_SERIALIZERS=False):
+            expected = self.client.get(url)
+        actual = self.client.get(url)
+        self.assertEqual(actual.status_code, expected.status_code)
+        return expected.content, actual.content
+
+    def test_api_output_is_byte_identical(self):
+        urls = ['/api/albums/', '/api/albums/?cursor=', '/api/albums/?page=1&format=json', '/api/songs/']
+        urls += [f'/api/albums/{album.pk}/' for album in self.albums]
+        urls += [f'/api/songs/{song.pk}/' for song in Song.objects.all()]
+        urls += ['/api/albums/999999/', '/api/albums/abc/']
+        for url in urls:
+            with self.subTest(url=url):
+                expected, actual = self.render_both(url)
+                self.assertEqual(actual, expected)
+        self.assertIn('cover%20art%20%C3%A9.png', self.client.get('/api/albums/').content.decode())
+
+    def test_compiled_data_matches_serializers(self):
+        from rest_framework.renderers import JSONRenderer
+        from rest_framework.test import APIRequestFactory
+        from catalog.fast_serializers import ALBUM, ALBUM_DETAIL, SONG
+        from catalog.serializers import AlbumDetailSerializer, AlbumSerializer, SongSerializer
+        context = {'request': APIRequestFactory().get('/')}
+        cases = [
+            (AlbumSerializer, ALBUM, Album.objects.all()),
+            (AlbumDetailSerializer, ALBUM_DETAIL, Album.objects.with_tracklist()),
+            (SongSerializer, SONG, Song.objects.all()),
+        ]
+        for serializer_class, compiled, queryset in cases:
+            with self.subTest(serializer=serializer_class.__name__):
+                expected = serializer_class(queryset, many=True, context=context).data
+                actual = compiled.many(list(queryset.prefetch_related(None).values(*compiled.sources)), context)
+                self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+
+class FastJSONTest(TestCase):
+    def setUp(self):
+        from datetime import datetime, time as clock, timezone as dt_timezone
+        from uuid import UUID
+        from django.utils.translation import gettext_lazy
+        from rest_framework.exceptions import ErrorDetail
+        self.data = {
+            'price': Decimal('12.50'),
+            'release_date': date(2020, 2, 29),
+            'updated_at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'naive': datetime(2024, 5, 1, 12, 30),
+            'offset': datetime(1999, 12, 31, 23, 59, 59, tzinfo=dt_timezone(timedelta(hours=5, minutes=30))),
+            'time': clock(8, 15, 0, 999999),
+            'duration': timedelta(minutes=3, seconds=5),
+            'id': UUID('12345678-1234-5678-1234-567812345678'),
+            'text': 'Ünïcode "quoted" \u2028line\u2029 ✓',
+            'error': [ErrorDetail('This field is required.', code='required')],
+            'lazy': gettext_lazy('Albums'),
+            7: (1.5, None, True),
+        }
+
+    def render_both(self, data, media_type=None):
+        from rest_framework.renderers import JSONRenderer
+        from catalog.renderers import FastJSONRenderer
+        return JSONRenderer().render(data, media_type), FastJSONRenderer().render(data, media_type)
+
+    def test_renders_like_drf(self):
+        for data in [self.data, [self.data, {'big': 2 ** 70}], {}, None]:
+            for media_type in [None, 'application/json', 'application/json; indent=4']:
+                with self.subTest(data=data, media_type=media_type):
+                    expected, actual = self.render_both(data, media_type)
+                    self.assertEqual(actual, expected)
+
+    def test_falls_back_to_stdlib_without_orjson(self):
+        from unittest import mock
+        with mock.patch('catalog.renderers.orjson', None):
+            expected, actual = self.render_both(self.data)
+            self.assertEqual(actual, expected)
+            response = self.client.post('/api/songs/', '{"title": "Stdlib", "running_time": 90}',
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_parses_like_drf(self):
+        import io
+        from rest_framework.exceptions import ParseError
+        from rest_framework.parsers import JSONParser
+        from catalog.renderers import FastJSONParser
+        bodies = ['{"title": "Ünïcode", "running_time": 90, "tags": [1.5, null, true]}', '[18446744073709551616]']
+        for body in bodies:
+            with self.subTest(body=body):
+                self.assertEqual(
+                    FastJSONParser().parse(io.BytesIO(body.encode())),
+                    JSONParser().parse(io.BytesIO(body.encode())),
+                )
+        for body in ['{"title": ', '[NaN]']:
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as expected:
+                    JSONParser().parse(io.BytesIO(body.encode()))
+                with self.assertRaises(ParseError) as actual:
+                    FastJSONParser().parse(io.BytesIO(body.encode()))
+                self.assertEqual(str(actual.exception), str(expected.exception))
+
+    def test_api_uses_fast_json(self):
+        response = self.client.post('/api/songs/', '{"title": "Fast ✓", "running_time": 90}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Song.objects.get().title, 'Fast ✓')
+        self.assertEqual(type(response.accepted_renderer).__name__, 'FastJSONRenderer')
+        response = self.client.post('/api/songs/', '{"title": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.json()['detail'])
+
+
+@override_settings(CATALOG_RESPONSE_CACHE=False)
+class StreamingListTest(TestCase):
+    def setUp(self):
+        for index in range(25):
+            album = Album.objects.create(
+                title=f'Album {index % 7}', artist=f'Artist {index}', format='cd',
+                price=Decimal('9.99'), release_date=date(2020, 1, 1),
+            )
+            song = Song.objects.create(title=f'Song {index}', running_time=100 + index)
+            AlbumTracklistItem.objects.create(album=album, song=song, position=1)
+        MusicManagerUser.objects.create_user(username='streamer', password='testpass123', role='viewer')
+        access = self.client.post('/api/token/', {'username': 'streamer', 'password': 'testpass123'}).json()['access']
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {access}'
+
+    def stream(self, url, **headers):
+        from unittest import mock
+        from catalog.streaming import StreamingListMixin
+        with mock.patch.object(StreamingListMixin, 'stream_chunk_size', 4):
+            response = self.client.get(url, **headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            with CaptureQueriesContext(connection) as queries:
+                content = b''.join(response.streaming_content)
+        return content, len(queries)
+
+    def expected(self, serializer_class, queryset):
+        import json
+        from rest_framework.test import APIRequestFactory
+        data = serializer_class(queryset, many=True, context={'request': APIRequestFactory().get('/')}).data
+        return b''.join(json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode() + b'\n'
+                        for record in data)
+
+    def test_streams_every_record_unpaginated(self):
+        from catalog.serializers import AlbumSerializer, AlbumTracklistItemSerializer, SongSerializer
+        cases = [
+            ('/api/albums/?format=ndjson', AlbumSerializer, Album.objects.order_by('title', 'id')),
+            ('/api/songs/?format=ndjson', SongSerializer, Song.objects.order_by('title', 'id')),
+            ('/api/tracklist/?format=ndjson', AlbumTracklistItemSerializer,
+             AlbumTracklistItem.objects.order_by('position', 'id')),
+        ]
+        for url, serializer_class, queryset in cases:
+            for fast in [True, False]:
+                with self.subTest(url=url, fast=fast), override_settings(CATALOG_FAST_SERIALIZERS=fast):
+                    content, queries = self.stream(url)
+                    self.assertEqual(content, self.expected(serializer_class, queryset))
+                    self.assertEqual(len(content.splitlines()), 25)
+                    # Fetched with one cursor, consumed in chunks while streaming
+                    self.assertEqual(queries, 1)
+
+    def test_accept_header_and_single_records(self):
+        content, _ = self.stream('/api/songs/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(len(content.splitlines()), 25)
+        album = Album.objects.first()
+        response = self.client.get(f'/api/albums/{album.pk}/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response.content.count(b'\n'), 1)
+        self.assertIn(b'"tracklist":', response.content)
+        response = self.client.get('/api/albums/999999/?format=ndjson')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.content, b'{"detail":"No Album matches the given query."}\n')
+        # JSON stays paginated
+        self.assertEqual(len(self.client.get('/api/albums/').json()['results']), 10)
+
+    def test_stream_requires_authentication(self):
+        anonymous = Client()
+        for url in ['/api/albums/?format=ndjson', '/api/songs/?format=ndjson', '/api/tracklist/?format=ndjson']:
+            response = anonymous.get(url)
+            self.assertEqual(response.status_code, 401, url)
+            self.assertFalse(response.streaming)
+        self.assertEqual(anonymous.get('/api/albums/').status_code, 200)  # pages stay public
+
+
+def cover_upload(name='cover.jpg', size=(1200, 900), image_format='JPEG'):
+    import io
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 40, 90)).save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{image_format.lower()}')
+
+
+class CoverMediaMixin:
+    def setUp(self):
+        import shutil
+        import tempfile
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, CATALOG_RESPONSE_CACHE=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_album(self, **fields):
+        fields = {'title': 'Covered', 'artist': 'Artist', 'format': 'cd', 'price': Decimal('9.99'),
+                  'release_date': date(2020, 1, 1), **fields}
+        return Album.objects.create(**fields)
+
+
+@override_settings(CATALOG_COVER_WORKERS=0)
+class CoverVariantsTest(CoverMediaMixin, TestCase):
+    def test_upload_renders_webp_variants_on_commit(self):
+        from PIL import Image
+        from catalog.covers import storage
+        from catalog.imaging import COVER_SIZES
+        with self.captureOnCommitCallbacks(execute=True):
+            album = self.create_album(cover_image=cover_upload())
+            self.assertEqual(album.cover_variants, {})
+        album.refresh_from_db()
+        self.assertEqual(set(album.cover_variants), set(COVER_SIZES))
+        for size, name in album.cover_variants.items():
+            self.assertRegex(name, r'^album_covers/([0-9a-f]{2})/\1[0-9a-f]{62}\.webp$')
+            with storage.open(name) as variant, Image.open(variant) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(max(image.size), COVER_SIZES[size])
+                self.assertEqual(image.size[0] * 3, image.size[1] * 4)
+        self.assertEqual(album.cover_images['card'], storage.url(album.cover_variants['card']))
+        self.assertEqual(album.cover_images['original'], album.cover_image.url)
+
+    def test_replacing_the_cover_renders_again(self):
+        from PIL import Image
+        from catalog.covers import storage
+        with self.captureOnCommitCallbacks(execute=True):
+            album = self.create_album(cover_image=cover_upload())
+        album = Album.objects.get(pk=album.pk)
+        first = album.cover_variants['thumb']
+        with self.captureOnCommitCallbacks() as callbacks:
+            album.title = 'Renamed'
+            album.save()
+        self.assertEqual(len(callbacks), 1)  # the cache invalidation only
+        with self.captureOnCommitCallbacks(execute=True):
+            album.cover_image = cover_upload('other.png', (300, 600), 'PNG')
+            album.save()
+            self.assertEqual(album.cover_variants, {})
+        album.refresh_from_db()
+        self.assertNotEqual(album.cover_variants['thumb'], first)
+        with storage.open(album.cover_variants['large']) as variant, Image.open(variant) as image:
+            self.assertEqual(image.size, (300, 600))  # never upscaled
+        with self.captureOnCommitCallbacks(execute=True):
+            album.cover_image = None
+            album.save()
+        self.assertEqual(Album.objects.get(pk=album.pk).cover_variants, {})
+        self.assertIsNone(album.cover_images)
+
+    def test_api_and_pages_use_the_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            album = self.create_album(cover_image=cover_upload())
+        self.create_album(title='Bare')
+        album.refresh_from_db()
+        urls = ['/api/albums/', '/api/albums/?cursor=', f'/api/albums/{album.pk}/']
+        for url in urls:
+            with self.subTest(url=url):
+                with override_settings(CATALOG_FAST_SERIALIZERS=False):
+                    expected = self.client.get(url).content
+                self.assertEqual(self.client.get(url).content, expected)
+        data = self.client.get(f'/api/albums/{album.pk}/').json()
+        self.assertEqual(data['cover_images']['thumb'], f'http://testserver{album.cover_images["thumb"]}')
+        self.assertEqual(data['cover_images']['original'], data['cover_image_url'])
+        bare = self.client.get('/api/albums/').json()['results'][0]
+        self.assertIsNone(bare['cover_images'])
+        response = self.client.get(reverse('album-list'))
+        self.assertContains(response, f'src="{album.cover_images["card"]}"')
+        self.assertNotContains(response, f'src="{album.cover_image.url}"')
+
+    def test_broken_cover_is_logged_not_raised(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        album = self.create_album()
+        album.cover_image.save('broken.jpg', SimpleUploadedFile('broken.jpg', b'not an image'), save=False)
+        with self.assertLogs('catalog.covers', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                album.save()
+        self.assertEqual(Album.objects.get(pk=album.pk).cover_variants, {})
+
+    def test_build_cover_variants_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        album = self.create_album(cover_image=cover_upload())
+        self.create_album(title='Bare')
+        self.assertEqual(Album.objects.get(pk=album.pk).cover_variants, {})  # on_commit never ran
+        out = StringIO()
+        call_command('build_cover_variants', '--workers', '1', stdout=out)
+        self.assertIn('Successfully rendered variants for 1 covers (0 replaced meanwhile, 0 failed)', out.getvalue())
+        self.assertEqual(len(Album.objects.get(pk=album.pk).cover_variants), 3)
+        call_command('build_cover_variants', stdout=out)
+        self.assertIn('for 0 covers', out.getvalue())
+
+
+class CoverWorkerPoolTest(CoverMediaMixin, TransactionTestCase):
+    @override_settings(CATALOG_COVER_WORKERS=1)
+    def test_upload_is_rendered_in_the_process_pool(self):
+        album = self.create_album(cover_image=cover_upload())
+        deadline = time.monotonic() + 60
+        while not Album.objects.get(pk=album.pk).cover_variants and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(len(Album.objects.get(pk=album.pk).cover_variants), 3)
+
+
+class ContentAddressedStorageTest(CoverMediaMixin, TestCase):
+    def test_identical_uploads_share_one_file(self):
+        import os
+        from catalog.covers import storage
+        upload = cover_upload('Front.JPG')
+        editions = [self.create_album(format=edition, cover_image=cover_upload(f'{edition}.jpg'))
+                    for edition in ['cd', 'vi', 'dd']]
+        names = {album.cover_image.name for album in editions}
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertRegex(name, r'^album_covers/([0-9a-f]{2})/\1[0-9a-f]{62}\.jpg$')
+        self.assertEqual(storage.save('album_covers/Front.JPG', upload), name)
+        directory = os.path.dirname(storage.path(name))
+        self.assertEqual(os.listdir(directory), [os.path.basename(name)])  # no temporary files left
+        self.assertEqual(os.stat(storage.path(name)).st_mode & 0o777, 0o644)
+        other = self.create_album(title='Other', cover_image=cover_upload('x.jpg', (10, 10)))
+        self.assertNotEqual(other.cover_image.name, name)
+
+    def test_large_upload_is_hashed_in_chunks(self):
+        import hashlib
+        from django.core.files.uploadedfile import TemporaryUploadedFile
+        from catalog.covers import storage
+        data = os.urandom(3 * 1024 * 1024)
+        upload = TemporaryUploadedFile('big.bin', 'application/octet-stream', len(data), None)
+        upload.write(data)
+        upload.DEFAULT_CHUNK_SIZE = 64 * 1024
+        name = storage.save('album_covers/big.bin', upload)
+        self.assertEqual(name, f'album_covers/{hashlib.sha256(data).hexdigest()[:2]}/'
+                               f'{hashlib.sha256(data).hexdigest()}.bin')
+        with storage.open(name) as stored:
+            self.assertEqual(stored.read(), data)
+
+    def test_content_addressed_media_is_immutable(self):
+        from django.conf import settings
+        from django.test import RequestFactory
+        from catalog.views import serve_media
+        album = self.create_album(cover_image=cover_upload())
+        request = RequestFactory().get('/media/')
+        response = serve_media(request, album.cover_image.name, document_root=settings.MEDIA_ROOT)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        from catalog.covers import storage
+        path = storage.path('album_covers/plain.jpg')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as plain:
+            plain.write(b'jpeg')
+        response = serve_media(request, 'album_covers/plain.jpg', document_root=settings.MEDIA_ROOT)
+        self.assertNotIn('Cache-Control', response)
+
+    def test_migrate_cover_storage(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from catalog.covers import storage
+        upload = cover_upload().read()
+        legacy = {}
+        for index, filename in enumerate(['front.jpg', 'front_copy.jpg', 'sub/back.png']):
+            path = storage.path(f'album_covers/{filename}')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as legacy_file:
+                legacy_file.write(upload if index < 2 else b'png' * 100)
+            album = self.create_album(title=f'Legacy {index}')
+            Album.objects.filter(pk=album.pk).update(cover_image=f'album_covers/{filename}')
+            legacy[album.pk] = f'album_covers/{filename}'
+        missing = self.create_album(title='Missing')
+        Album.objects.filter(pk=missing.pk).update(cover_image='album_covers/gone.jpg')
+        shared = self.create_album(title='Shared', cover_image=cover_upload())
+
+        out = StringIO()
+        call_command('migrate_cover_storage', '--dry-run', stdout=out)
+        self.assertIn('Would move 3 files for 3 albums', out.getvalue())
+        self.assertIn('1 referenced files do not exist', out.getvalue())
+        self.assertTrue(all(storage.exists(name) for name in legacy.values()))
+
+        before = Album.objects.get(pk=next(iter(legacy))).updated_at
+        call_command('migrate_cover_storage', stdout=out)
+        self.assertIn('Successfully moved 3 files for 3 albums', out.getvalue())
+        self.assertIn(f'({len(upload) / 1024 / 1024:,.1f} MB saved)', out.getvalue())
+        albums = {album.pk: album for album in Album.objects.all()}
+        first, second, third = (albums[pk].cover_image.name for pk in legacy)
+        self.assertEqual(first, second)
+        self.assertEqual(first, albums[shared.pk].cover_image.name)
+        self.assertRegex(third, r'^album_covers/([0-9a-f]{2})/\1[0-9a-f]{62}\.png$')
+        self.assertFalse(any(storage.exists(name) for name in legacy.values()))
+        self.assertTrue(storage.exists(first))
+        self.assertGreater(albums[next(iter(legacy))].updated_at, before)
+        self.assertEqual(albums[missing.pk].cover_image.name, 'album_covers/gone.jpg')
+        call_command('migrate_cover_storage', stdout=out)
+        self.assertIn('Successfully moved 0 files for 0 albums', out.getvalue())
+
+
+class AsyncReadViewTest(TestCase):
+    def setUp(self):
+        for index in range(25):
+            album = Album.objects.create(
+                title=f'Album {index % 7}', artist=f'Artist {index}', format='cd',
+                price=Decimal('9.99'), release_date=date(2020, 1, 1), description='x' * 150,
+            )
+            song = Song.objects.create(title=f'Song {index}', running_time=100 + index)
+            AlbumTracklistItem.objects.create(album=album, song=song, position=1 + index % 3)
+        self.album = album
+        self.song = song
+
+    async def get_both(self, path, headers=None):
+        """Responses of the DRF view at /api/<path> and the async view at /api/async/<path>"""
+        from asgiref.sync import sync_to_async
+        expected = await sync_to_async(self.client.get)(f'/api/{path}', headers=headers)
+        if expected.streaming:
+            expected.streamed = await sync_to_async(b''.join)(expected.streaming_content)
+        response = await self.async_client.get(f'/api/async/{path}', headers=headers)
+        return expected, response
+
+    def assertSameResponse(self, expected, response):
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response['Content-Type'], expected['Content-Type'])
+        self.assertEqual(response.content.replace(b'/api/async/', b'/api/'), expected.content)
+
+    async def test_lists_match_drf_views(self):
+        for path in ['albums/', 'albums/?page=2', 'albums/?page=last', 'songs/?page=3', 'tracklist/',
+                     'tracklist/?page=2']:
+            with self.subTest(path=path):
+                self.assertSameResponse(*await self.get_both(path))
+
+    async def test_cursor_pages_match_drf_views(self):
+        import json
+        for resource in ['albums', 'songs', 'tracklist']:
+            path, pages = f'{resource}/?cursor=', 0
+            while path:
+                with self.subTest(path=path):
+                    expected, response = await self.get_both(path)
+                    self.assertSameResponse(expected, response)
+                next_link = json.loads(response.content)['next']
+                path = next_link and next_link.split('/api/async/', 1)[1]
+                pages += 1
+            self.assertEqual(pages, 3)
+
+    async def test_details_match_drf_views(self):
+        for path in [f'albums/{self.album.pk}/', f'songs/{self.song.pk}/']:
+            with self.subTest(path=path):
+                expected, response = await self.get_both(path)
+                self.assertSameResponse(expected, response)
+                self.assertTrue(response['ETag'])
+                self.assertEqual(response['Last-Modified'], expected['Last-Modified'])
+
+    async def test_errors_match_drf_views(self):
+        for path in ['albums/0/', 'songs/0/', 'albums/?page=9', 'songs/?cursor=broken']:
+            with self.subTest(path=path):
+                expected, response = await self.get_both(path)
+                self.assertEqual(response.status_code, 404)
+                self.assertSameResponse(expected, response)
+        expected, response = await self.get_both('albums/', headers={'Accept': 'text/csv'})
+        self.assertEqual(response.status_code, 406)
+        self.assertEqual(response.content, expected.content)
+
+    async def test_ndjson_stream_matches_drf_views(self):
+        from asgiref.sync import sync_to_async
+        await MusicManagerUser.objects.acreate_user(username='streamer', password='testpass123', role='viewer')
+        token = await sync_to_async(self.client.post)('/api/token/', {'username': 'streamer', 'password': 'testpass123'})
+        auth = {'Authorization': f'Bearer {token.json()["access"]}'}
+        for path in ['albums/?format=ndjson', 'tracklist/?format=ndjson']:
+            with self.subTest(path=path):
+                anonymous, refused = await self.get_both(path)
+                self.assertEqual(refused.status_code, 401)
+                self.assertSameResponse(anonymous, refused)
+                self.assertEqual(refused['WWW-Authenticate'], anonymous['WWW-Authenticate'])
+                expected, response = await self.get_both(path, headers=auth)
+                self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+                content = b''.join([chunk async for chunk in response.streaming_content])
+                self.assertEqual(content, expected.streamed)
+                self.assertEqual(len(content.splitlines()), 25)
+
+    async def test_conditional_get(self):
+        from django.utils import timezone
+        for path in ['/api/async/albums/?page=2', f'/api/async/albums/{self.album.pk}/']:
+            with self.subTest(path=path):
+                response = await self.async_client.get(path)
+                etag = response['ETag']
+                response = await self.async_client.get(path, headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                await Album.objects.filter(pk=self.album.pk).aupdate(title='Album 6', updated_at=timezone.now())
+                response = await self.async_client.get(path, headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+        response = await self.async_client.get('/api/async/tracklist/')
+        self.assertFalse(response.has_header('ETag'))
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        from unittest import mock
+        from catalog import jobs
+        tasks = mock.patch.dict(jobs.TASKS)
+        tasks.start()
+        self.addCleanup(tasks.stop)
+        self.calls = []
+
+        @jobs.task('test.flaky', max_attempts=2)
+        def flaky(job, fail_times=0):
+            self.calls.append(job.attempts)
+            job.report_progress(1, 2, 'halfway')
+            if job.attempts <= fail_times:
+                raise RuntimeError('try again')
+            return {'attempt': job.attempts}
+
+    def test_enqueue_deduplicates_queued_jobs_by_key(self):
+        from catalog.jobs import Worker, enqueue
+        from catalog.models import Job
+        first = enqueue('test.flaky', key='flaky')
+        self.assertEqual(enqueue('test.flaky', key='flaky').pk, first.pk)
+        self.assertNotEqual(enqueue('test.flaky').pk, first.pk)
+        with self.assertRaises(LookupError):
+            enqueue('test.missing')
+        # Once running, a change may come after its reads: queue a new one
+        self.assertEqual(Worker('test').run_once().pk, first.pk)
+        self.assertNotEqual(enqueue('test.flaky', key='flaky').pk, first.pk)
+        self.assertEqual(Job.objects.filter(key='flaky', status=Job.QUEUED).count(), 1)
+
+    def test_run_records_result_and_progress(self):
+        from catalog.jobs import Worker, enqueue
+        job = enqueue('test.flaky')
+        worker = Worker('test')
+        self.assertEqual(worker.run_once().pk, job.pk)
+        self.assertIsNone(worker.run_once())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.attempts), ('done', {'attempt': 1}, 1))
+        self.assertEqual((job.progress_done, job.progress_total, job.progress_message), (1, 2, 'halfway'))
+        self.assertEqual(job.progress, 1.0)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed_jobs_are_retried_with_backoff(self):
+        from django.utils import timezone
+        from catalog.jobs import Worker, enqueue, retry_delay
+        from catalog.models import Job
+        self.assertEqual([retry_delay(n) for n in (1, 2, 3, 20)], [10, 20, 40, 3600])
+        job = enqueue('test.flaky', fail_times=5)
+        worker = Worker('test')
+        before = timezone.now()
+        with self.assertLogs('catalog.jobs', 'ERROR'):
+            worker.run_once()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('RuntimeError: try again', job.last_error)
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=10))
+        self.assertIsNone(worker.run_once())  # not due yet
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('catalog.jobs', 'ERROR'):
+            worker.run_once()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertEqual(self.calls, [1, 2])
+        self.assertEqual((worker.succeeded, worker.failed), (0, 2))
+
+    def test_stale_running_jobs_count_as_failed_attempts(self):
+        from django.utils import timezone
+        from catalog.jobs import claim, enqueue, requeue_stale
+        from catalog.models import Job
+        job = enqueue('test.flaky')
+        claim('dead-worker')
+        self.assertEqual(requeue_stale(timeout=60), 0)
+        job.refresh_from_db()
+        job.report_progress(1)
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(requeue_stale(timeout=60), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('dead-worker sent no heartbeat', job.last_error)
+
+    def test_run_workers_runs_catalog_tasks(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from catalog.jobs import enqueue
+        album = Album.objects.create(
+            title='Drifted', artist='Artist', format='cd', price=Decimal('9.99'), release_date=date(2020, 1, 1),
+        )
+        song = Song.objects.create(title='Track', running_time=200)
+        AlbumTracklistItem.objects.create(album=album, song=song, position=1)
+        Album.objects.filter(pk=album.pk).update(track_count=7, total_playtime=1)
+        job = enqueue('rebuild_album_stats', key='stats')
+        enqueue('rebuild_search_index')
+
+        out = StringIO()
+        call_command('run_workers', '--burst', stdout=out)
+        self.assertIn('Successfully ran 2 jobs (0 failed)', out.getvalue())
+        album.refresh_from_db()
+        self.assertEqual((album.track_count, album.total_playtime), (1, 200))
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'checked': 1, 'corrected': 1})
+        self.assertEqual((job.progress_done, job.progress_total), (1, 1))
+
+    def test_admin_actions_queue_jobs_and_show_progress(self):
+        from catalog.models import Job
+        editor = MusicManagerUser.objects.create_superuser(
+            username='jobs-editor', password='jobs-pass-123', display_name='Jobs Editor', role='editor',
+        )
+        self.client.force_login(editor)
+        album = Album.objects.create(
+            title='Queued', artist='Artist', format='cd', price=Decimal('9.99'), release_date=date(2020, 1, 1),
+        )
+        for _ in range(2):
+            response = self.client.post(reverse('admin:catalog_album_changelist'), {
+                'action': 'rebuild_stats_in_background', '_selected_action': [album.pk],
+            }, follow=True)
+            self.assertContains(response, 'queued as')
+        job = Job.objects.get()
+        self.assertEqual((job.task, job.kwargs), ('rebuild_album_stats', {'album_ids': [album.pk]}))
+        job.report_progress(3, 4, 'three quarters')
+
+        response = self.client.get(reverse('admin:catalog_job_changelist'))
+        self.assertContains(response, '75%')
+        response = self.client.get(reverse('admin:catalog_job_change', args=[job.pk]))
+        self.assertContains(response, 'three quarters')
+
+
+class ClaimsAuthenticationTest(TestCase):
+    def setUp(self):
+        from catalog.authentication import active_users
+        active_users.clear()
+        self.addCleanup(active_users.clear)
+        self.user = MusicManagerUser.objects.create_user(
+            username='jwt-artist', password='jwt-pass-123', display_name='  JWT   Artist ', role='artist',
+        )
+        self.album = Album.objects.create(
+            title='Token Album', artist='JWT Artist', format='cd', price=Decimal('9.99'), release_date=date(2020, 1, 1),
+        )
+
+    def obtain(self):
+        response = self.client.post('/api/token/', {'username': 'jwt-artist', 'password': 'jwt-pass-123'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def delete_album(self, access):
+        """An authenticated write: delete a fresh album"""
+        album = Album.objects.create(
+            title='Doomed', artist='JWT Artist', format='vi', price=Decimal('9.99'), release_date=date(2020, 1, 1),
+        )
+        return self.client.delete(f'/api/albums/{album.pk}/', HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def user_queries(self, queries):
+        return [query['sql'] for query in queries.captured_queries if 'catalog_musicmanageruser' in query['sql']]
+
+    def test_tokens_carry_claims(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        tokens = self.obtain()
+        self.assertEqual(tokens['role'], 'artist')
+        access = AccessToken(tokens['access'])
+        self.assertEqual((access['role'], access['display_name_key']), ('artist', 'jwt artist'))
+        self.assertEqual((access['is_staff'], access['is_superuser']), (False, False))
+
+    def test_requests_authenticate_from_claims(self):
+        access = self.obtain()['access']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.delete_album(access).status_code, 204)
+        self.assertEqual(len(self.user_queries(queries)), 1)  # the is_active check, then cached
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.delete_album(access).status_code, 204)
+        self.assertEqual(self.user_queries(queries), [])
+
+    def test_token_user_loads_the_user_only_when_needed(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        from catalog.authentication import CatalogJWTAuthentication, CatalogTokenUser
+        token = AccessToken(self.obtain()['access'])
+        with self.assertNumQueries(1):
+            user = CatalogJWTAuthentication().get_user(token)
+        self.assertIsInstance(user, CatalogTokenUser)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.is_artist_of(self.album))
+            self.assertEqual(user.role, 'artist')
+        with self.assertNumQueries(1):
+            self.assertEqual(user.display_name, '  JWT   Artist ')
+            self.assertEqual(user.username, '')  # not a claim; TokenUser's default
+        # Tokens issued before the claims existed still work, with a user lookup
+        legacy = CatalogJWTAuthentication().get_user(AccessToken.for_user(self.user))
+        self.assertEqual(legacy, self.user)
+
+    def test_deactivation_is_bounded_by_the_cache_ttl(self):
+        from unittest import mock
+        access = self.obtain()['access']
+        self.assertEqual(self.delete_album(access).status_code, 204)
+        # No signal, as when another process deactivates the user
+        MusicManagerUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.delete_album(access).status_code, 204)  # cached for CATALOG_AUTH_ACTIVE_TTL
+        later = time.monotonic() + 31
+        with mock.patch('catalog.authentication.time.monotonic', return_value=later):
+            self.assertEqual(self.delete_album(access).status_code, 401)
+
+    def test_saving_a_user_applies_at_once(self):
+        access = self.obtain()['access']
+        self.assertEqual(self.delete_album(access).status_code, 204)
+        self.user.is_active = False
+        self.user.save()
+        response = self.delete_album(access)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'user_inactive')
+
+    def test_refresh_updates_claims(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        refresh = self.obtain()['refresh']
+        self.user.role = 'editor'
+        self.user.save()
+        response = self.client.post('/api/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.json()['access'])['role'], 'editor')
+
+
+@override_settings(CATALOG_REVOCATION_SYNC_INTERVAL=60)
+class TokenRevocationTest(TestCase):
+    def setUp(self):
+        from catalog.revocation import revoked_tokens
+        self.revoked_tokens = revoked_tokens
+        revoked_tokens.reset()
+        self.addCleanup(revoked_tokens.reset)
+        MusicManagerUser.objects.create_user(username='refresher', password='refresh-pass-123', role='viewer')
+
+    def obtain(self):
+        return self.client.post('/api/token/', {'username': 'refresher', 'password': 'refresh-pass-123'}).json()['refresh']
+
+    def refresh(self, token):
+        return self.client.post('/api/token/refresh/', {'refresh': token})
+
+    def blacklist_lookups(self, queries):
+        return [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'token_blacklist_blacklistedtoken' in query['sql']
+            and '"jti" =' in query['sql']
+        ]
+
+    def test_bloom_filter(self):
+        from catalog.revocation import BloomFilter
+        bloom = BloomFilter(1000, 0.01)
+        for index in range(1000):
+            bloom.add(f'revoked-{index}')
+        self.assertTrue(all(f'revoked-{index}' in bloom for index in range(1000)))
+        false_positives = sum(f'live-{index}' in bloom for index in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_rotated_tokens_are_refused_without_a_lookup_for_live_ones(self):
+        first = self.obtain()
+        response = self.refresh(first)
+        self.assertEqual(response.status_code, 200)
+        second = response.json()['refresh']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.refresh(second).status_code, 200)
+        self.assertEqual(self.blacklist_lookups(queries), [])
+        # The rotated token is in the filter, then confirmed by the table
+        with CaptureQueriesContext(connection) as queries:
+            response = self.refresh(first)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(len(self.blacklist_lookups(queries)), 1)
+
+    def test_tokens_revoked_elsewhere_are_read_on_sync(self):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+        from rest_framework_simplejwt.tokens import RefreshToken
+        token = RefreshToken(self.obtain())
+        self.assertFalse(self.revoked_tokens.is_revoked(token['jti']))
+        # As another process would: the row appears without this process's signal
+        outstanding = OutstandingToken.objects.get(jti=token['jti'])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=outstanding)])
+        self.assertFalse(self.revoked_tokens.is_revoked(token['jti']))  # until the next sync
+        with override_settings(CATALOG_REVOCATION_SYNC_INTERVAL=0):
+            self.assertTrue(self.revoked_tokens.is_revoked(token['jti']))
+        self.revoked_tokens.reset()
+        self.assertTrue(self.revoked_tokens.is_revoked(token['jti']))  # rebuilt from the table
+
+    def test_prune_revoked_tokens(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from django.utils import timezone
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+        expired = timezone.now() - timedelta(days=1)
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(jti=f'old-{index}', token='', expires_at=expired) for index in range(5)
+        ])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens[:3]])
+        self.refresh(self.obtain())  # one live token, rotated and revoked, and its successor
+        output = StringIO()
+        call_command('prune_revoked_tokens', batch_size=2, stdout=output)
+        self.assertIn('Successfully pruned 5 expired tokens (3 revoked)', output.getvalue())
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class SongAutocompleteTest(TestCase):
+    def setUp(self):
+        self.editor = MusicManagerUser.objects.create_user(username='picker', password='testpass123', role='editor')
+        self.client.force_login(self.editor)
+        for title in ['Blue  Moon', 'blue sky', 'Bluebird', 'Red Rain', 'Abbey Road']:
+            Song.objects.create(title=title, running_time=125)
+        self.album = Album.objects.create(
+            title='Picked', artist='Picker', format='cd', price=Decimal('9.99'), release_date=date(2020, 1, 1),
+        )
+        for position, title in enumerate(['Red Rain', 'Bluebird'], 1):
+            AlbumTracklistItem.objects.create(album=self.album, song=Song.objects.get(title=title), position=position)
+
+    def autocomplete(self, **params):
+        response = self.client.get(reverse('song_autocomplete'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prefix_match_ignores_case_and_spacing(self):
+        data = self.autocomplete(q='  BLUE ')
+        self.assertEqual([song['title'] for song in data['results']], ['Blue  Moon', 'blue sky', 'Bluebird'])
+        self.assertEqual(data['results'][0]['formatted_time'], '2:05')
+        self.assertFalse(data['has_more'])
+        self.assertEqual([song['title'] for song in self.autocomplete(q='blue m')['results']], ['Blue  Moon'])
+        self.assertEqual(self.autocomplete(q='zz')['results'], [])
+
+    def test_pages(self):
+        from unittest import mock
+        from catalog import views
+        with mock.patch.object(views, 'SONG_AUTOCOMPLETE_PAGE_SIZE', 2):
+            first = self.autocomplete()
+            second = self.autocomplete(after=first['next'])
+            third = self.autocomplete(after=second['next'])
+        self.assertEqual([song['title'] for song in first['results']], ['Abbey Road', 'Blue  Moon'])
+        self.assertTrue(first['has_more'])
+        self.assertEqual([song['title'] for song in second['results']], ['blue sky', 'Bluebird'])
+        self.assertEqual([song['title'] for song in third['results']], ['Red Rain'])
+        self.assertEqual((third['has_more'], third['next']), (False, None))
+
+    def test_invalid_cursor_is_rejected(self):
+        import base64
+        import json
+        huge = base64.urlsafe_b64encode(json.dumps(['blue', 10 ** 20]).encode()).decode()
+        for after in ['x', 'bm90IGpzb24=', huge]:
+            response = self.client.get(reverse('song_autocomplete'), {'after': after})
+            self.assertEqual(response.status_code, 400, after)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('song_autocomplete')).status_code, 302)
+
+    def test_album_form_renders_only_the_selected_songs(self):
+        url = reverse('album-edit', kwargs={'pk': self.album.pk})
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(url)
+        self.assertContains(response, '>Red Rain</option>')
+        self.assertContains(response, '>Bluebird</option>')
+        self.assertNotContains(response, 'Abbey Road')
+        self.assertContains(response, reverse('song_autocomplete'))
+        Song.objects.bulk_create([Song(title=f'Filler {index}', running_time=60) for index in range(200)])
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(many), len(few))
+
+    def test_invalid_rows_keep_their_song(self):
+        url = reverse('album-edit', kwargs={'pk': self.album.pk})
+        items = list(self.album.albumtracklistitem_set.order_by('position'))
+        response = self.client.post(url, {
+            'title': '', 'artist': 'Picker', 'price': '9.99', 'format': 'cd', 'release_date': '2020-01-01',
+            'albumtracklistitem_set-TOTAL_FORMS': '2', 'albumtracklistitem_set-INITIAL_FORMS': '2',
+            'albumtracklistitem_set-MIN_NUM_FORMS': '0', 'albumtracklistitem_set-MAX_NUM_FORMS': '1000',
+            **{f'albumtracklistitem_set-{index}-{field}': value for index, item in enumerate(items) for field, value in {
+                'id': item.pk, 'song': item.song_id, 'position': index + 1,
+            }.items()},
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'<option value="{items[0].song_id}" selected>Red Rain</option>', html=True)
+
+
+class TracklistSaveTest(TestCase):
+    def setUp(self):
+        self.editor = MusicManagerUser.objects.create_user(username='saver', password='testpass123', role='editor')
+        self.client.force_login(self.editor)
+        self.songs = Song.objects.bulk_create([Song(title=f'Track {index}', running_time=100) for index in range(120)])
+        self.album = Album.objects.create(
+            title='Saved', artist='Saver', format='cd', price=Decimal('9.99'), release_date=date(2020, 1, 1),
+        )
+        self.url = reverse('album-edit', kwargs={'pk': self.album.pk})
+
+    def post(self, songs, deleted=(), **album):
+        rows = [(song, False) for song in songs] + [(song, True) for song in deleted]
+        data = {
+            'title': 'Saved', 'artist': 'Saver', 'price': '9.99', 'format': 'cd', 'release_date': '2020-01-01',
+            'albumtracklistitem_set-TOTAL_FORMS': str(len(rows)), 'albumtracklistitem_set-INITIAL_FORMS': '0',
+            'albumtracklistitem_set-MIN_NUM_FORMS': '0', 'albumtracklistitem_set-MAX_NUM_FORMS': '1000',
+            **album,
+        }
+        for index, (song, delete) in enumerate(rows):
+            data[f'albumtracklistitem_set-{index}-song'] = song.pk
+            data[f'albumtracklistitem_set-{index}-position'] = index + 1
+            if delete:
+                data[f'albumtracklistitem_set-{index}-DELETE'] = 'on'
+        return self.client.post(self.url, data)
+
+    def tracklist(self):
+        return list(self.album.albumtracklistitem_set.order_by('position').values_list('song_id', 'position'))
+
+    def test_save_applies_only_the_difference(self):
+        self.assertEqual(self.post(self.songs[:3]).status_code, 302)
+        first = dict(self.album.albumtracklistitem_set.values_list('song_id', 'pk'))
+        response = self.post([self.songs[2], self.songs[0], self.songs[3]], deleted=[self.songs[1]])
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.tracklist(), [(self.songs[2].pk, 1), (self.songs[0].pk, 2), (self.songs[3].pk, 3)])
+        kept = dict(self.album.albumtracklistitem_set.values_list('song_id', 'pk'))
+        self.assertEqual(kept[self.songs[0].pk], first[self.songs[0].pk])  # moved, not re-created
+        self.album.refresh_from_db()
+        self.assertEqual((self.album.track_count, self.album.total_playtime), (3, 300))
+
+    def test_unchanged_tracklist_writes_nothing(self):
+        self.post(self.songs[:5])
+        with CaptureQueriesContext(connection) as queries:
+            self.post(self.songs[:5])
+        writes = [q['sql'] for q in queries if 'tracklistitem' in q['sql'] and not q['sql'].startswith('SELECT')]
+        self.assertEqual(writes, [])
+
+    def test_query_count_does_not_grow_with_tracks(self):
+        self.post(self.songs[:1])
+        with CaptureQueriesContext(connection) as few:
+            self.post(self.songs[1:3])
+        self.post(self.songs[:1])
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.post(self.songs[1:101]).status_code, 302)
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(len(self.tracklist()), 100)
+
+    def test_duplicate_songs_are_rejected(self):
+        response = self.post([self.songs[0], self.songs[1], self.songs[0]])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'This song is already added to the album')
+        self.assertEqual(self.tracklist(), [])
+
+    def test_invalid_album_saves_no_tracks(self):
+        response = self.post(self.songs[:2], title='')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.tracklist(), [])
+
+
+class TracklistAPITest(TestCase):
+    def setUp(self):
+        MusicManagerUser.objects.create_user(username='api-editor', password='testpass123', role='editor')
+        access = self.client.post('/api/token/', {'username': 'api-editor', 'password': 'testpass123'}).json()['access']
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {access}'}
+        self.songs = Song.objects.bulk_create([Song(title=f'Song {index}', running_time=100) for index in range(50)])
+        self.album = Album.objects.create(
+            title='Ordered', artist='Orderer', format='cd', price=Decimal('9.99'), release_date=date(2020, 1, 1),
+        )
+        self.url = f'/api/albums/{self.album.pk}/tracklist/'
+
+    def send(self, method, url, data):
+        return getattr(self.client, method)(url, data, content_type='application/json', **self.auth)
+
+    def order(self):
+        return list(self.album.albumtracklistitem_set.order_by('position').values_list('song_id', flat=True))
+
+    def test_put_replaces_the_tracklist(self):
+        response = self.send('put', self.url, {'tracklist': [{'song': song.pk} for song in self.songs[:3]]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([track['position'] for track in response.json()['tracklist']], [1, 2, 3])
+        self.assertEqual(response.json()['tracklist'][0]['song']['title'], 'Song 0')
+        response = self.send('put', self.url, {'tracklist': [{'song': self.songs[2].pk}, {'song': self.songs[5].pk}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.order(), [self.songs[2].pk, self.songs[5].pk])
+        self.album.refresh_from_db()
+        self.assertEqual((self.album.track_count, self.album.total_playtime), (2, 200))
+
+    def test_patch_moves_tracks(self):
+        self.send('put', self.url, {'tracklist': [{'song': song.pk} for song in self.songs[:4]]})
+        first, second, third, fourth = (song.pk for song in self.songs[:4])
+        response = self.send('patch', self.url, {'moves': [{'song': fourth, 'position': 1}, {'song': first, 'position': 4}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.order(), [fourth, second, third, first])
+
+    def test_reorder_is_constant_queries(self):
+        self.send('put', self.url, {'tracklist': [{'song': song.pk} for song in self.songs[:5]]})
+        with CaptureQueriesContext(connection) as few:
+            self.send('put', self.url, {'tracklist': [{'song': song.pk} for song in reversed(self.songs[:5])]})
+        self.send('put', self.url, {'tracklist': [{'song': song.pk} for song in self.songs[:40]]})
+        with CaptureQueriesContext(connection) as many:
+            response = self.send('put', self.url, {'tracklist': [{'song': song.pk} for song in reversed(self.songs[:40])]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(self.order(), [song.pk for song in reversed(self.songs[:40])])
+
+    def test_invalid_writes_are_rejected(self):
+        self.send('put', self.url, {'tracklist': [{'song': song.pk} for song in self.songs[:2]]})
+        before = self.order()
+        song = self.songs[0].pk
+        for method, data in [
+            ('put', {'tracklist': [{'song': song}, {'song': song}]}),
+            ('put', {'tracklist': [{'song': 999999}]}),
+            ('patch', {'moves': [{'song': self.songs[9].pk, 'position': 1}]}),
+            ('patch', {'moves': [{'song': song, 'position': 3}]}),
+            ('patch', {'moves': []}),
+        ]:
+            self.assertEqual(self.send(method, self.url, data).status_code, 400, data)
+        self.assertEqual(self.order(), before)
+
+    def test_requires_authentication(self):
+        response = self.client.put(self.url, {'tracklist': []}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_album_writes_nest_the_tracklist(self):
+        data = {
+            'title': 'Nested', 'artist': 'Orderer', 'format': 'vi', 'price': '5.00', 'release_date': '2021-01-01',
+            'tracklist': [{'song': self.songs[1].pk}, {'song': self.songs[0].pk}],
+        }
+        response = self.send('post', '/api/albums/', data)
+        self.assertEqual(response.status_code, 201, response.content)
+        album = Album.objects.get(title='Nested')
+        self.assertEqual(
+            list(album.albumtracklistitem_set.order_by('position').values_list('song_id', flat=True)),
+            [self.songs[1].pk, self.songs[0].pk],
+        )
+        self.assertEqual(album.track_count, 2)
+        response = self.send('patch', f'/api/albums/{album.pk}/', {'tracklist': [{'song': self.songs[2].pk}]})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(list(album.albumtracklistitem_set.values_list('song_id', flat=True)), [self.songs[2].pk])
+        response = self.send('patch', f'/api/albums/{album.pk}/', {'title': 'Renamed'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(album.albumtracklistitem_set.count(), 1)
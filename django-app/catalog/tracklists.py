@@ -0,0 +1,84 @@
+"""
+Tracklist writes as a diff.
+
+Callers (the album form, the importer) pass the tracklists they want,
+`{album id: {song id: position}}`, and only the items that differ are
+written: items of songs no longer listed are deleted, moved ones get their
+new position in one bulk_update, and added ones are inserted with
+bulk_create. A tracklist resubmitted unchanged writes nothing.
+
+Nothing here sends post_save, and the deletes skip the per-item stats
+refresh (see catalog.signals), so callers refresh the albums returned as
+changed once, with `refresh_album_stats`, in the same transaction;
+`replace_tracklist` does both for one album given in order (the API).
+"""
+from django.utils import timezone
+from .models import AlbumTracklistItem
+from .stats import refresh_album_stats
+
+IN_CHUNK = 900  # parameters per `__in` lookup, under SQLite's variable limit
+BATCH_SIZE = 1000
+
+
+def in_chunks(values, size=IN_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def delete_items(queryset):
+    """Delete tracklist items without refreshing their album's stats per item"""
+    queryset.skip_stats_refresh = True  # read by the post_delete receiver, as the delete's origin
+    return queryset.delete()
+
+
+def sync_tracklists(desired, batch_size=BATCH_SIZE):
+    """
+    Make each album's tracklist match `desired` ({album id: {song id: position}}),
+    touching only the items that actually change. Returns the ids of the
+    albums whose tracklist changed and the number of items written.
+    """
+    desired = {album_id: dict(songs) for album_id, songs in desired.items()}
+    now = timezone.now()
+    stale, moved, changed = [], [], set()
+    for album_ids in in_chunks(desired):
+        items = AlbumTracklistItem.objects.filter(album_id__in=album_ids).order_by()
+        for item in items.only('pk', 'album_id', 'song_id', 'position'):
+            wanted = desired[item.album_id]
+            if item.song_id not in wanted:
+                stale.append(item.pk)
+                changed.add(item.album_id)
+                continue
+            position = wanted.pop(item.song_id)
+            if item.position != position:
+                item.position = position
+                item.updated_at = now
+                moved.append(item)
+    for ids in in_chunks(stale):
+        delete_items(AlbumTracklistItem.objects.filter(pk__in=ids))
+    AlbumTracklistItem.objects.bulk_update(moved, ['position', 'updated_at'], batch_size=batch_size)
+    created = [
+        AlbumTracklistItem(album_id=album_id, song_id=song_id, position=position)
+        for album_id, songs in desired.items()
+        for song_id, position in songs.items()
+    ]
+    AlbumTracklistItem.objects.bulk_create(created, batch_size=batch_size)
+    changed.update(item.album_id for item in moved)
+    changed.update(item.album_id for item in created)
+    return changed, len(created) + len(moved)
+
+
+def tracklist_song_ids(album):
+    """The album's song ids in tracklist order"""
+    items = AlbumTracklistItem.objects.filter(album=album).order_by('position', 'pk')
+    return list(items.values_list('song_id', flat=True))
+
+
+def replace_tracklist(album, song_ids):
+    """
+    Give `album` the songs `song_ids`, in that order (positions 1..n), and
+    refresh its stats if that changed anything. Returns the items written.
+    """
+    changed, written = sync_tracklists({album.pk: {song_id: position for position, song_id in enumerate(song_ids, 1)}})
+    refresh_album_stats(changed)
+    return written
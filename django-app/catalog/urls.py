@@ -1,7 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views, views_auth
 
 # API router setup
 router = DefaultRouter()
@@ -9,10 +10,23 @@ router.register(r'albums', views.AlbumViewSet, basename='album')
 router.register(r'songs', views.SongViewSet, basename='song')
 router.register(r'tracklist', views.TracklistViewSet, basename='tracklistitem')
 
+# Async read-only API, for ASGI deployments (catalog.async_views)
+async_api_urls = [
+    path('albums/', async_views.AlbumList.as_view(), name='async-album-list'),
+    path('albums/<int:pk>/', async_views.AlbumDetail.as_view(), name='async-album-detail'),
+    path('songs/', async_views.SongList.as_view(), name='async-song-list'),
+    path('songs/<int:pk>/', async_views.SongDetail.as_view(), name='async-song-detail'),
+    path('tracklist/', async_views.TracklistList.as_view(), name='async-tracklistitem-list'),
+]
+
 urlpatterns = [
     # API Routes
+    path('api/token/', views_auth.MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/refresh/', views_auth.MyTokenRefreshView.as_view(), name='token_refresh'),
+    path('api/search/', views.SearchView.as_view(), name='api-search'),
     path('api/', include(router.urls)),
     path('ajax/song/create/', views.create_song_ajax, name='create_song_ajax'),
+    path('ajax/song/autocomplete/', views.song_autocomplete, name='song_autocomplete'),
 
     # BOP Routes
     path('', views.AlbumListView.as_view(), name='album-list'),
@@ -33,4 +47,7 @@ urlpatterns = [
     ), name='logout'),
     path('accounts/register/', views.register_view, name='register'),
     path('admin/register/', views.admin_register_user, name='admin_register_user'),
-]
\ No newline at end of file
+]
+
+if getattr(settings, 'CATALOG_ASYNC_API', True):
+    urlpatterns.insert(0, path('api/async/', include(async_api_urls)))
\ No newline at end of file
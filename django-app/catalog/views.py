@@ -1,3 +1,6 @@
+import base64
+import binascii
+import json
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -5,13 +8,28 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.http import HttpResponseForbidden, JsonResponse
 from django.urls import reverse_lazy
+from django.views.static import serve
 from django.core.exceptions import PermissionDenied
-from django.forms import inlineformset_factory
-from rest_framework import viewsets
+from django.db import transaction
+from django.db.models import Q
+from django.forms import formset_factory
+from rest_framework import generics, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import Album, Song, AlbumTracklistItem
-from .serializers import AlbumSerializer, SongSerializer, AlbumTracklistItemSerializer, AlbumDetailSerializer, AlbumCreateUpdateSerializer
-from .forms import UserRegistrationForm, AlbumForm, AlbumTracklistItemForm
+from rest_framework.response import Response
+from .models import Album, Song, AlbumTracklistItem, normalize_title
+from .serializers import AlbumSerializer, SongSerializer, AlbumTracklistItemSerializer, AlbumDetailSerializer, AlbumCreateUpdateSerializer, TracklistReplaceSerializer, TracklistMovesSerializer
+from .forms import UserRegistrationForm, AlbumForm, AlbumTracklistItemForm, TracklistFormSet
+from .caching import CachedPayloadMixin
+from .conditional import ConditionalGetMixin
+from .fast_serializers import FastReadMixin
+from .export import FORMATS as EXPORT_FORMATS, streaming_export_response
+from .pagination import CatalogPagination
+from .search import search
+from .storage import IMMUTABLE_CACHE_CONTROL, is_content_addressed
+from .streaming import StreamingListMixin
+from .tracklists import replace_tracklist, tracklist_song_ids
 
 # BOP (Templated) Views
 def register_view(request):
@@ -55,11 +73,12 @@ class AlbumListView(ListView):
     model = Album
     template_name = 'catalog/album_list.html'
     context_object_name = 'albums'
+    paginate_by = 24
     
     def get_queryset(self):
         queryset = super().get_queryset()
         if self.request.user.is_authenticated and self.request.user.role == 'artist':
-            return queryset.filter(artist__iexact=self.request.user.display_name)
+            return queryset.filter(artist_key=self.request.user.display_name_key)
         return queryset
 
 class AlbumDetailView(DetailView):
@@ -67,16 +86,17 @@ class AlbumDetailView(DetailView):
     model = Album
     template_name = 'catalog/album_detail.html'
     context_object_name = 'album'
+
+    def get_queryset(self):
+        return Album.objects.with_tracklist()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        album = self.get_object()
+        album = self.object
         user = self.request.user
         
-        # Check if user can edit (case-insensitive)
-        can_edit = (user.is_authenticated and 
-                   (user.role == 'editor' or 
-                    (user.role == 'artist' and album.artist.lower() == user.display_name.lower())))
+        # Check if user can edit (normalized, case-insensitive artist match)
+        can_edit = user.is_authenticated and (user.role == 'editor' or user.is_artist_of(album))
         
         # Check if user can delete (editors only)
         can_delete = user.is_authenticated and user.role == 'editor'
@@ -86,85 +106,59 @@ class AlbumDetailView(DetailView):
         
         return context
 
-class AlbumCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
-    """Create a new album (editors only)"""
+class AlbumFormMixin:
+    """
+    The album form with its tracklist formset. The formset is built and
+    validated once per request, and a valid submission saves the album and
+    its tracklist (as a diff, see TracklistFormSet.save) in one transaction.
+    """
     model = Album
     form_class = AlbumForm
     template_name = 'catalog/album_form.html'
+    success_message = None
 
-    def get_context_data(self, **kwargs):
-        data = super().get_context_data(**kwargs)
-        TracklistItemFormSet = inlineformset_factory(
-            Album,
-            AlbumTracklistItem,
-            form=AlbumTracklistItemForm,
+    def get_tracklist_formset(self):
+        TracklistItemFormSet = formset_factory(
+            AlbumTracklistItemForm,
+            formset=TracklistFormSet,
             extra=0,
             can_delete=True
         )
         if self.request.POST:
-            formset = TracklistItemFormSet(self.request.POST, self.request.FILES, instance=self.object)
-        else:
-            formset = TracklistItemFormSet(instance=self.object)
+            return TracklistItemFormSet(self.request.POST, self.request.FILES, album=self.object)
+        return TracklistItemFormSet(album=self.object)
+
+    def get_context_data(self, **kwargs):
+        data = super().get_context_data(**kwargs)
+        formset = kwargs.get('tracklist_formset') or self.get_tracklist_formset()
         data['tracklist_formset'] = formset
         data['tracklist_has_errors'] = formset.total_error_count() > 0
-        data['songs'] = Song.objects.all()
         return data
 
     def form_valid(self, form):
-        context = self.get_context_data()
-        tracklist_formset = context['tracklist_formset']
-        if tracklist_formset.is_valid():
+        tracklist_formset = self.get_tracklist_formset()
+        if not tracklist_formset.is_valid():
+            return self.render_to_response(self.get_context_data(form=form, tracklist_formset=tracklist_formset))
+        with transaction.atomic():
             self.object = form.save()
-            tracklist_formset.instance = self.object
-            tracklist_formset.save()
-            messages.success(self.request, "Album created successfully!")
-            return redirect('album-detail', pk=self.object.pk)
-        else:
-            return self.render_to_response(self.get_context_data(form=form))
+            tracklist_formset.save(self.object)
+        messages.success(self.request, self.success_message)
+        return redirect('album-detail', pk=self.object.pk)
+
+class AlbumCreateView(LoginRequiredMixin, UserPassesTestMixin, AlbumFormMixin, CreateView):
+    """Create a new album (editors only)"""
+    success_message = "Album created successfully!"
 
     def test_func(self):
         return self.request.user.role in ['editor', 'artist']
 
-class AlbumUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class AlbumUpdateView(LoginRequiredMixin, UserPassesTestMixin, AlbumFormMixin, UpdateView):
     """Update an existing album (editors or album's artist)"""
-    model = Album
-    form_class = AlbumForm
-    template_name = 'catalog/album_form.html'
-
-    def get_context_data(self, **kwargs):
-        data = super().get_context_data(**kwargs)
-        TracklistItemFormSet = inlineformset_factory(
-            Album,
-            AlbumTracklistItem,
-            form=AlbumTracklistItemForm,
-            extra=0,
-            can_delete=True
-        )
-        if self.request.POST:
-            formset = TracklistItemFormSet(self.request.POST, self.request.FILES, instance=self.object)
-        else:
-            formset = TracklistItemFormSet(instance=self.object)
-        data['tracklist_formset'] = formset
-        data['tracklist_has_errors'] = formset.total_error_count() > 0
-        data['songs'] = Song.objects.all()
-        return data
-
-    def form_valid(self, form):
-        context = self.get_context_data()
-        tracklist_formset = context['tracklist_formset']
-        if tracklist_formset.is_valid():
-            self.object = form.save()
-            tracklist_formset.instance = self.object
-            tracklist_formset.save()
-            messages.success(self.request, "Album updated successfully!")
-            return redirect('album-detail', pk=self.object.pk)
-        else:
-            return self.render_to_response(self.get_context_data(form=form))
+    success_message = "Album updated successfully!"
 
     def test_func(self):
         album = self.get_object()
-        return (self.request.user.role == 'editor' or 
-                (self.request.user.role == 'artist' and album.artist.lower() == self.request.user.display_name.lower()))
+        return self.request.user.role == 'editor' or self.request.user.is_artist_of(album)
 
 class AlbumDeleteView(LoginRequiredMixin, DeleteView):
     """Delete an album (editors only)"""
@@ -186,36 +180,119 @@ class AlbumDeleteView(LoginRequiredMixin, DeleteView):
 
 
 # API Views
-class AlbumViewSet(viewsets.ModelViewSet):
+class AlbumViewSet(StreamingListMixin, CachedPayloadMixin, FastReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """API endpoint for albums"""
     queryset = Album.objects.all()
+    pagination_class = CatalogPagination
+    cursor_ordering = ('title', 'id')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            # Tracklist items and their songs in one extra query, whatever the length
+            return queryset.with_tracklist()
+        # The list reads the stored track_count/total_playtime columns, so it
+        # needs neither joins nor per-row aggregates
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'list':
             return AlbumSerializer
         if self.action == 'retrieve':
             return AlbumDetailSerializer
+        if self.action == 'tracklist':
+            return TracklistReplaceSerializer
         return AlbumCreateUpdateSerializer # For create, update, partial_update
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream every album matching the list filters, unpaginated. Unlike
+        the paginated list, a full dump needs authentication.
+
+        `?export_format=csv` (default) or `ndjson`; `format` is reserved by
+        DRF for renderer selection.
+        """
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'export_format': f'Must be one of: {", ".join(EXPORT_FORMATS)}'})
+        queryset = self.filter_queryset(self.get_queryset())
+        return streaming_export_response(queryset, export_format)
+
+    @action(detail=True, methods=['put', 'patch'])
+    def tracklist(self, request, pk=None):
+        """
+        Write the album's tracklist in one transaction.
+
+        PUT `{"tracklist": [{"song": id}, ...]}` replaces it, in that order;
+        PATCH `{"moves": [{"song": id, "position": n}, ...]}` moves tracks
+        already on the album, in turn. Either way the positions become
+        1..n and only the items whose position or presence changes are
+        written. Returns the new tracklist.
+        """
+        album = self.get_object()
+        with transaction.atomic():
+            # Concurrent edits of the same album wait here, then see each other's order
+            album = Album.objects.select_for_update().get(pk=album.pk)
+            if request.method == 'PUT':
+                serializer = TracklistReplaceSerializer(data=request.data)
+                serializer.is_valid(raise_exception=True)
+                song_ids = serializer.validated_data['tracklist']
+            else:
+                serializer = TracklistMovesSerializer(data=request.data, context={'song_ids': tracklist_song_ids(album)})
+                serializer.is_valid(raise_exception=True)
+                song_ids = serializer.validated_data['moves']
+            replace_tracklist(album, song_ids)
+        items = album.albumtracklistitem_set.select_related('song').order_by('position')
+        return Response({'tracklist': AlbumTracklistItemSerializer(items, many=True).data})
+
     def get_permissions(self):
-        """No auth for read, auth for write"""
+        """No auth for paginated reads, auth for write and the full export"""
         if self.action in ['list', 'retrieve']:
             permission_classes = [AllowAny]
         else:
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
-class SongViewSet(viewsets.ModelViewSet):
+class SongViewSet(StreamingListMixin, FastReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """API endpoint for songs"""
     queryset = Song.objects.all()
     serializer_class = SongSerializer
     permission_classes = [AllowAny] # Per spec
+    pagination_class = CatalogPagination
+    cursor_ordering = ('title', 'id')
 
-class TracklistViewSet(viewsets.ModelViewSet):
+class TracklistViewSet(StreamingListMixin, viewsets.ModelViewSet):
     """API endpoint for tracklist items"""
-    queryset = AlbumTracklistItem.objects.all()
+    queryset = AlbumTracklistItem.objects.select_related('song')
     serializer_class = AlbumTracklistItemSerializer
     permission_classes = [AllowAny] # Per spec
+    pagination_class = CatalogPagination
+    cursor_ordering = ('position', 'id')
+
+class SearchView(generics.ListAPIView):
+    """API endpoint for ranked full-text search: /api/search/?q=...&type=albums|songs"""
+    permission_classes = [AllowAny]
+    filter_backends = []
+    search_types = {
+        'albums': AlbumSerializer,
+        'songs': SongSerializer,
+    }
+
+    def get_search_type(self):
+        search_type = self.request.query_params.get('type', 'albums')
+        if search_type not in self.search_types:
+            raise ValidationError({'type': [f'Must be one of: {", ".join(self.search_types)}.']})
+        return search_type
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': ['This query parameter is required.']})
+        return search(self.get_search_type(), query)
+
+    def get_serializer_class(self):
+        return self.search_types[self.get_search_type()]
 
 @login_required
 def create_song_ajax(request):
@@ -267,4 +344,61 @@ def create_song_ajax(request):
                 'error': f'Error creating song: {str(e)}'
             }, status=500)
     
-    return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
\ No newline at end of file
+    return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+
+
+SONG_AUTOCOMPLETE_PAGE_SIZE = 20
+
+def song_cursor(row):
+    """Opaque ?after= value for the song after which the next page starts"""
+    return base64.urlsafe_b64encode(json.dumps([row['title_key'], row['id']]).encode('utf-8')).decode('ascii')
+
+def decode_song_cursor(encoded):
+    title_key, song_id = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+    if not isinstance(title_key, str) or not isinstance(song_id, int) or not 0 <= song_id < 2 ** 63:
+        raise ValueError(encoded)
+    return title_key, song_id
+
+@login_required
+def song_autocomplete(request):
+    """
+    Songs whose title starts with ?q= (ignoring case and extra spaces), by
+    title, a page at a time: `next` is the ?after= cursor of the following
+    page. Both the prefix and the cursor are ranges over the indexed
+    (title_key, id), so any page costs the same however many songs there are.
+    """
+    prefix = normalize_title(request.GET.get('q', ''))
+    songs = Song.objects.order_by('title_key', 'id')
+    if prefix:
+        songs = songs.filter(title_key__gte=prefix, title_key__lt=prefix + '\U0010ffff')
+    if request.GET.get('after'):
+        try:
+            title_key, song_id = decode_song_cursor(request.GET['after'])
+        except (TypeError, ValueError, UnicodeEncodeError, binascii.Error):
+            return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+        # As catalog.pagination: the leading bound lets the index seek
+        songs = songs.filter(Q(title_key__gt=title_key) | Q(title_key=title_key, id__gt=song_id), title_key__gte=title_key)
+    rows = list(songs.values('id', 'title', 'running_time', 'title_key')[:SONG_AUTOCOMPLETE_PAGE_SIZE + 1])
+    page = rows[:SONG_AUTOCOMPLETE_PAGE_SIZE]
+    has_more = len(rows) > SONG_AUTOCOMPLETE_PAGE_SIZE
+    return JsonResponse({
+        'results': [
+            {
+                'id': row['id'],
+                'title': row['title'],
+                'running_time': row['running_time'],
+                'formatted_time': f"{row['running_time'] // 60}:{row['running_time'] % 60:02d}",
+            }
+            for row in page
+        ],
+        'next': song_cursor(page[-1]) if has_more else None,
+        'has_more': has_more,
+    })
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """django.views.static.serve, with content-addressed files cacheable for good"""
+    response = serve(request, path, document_root, show_indexes)
+    if response.status_code == 200 and is_content_addressed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
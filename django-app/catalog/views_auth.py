@@ -41,8 +41,11 @@ class RegisterView(APIView):
 class LoginView(TokenObtainPairView):
     permission_classes = [AllowAny]
 
-from rest_framework_simplejwt.views import TokenObtainPairView
-from .serializers import MyTokenObtainPairSerializer
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from .serializers import MyTokenObtainPairSerializer, MyTokenRefreshSerializer
 
 class MyTokenObtainPairView(TokenObtainPairView):
-    serializer_class = MyTokenObtainPairSerializer
\ No newline at end of file
+    serializer_class = MyTokenObtainPairSerializer
+
+class MyTokenRefreshView(TokenRefreshView):
+    serializer_class = MyTokenRefreshSerializer
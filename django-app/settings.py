@@ -80,14 +80,30 @@ LOGGING = {
         'handlers': ['console'],
         'level': 'DEBUG',
     },
+    'loggers': {
+        'PIL': {'level': 'INFO'},  # logs every chunk of every image it decodes at DEBUG
+        'asyncio': {'level': 'INFO'},  # logs the selector of every event loop at DEBUG
+    },
 }
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,  # Adjust the page size as needed
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    # orjson-backed JSON (falls back to the stdlib without orjson); list
+    # rest_framework.renderers.JSONRenderer / parsers.JSONParser to switch back
+    'DEFAULT_RENDERER_CLASSES': [
+        'catalog.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'catalog.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Builds request.user from the token's claims (no user query per request)
+        'catalog.authentication.CatalogJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
     'rest_framework.permissions.IsAuthenticated',
@@ -105,6 +121,7 @@ INSTALLED_APPS = [
     'django_filters',
     'corsheaders',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',  # BLACKLIST_AFTER_ROTATION needs it
     'catalog', 
 ]
 
@@ -112,6 +129,7 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'catalog.middleware.CatalogBusMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -152,6 +170,36 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Holds the serialized album API payloads (catalog.caching). The local-memory
+# backend is per process; the invalidation bus (catalog.bus) tells every
+# worker what changed. With a shared backend such as Redis or Memcached the
+# bus can be turned off.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mymusicmaestro',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+CATALOG_RESPONSE_CACHE = True  # serve album detail/list payloads from the cache
+CATALOG_CACHE_TIMEOUT = 60 * 60  # seconds
+CATALOG_FAST_SERIALIZERS = True  # serve album/song list and detail reads from values() rows
+CATALOG_ASYNC_API = True  # also serve the public reads from async views at /api/async/ (for ASGI)
+CATALOG_COVER_WORKERS = 2  # processes rendering cover thumbnails; 0 renders during the request
+CATALOG_JOB_POLL_INTERVAL = 1.0  # seconds between polls of an empty job queue (manage.py run_workers)
+CATALOG_JOB_TIMEOUT = 10 * 60  # seconds without a progress report before a running job counts as failed
+CATALOG_AUTH_ACTIVE_TTL = 30  # seconds a deactivated user's API tokens may keep working
+CATALOG_REVOCATION_FILTER = True  # check refresh tokens against an in-memory Bloom filter before the blacklist table
+CATALOG_REVOCATION_SYNC_INTERVAL = 1.0  # seconds before a token revoked by another process is refused here
+CATALOG_BUS_BACKEND = 'file'  # 'file' (one host), 'database' (several hosts) or None
+CATALOG_BUS_POLL_INTERVAL = 1.0  # seconds; upper bound on how long other workers serve stale payloads
+CATALOG_BUS_PATH = None  # file backend log; defaults to a temp file named after the database
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -192,6 +240,13 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Album covers and their variants, named by content hash (catalog.storage)
+    'covers': {'BACKEND': 'catalog.storage.ContentAddressedStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
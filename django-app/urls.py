@@ -17,8 +17,10 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from catalog.views import serve_media
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # catalog.urls comes first so /admin/register/ is not swallowed by the admin site
     path('', include('catalog.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('admin/', admin.site.urls),
+] + static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)